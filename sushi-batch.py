@@ -0,0 +1,46 @@
+#! /usr/local/bin/python3
+
+import os
+import sys
+import json
+import argparse
+
+from sushi_gui.batch import BatchRunner, load_spec
+from sushi_gui.constants import BATCH_WORKERS, COMMAND_DEADLINE
+from sushi_gui.controller import Controller
+
+
+# If sushi is running on another device replace 'localhost' with the ip of that device
+SUSHI_ADDRESS = 'localhost:51051'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create tracks and processors and set parameters in Sushi '
+                                                 'from a JSON or YAML spec, without the GUI')
+    parser.add_argument('spec', help='JSON or YAML file, see sushi_gui/batch.py for the format')
+    parser.add_argument('--address', default=SUSHI_ADDRESS)
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help='Max calls to Sushi in flight')
+    parser.add_argument('--deadline', type=float, default=COMMAND_DEADLINE, help='Seconds before a call fails')
+    parser.add_argument('--report', help='Write the full report, with per call latencies, to this JSON file')
+    args = parser.parse_args()
+
+    proto_file = os.environ.get('SUSHI_GRPC_ELKPY_PROTO', './sushi-grpc-api/sushi_rpc.proto')
+    controller = Controller(address=args.address, proto_file=proto_file)
+    try:
+        report = BatchRunner(controller, args.workers, args.deadline).run(load_spec(args.spec))
+    finally:
+        controller.close()
+
+    print(f"{report['operations']} operations in {report['seconds']:.2f} s, "
+          f"{report['operations_per_second']:.0f}/s, {report['rpcs_per_second']:.0f} calls/s")
+    print(f"{report['failed']} failed, {report['skipped']} skipped")
+    for failure in report['failures']:
+        print(f"  {failure['operation']}: {failure['error']}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
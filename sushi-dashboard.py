@@ -0,0 +1,28 @@
+#! /usr/local/bin/python3
+
+import sys
+import argparse
+from PySide6.QtWidgets import QApplication
+from sushi_gui.dashboard import DashboardWindow
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Overview of many Sushi devices at once')
+    parser.add_argument('addresses', nargs='*', help='Sushi addresses as ip:port, the port defaults to 51051')
+    parser.add_argument('--file', help='File with one address per line')
+    args, qt_args = parser.parse_known_args()
+
+    addresses = list(args.addresses)
+    if args.file:
+        with open(args.file) as f:
+            addresses += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    app.setStyle('Fusion')
+    window = DashboardWindow(addresses)
+    window.show()
+    sys.exit(app.exec())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+import time
+from concurrent.futures import Future
+from threading import Condition, Lock, Thread
+from typing import Optional
+
+import numpy as np
+
+from .constants import MODE_PLAYING, AUTOMATION_MAX_EVENTS, AUTOMATION_INITIAL_EVENTS, AUTOMATION_SPIN_TIME, \
+    AUTOMATION_JITTER_SAMPLES
+
+
+# Recorded parameter changes as columns: when they happened in seconds and in beats from the start
+# of the recording, and which parameter changed to what. Appending writes into preallocated arrays,
+# which double in size when full, up to max_events. Changes after that are counted but not kept.
+class AutomationBuffer:
+    def __init__(self, max_events: int = AUTOMATION_MAX_EVENTS) -> None:
+        self._max_events = max_events
+        self.size = 0
+        self.dropped = 0
+        self.seconds = np.zeros(AUTOMATION_INITIAL_EVENTS, dtype=np.float64)
+        self.beats = np.zeros(AUTOMATION_INITIAL_EVENTS, dtype=np.float64)
+        self.processors = np.zeros(AUTOMATION_INITIAL_EVENTS, dtype=np.int32)
+        self.parameters = np.zeros(AUTOMATION_INITIAL_EVENTS, dtype=np.int32)
+        self.values = np.zeros(AUTOMATION_INITIAL_EVENTS, dtype=np.float32)
+
+    def append(self, seconds: float, beats: float, processor_id: int, parameter_id: int, value: float) -> bool:
+        i = self.size
+        if i == len(self.values):
+            if i >= self._max_events:
+                self.dropped += 1
+                return False
+            self._grow(min(i * 2, self._max_events))
+        self.seconds[i] = seconds
+        self.beats[i] = beats
+        self.processors[i] = processor_id
+        self.parameters[i] = parameter_id
+        self.values[i] = value
+        self.size = i + 1
+        return True
+
+    def clear(self) -> None:
+        self.size = 0
+        self.dropped = 0
+
+    @property
+    def duration(self) -> float:
+        return float(self.seconds[self.size - 1]) if self.size else 0.0
+
+    def _grow(self, size: int) -> None:
+        for name in ('seconds', 'beats', 'processors', 'parameters', 'values'):
+            array = getattr(self, name)
+            grown = np.zeros(size, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+
+# Beats since a starting point, following tempo changes
+class BeatClock:
+    def __init__(self, tempo: float = 120.0) -> None:
+        self.tempo = tempo
+        self._beat = 0.0
+        self._time = time.perf_counter()
+
+    def reset(self, now: float) -> None:
+        self._beat, self._time = 0.0, now
+
+    def set_tempo(self, tempo: float, now: float) -> None:
+        self._beat, self._time = self.beats(now), now
+        self.tempo = tempo
+
+    def beats(self, now: float) -> float:
+        return self._beat + (now - self._time) * self.tempo / 60.0
+
+
+# Records the parameter changes Sushi notifies about and plays them back. Playback runs on a thread
+# of its own that sleeps until just before the next change is due and then spins, and sends all
+# changes that are due at once, only the last value of each parameter, so dense automation makes
+# batches bigger instead of falling behind. Playback either runs freely in seconds, or follows Sushi's
+# transport in beats: it starts when Sushi starts playing, follows the tempo and stops when Sushi stops.
+class Automation:
+    def __init__(self, controller) -> None:
+        self._controller = controller
+        self._lock = Lock()
+        self._condition = Condition(self._lock)
+        self.buffer = AutomationBuffer()
+        self.recording = False
+        self._record_start = 0.0
+        self._record_clock = BeatClock()
+        self._playing = False
+        self._play_clock = BeatClock()
+        self._player: Optional[Thread] = None
+        self._stopping = False
+        self._reset_stats()
+
+    def start_recording(self) -> Future:
+        self.stop_playback()
+        return self._controller.run_command('automation', self._start_recording)
+
+    def stop_recording(self) -> None:
+        with self._lock:
+            self.recording = False
+
+    def play(self, follow_transport: bool = False) -> Future:
+        self.stop_recording()
+        self.stop_playback()
+        return self._controller.run_command('automation', self._start_playback, follow_transport)
+
+    def stop_playback(self) -> Future:
+        # The player is told to stop right away, but waited for on the command pool, since it may be
+        # in the middle of sending a batch to a slow Sushi
+        self._stop_player()
+        return self._controller.run_command('automation', self._stop_playback)
+
+    @property
+    def playing_back(self) -> bool:
+        return self._player is not None and self._player.is_alive()
+
+    def record_parameter_notification(self, notification) -> None:
+        if not self.recording:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            if self.recording:
+                self.buffer.append(now - self._record_start, self._record_clock.beats(now),
+                                   notification.parameter.processor_id, notification.parameter.parameter_id,
+                                   notification.normalized_value)
+
+    def transport_notification(self, n) -> None:
+        now = time.perf_counter()
+        with self._condition:
+            if n.HasField('tempo'):
+                self._record_clock.set_tempo(n.tempo, now)
+                self._play_clock.set_tempo(n.tempo, now)
+            elif n.HasField('playing_mode'):
+                playing = n.playing_mode.mode == MODE_PLAYING
+                if playing and not self._playing:
+                    self._play_clock.reset(now)
+                self._playing = playing
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._lock:
+            jitter = np.sort(self._jitter[:min(self._jitter_count, len(self._jitter))])
+            seconds = (self._last_send or time.perf_counter()) - self._started if self._started else 0.0
+            return {'recorded': self.buffer.size,
+                    'dropped': self.buffer.dropped,
+                    'duration': self.buffer.duration,
+                    'played': self._played,
+                    'sent': self._sent,
+                    'batches': self._batches,
+                    'events_per_second': self._played / seconds if seconds > 0 else 0.0,
+                    'sent_per_second': self._sent / seconds if seconds > 0 else 0.0,
+                    'jitter_p50': float(jitter[len(jitter) // 2]) if len(jitter) else 0.0,
+                    'jitter_p99': float(jitter[min(len(jitter) - 1, int(len(jitter) * 0.99))]) if len(jitter) else 0.0,
+                    'jitter_max': float(jitter[-1]) if len(jitter) else 0.0}
+
+    def _reset_stats(self) -> None:
+        self._played = 0
+        self._sent = 0
+        self._batches = 0
+        self._started = 0.0
+        self._last_send = 0.0
+        # How late each change was sent, in seconds, the last AUTOMATION_JITTER_SAMPLES of them
+        self._jitter = np.zeros(AUTOMATION_JITTER_SAMPLES, dtype=np.float64)
+        self._jitter_count = 0
+
+    def _start_recording(self) -> None:
+        tempo = self._controller.transport.get_tempo()
+        now = time.perf_counter()
+        with self._lock:
+            self.buffer.clear()
+            self._record_start = now
+            self._record_clock = BeatClock(tempo)
+            self._record_clock.reset(now)
+            self._play_clock.tempo = tempo
+            self.recording = True
+
+    def _stop_player(self) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+    def _stop_playback(self) -> None:
+        # Stopping again, in case a play queued before this one started another player
+        self._stop_player()
+        player = self._player
+        if player is not None:
+            player.join()
+            self._player = None
+
+    def _start_playback(self, follow_transport: bool) -> None:
+        with self._lock:
+            self._stopping = False
+            self._reset_stats()
+        self._player = Thread(target=self._play, args=(follow_transport,), daemon=True)
+        self._player.start()
+
+    def _play(self, follow_transport: bool) -> None:
+        try:
+            transport = self._controller.transport
+            tempo = transport.get_tempo()
+            playing = transport.get_playing_mode() == MODE_PLAYING
+        except Exception as e:
+            print(f'Error starting automation playback: {e}')
+            return
+        now = time.perf_counter()
+        with self._lock:
+            self._record_clock.tempo = self._play_clock.tempo = tempo
+            # Sushi's position isn't known, if it's already playing the recording starts from here
+            self._play_clock.reset(now)
+            self._playing = playing
+            size = self.buffer.size
+            # Recording is stopped, so the buffers don't change while they're played
+            times = (self.buffer.beats if follow_transport else self.buffer.seconds)[:size]
+            processors = self.buffer.processors[:size]
+            parameters = self.buffer.parameters[:size]
+            values = self.buffer.values[:size]
+            keys = processors.astype(np.int64) << 32 | parameters.astype(np.int64)
+        start = now
+
+        index = 0
+        while index < size:
+            with self._condition:
+                if follow_transport:
+                    # Wait for Sushi to play, and start over if it stopped
+                    while not self._playing and not self._stopping:
+                        index = 0
+                        self._condition.wait()
+                if self._stopping:
+                    return
+                now = time.perf_counter()
+                position = self._play_clock.beats(now) if follow_transport else now - start
+                seconds_per_unit = 60.0 / self._play_clock.tempo if follow_transport else 1.0
+
+            due = int(np.searchsorted(times, position, side='right'))
+            if due <= index:
+                wait = (times[index] - position) * seconds_per_unit
+                if wait > AUTOMATION_SPIN_TIME:
+                    with self._condition:
+                        # Woken early by transport changes and by stop_playback
+                        self._condition.wait(wait - AUTOMATION_SPIN_TIME)
+                else:
+                    time.sleep(0)
+                continue
+
+            self._send(index, due, times, keys, processors, parameters, values, position, seconds_per_unit)
+            index = due
+
+    def _send(self, index: int, due: int, times: np.ndarray, keys: np.ndarray, processors: np.ndarray,
+              parameters: np.ndarray, values: np.ndarray, position: float, seconds_per_unit: float) -> None:
+        # Only the last value of each parameter that is due is sent, in the order they were recorded
+        _, last = np.unique(keys[index:due][::-1], return_index=True)
+        rows = np.sort(due - 1 - last)
+        now = time.perf_counter()
+        try:
+            self._controller.set_parameter_values(processors[rows].tolist(), parameters[rows].tolist(),
+                                                  values[rows].tolist())
+        except Exception as e:
+            print(f'Error playing automation: {e}')
+
+        late = (position - times[index:due]) * seconds_per_unit
+        with self._lock:
+            if not self._started:
+                self._started = now
+            self._last_send = time.perf_counter()
+            self._played += due - index
+            self._sent += len(rows)
+            self._batches += 1
+            late = late[-len(self._jitter):]
+            slots = (self._jitter_count + np.arange(len(late))) % len(self._jitter)
+            self._jitter[slots] = late
+            self._jitter_count += len(late)
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+from concurrent.futures import Future
+from threading import Condition
+from typing import Callable, Dict, List, Optional
+
+from .constants import PLUGIN_TYPES, COMMAND_DEADLINE, BATCH_WORKERS, BATCH_POLL_INTERVAL
+from .command_executor import CommandExecutor, current_deadline
+from .controller import Controller
+
+# Applies a spec of tracks, processors and parameter values to Sushi without the GUI, e.g.
+#
+# {
+#   "tempo": 120,
+#   "tracks": [
+#     {"name": "main", "type": "stereo", "parameters": {"gain": 0.8},
+#      "processors": [{"name": "main_eq", "uid": "sushi.testing.equalizer", "type": "internal",
+#                      "parameters": {"frequency": 0.25}, "bypassed": false, "program": 0}]}
+#   ],
+#   "parameters": [{"processor": "synth", "parameter": "cutoff", "value": 0.5}]
+# }
+#
+# Tracks are created in the order given, with their processors in order, and each track, processor
+# and parameter is acted on as soon as what it depends on exists. Apart from that everything runs
+# concurrently, so a large spec takes a few round trips more than its deepest dependency chain.
+# The top level parameters are set once all tracks are done, they can refer to any processor by name.
+
+
+def load_spec(filename: str) -> dict:
+    with open(filename) as f:
+        if os.path.splitext(filename)[1].lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError('PyYAML is needed to read YAML specs, install it or use JSON')
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class BatchRunner:
+    def __init__(self, controller: Controller, workers: int = BATCH_WORKERS, deadline: float = COMMAND_DEADLINE) -> None:
+        self._controller = controller
+        self._commands = CommandExecutor(workers, deadline, self._report_failure)
+        self._condition = Condition()
+        self._outstanding = 0
+        self._operations = 0
+        self._skipped = 0
+        self._failures = []
+
+    def run(self, spec: dict) -> dict:
+        stats = self._controller.rpc_stats
+        stats.reset()
+        stats.set_enabled(True)
+        start = time.perf_counter()
+
+        if 'tempo' in spec:
+            self._submit('transport', 'set tempo', self._controller.transport.set_tempo, spec['tempo'])
+        for track in spec.get('tracks', []):
+            self._create_track(track)
+        # Top level parameters may belong to processors created above, so they wait for the graph to be built
+        self._wait()
+        processors = {}
+        for p in spec.get('parameters', []):
+            processors.setdefault(p['processor'], {})[p['parameter']] = p['value']
+        for name, values in processors.items():
+            self._submit(name, f'find processor {name}', self._controller.audio_graph.get_processor_id, name,
+                         then=lambda processor_id, n=name, v=values: self._set_parameters(processor_id, n, v),
+                         dependents=1 + len(values))
+
+        self._wait()
+        seconds = time.perf_counter() - start
+        self._commands.shutdown()
+
+        methods = stats.methods()
+        rpcs = sum(m['calls'] for m in methods.values())
+        return {'operations': self._operations,
+                'failed': len(self._failures),
+                'skipped': self._skipped,
+                'seconds': seconds,
+                'operations_per_second': self._operations / seconds if seconds > 0 else 0.0,
+                'rpcs': rpcs,
+                'rpcs_per_second': rpcs / seconds if seconds > 0 else 0.0,
+                'failures': self._failures,
+                'methods': methods}
+
+    def _wait(self) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: self._outstanding == 0)
+
+    def _create_track(self, track: dict) -> None:
+        name = track['name']
+        processors = track.get('processors', [])
+        parameters = track.get('parameters', {})
+        dependents = len(processors) + sum(self._processor_operations(p) for p in processors)
+        if parameters:
+            dependents += 1 + len(parameters)
+        self._submit(name, f'create track {name}', self._create_track_and_wait, track,
+                     then=lambda track_id: self._populate_track(track_id, name, processors, parameters),
+                     dependents=dependents)
+
+    def _populate_track(self, track_id: int, name: str, processors: List[dict], parameters: dict) -> None:
+        # Processors share the track as target, so they are created one at a time in the order given
+        for p in processors:
+            self._submit(name, f"create processor {p['name']}", self._create_processor_and_wait, p, track_id,
+                         then=lambda processor_id, p=p: self._configure_processor(processor_id, p),
+                         dependents=self._processor_operations(p))
+        if parameters:
+            self._set_parameters(track_id, name, parameters, self._controller.parameters.get_track_parameters)
+
+    def _configure_processor(self, processor_id: int, processor: dict) -> None:
+        name = processor['name']
+        audio_graph = self._controller.audio_graph
+        if 'bypassed' in processor:
+            self._submit(processor_id, f'bypass {name}', audio_graph.set_processor_bypass_state, processor_id,
+                         processor['bypassed'])
+        if 'program' in processor:
+            self._submit(processor_id, f'set program of {name}', self._controller.programs.set_processor_program,
+                         processor_id, processor['program'])
+        if processor.get('parameters'):
+            self._set_parameters(processor_id, name, processor['parameters'])
+
+    def _set_parameters(self, processor_id: int, name: str, values: Dict[str, float],
+                        get_parameters: Optional[Callable] = None) -> None:
+        get_parameters = get_parameters or self._controller.parameters.get_processor_parameters
+        self._submit(processor_id, f'get parameters of {name}', get_parameters, processor_id,
+                     then=lambda infos: self._set_values(processor_id, name, infos, values),
+                     dependents=len(values))
+
+    def _set_values(self, processor_id: int, name: str, infos: list, values: Dict[str, float]) -> None:
+        ids = {p.name: p.id for p in infos}
+        for parameter, value in values.items():
+            if parameter not in ids:
+                self._report_failure(f'set {name}.{parameter}', KeyError(f'No parameter named {parameter}'))
+                continue
+            # Every parameter is its own target, so they are all sent concurrently
+            self._submit((processor_id, ids[parameter]), f'set {name}.{parameter}',
+                         self._controller.parameters.set_parameter_value, processor_id, ids[parameter], value)
+
+    def _create_track_and_wait(self, track: dict) -> int:
+        audio_graph = self._controller.audio_graph
+        track_type = track.get('type', 'stereo').lower()
+        if track_type == 'multibus':
+            self._check(audio_graph.create_multibus_track(track['name'], track.get('outputs', 1),
+                                                          track.get('inputs', 1)))
+        elif track_type in ('mono', 'stereo'):
+            self._check(audio_graph.create_track(track['name'], track.get('channels', 1 if track_type == 'mono' else 2)))
+        else:
+            raise ValueError(f'Unknown track type {track_type}')
+        return self._wait_for_id(audio_graph.get_track_id, track['name'])
+
+    def _create_processor_and_wait(self, processor: dict, track_id: int) -> int:
+        audio_graph = self._controller.audio_graph
+        plugin_type = [t.lower() for t in PLUGIN_TYPES].index(processor.get('type', 'internal').lower()) + 1
+        self._check(audio_graph.create_processor_on_track(processor['name'], processor.get('uid', ''),
+                                                          processor.get('path', ''), plugin_type, track_id, 0, True))
+        return self._wait_for_id(audio_graph.get_processor_id, processor['name'])
+
+    @staticmethod
+    def _check(event) -> None:
+        # elkpy reports failed creations on the returned event instead of raising
+        if getattr(event, 'error', False):
+            raise RuntimeError('Sushi could not create it')
+
+    @staticmethod
+    def _wait_for_id(get_id: Callable, name: str) -> int:
+        # Sushi creates tracks and processors asynchronously, so they may not exist right after the call
+        end = time.monotonic() + (current_deadline() or COMMAND_DEADLINE)
+        while True:
+            try:
+                return get_id(name)
+            except Exception:
+                if time.monotonic() > end:
+                    raise
+                time.sleep(BATCH_POLL_INTERVAL)
+
+    @staticmethod
+    def _processor_operations(processor: dict) -> int:
+        parameters = processor.get('parameters', {})
+        return ('bypassed' in processor) + ('program' in processor) + (1 + len(parameters) if parameters else 0)
+
+    def _submit(self, target, description: str, function: Callable, *args, then: Optional[Callable] = None,
+                dependents: int = 0) -> None:
+        # then is called with the result and can submit more operations. If this one fails, the
+        # dependents operations then would have submitted are counted as skipped
+        with self._condition:
+            self._outstanding += 1
+            self._operations += 1
+        future = self._commands.submit(target, function, *args, description=description)
+        future.add_done_callback(lambda f: self._done(f, description, then, dependents))
+
+    def _done(self, future: Future, description: str, then: Optional[Callable], dependents: int) -> None:
+        try:
+            if then is not None:
+                if future.exception() is None:
+                    then(future.result())
+                else:
+                    with self._condition:
+                        self._skipped += dependents
+        except Exception as e:
+            self._report_failure(description, e)
+        finally:
+            with self._condition:
+                self._outstanding -= 1
+                self._condition.notify_all()
+
+    def _report_failure(self, description: str, error: Exception) -> None:
+        with self._condition:
+            self._failures.append({'operation': description, 'error': str(error)})
@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+from typing import Callable, List, Optional, Tuple
+
+import PySide6
+from PySide6.QtWidgets import QApplication
+
+from .mock_server import MockSushiServer
+from .constants import WRITE_RATE
+from . import layout_cache
+
+# Benchmarks of the GUI's hot paths against an in-process MockSushiServer, using the offscreen
+# Qt platform so they run headless. Results are printed or written as JSON, and a previous
+# result file can be given with --compare to see what changed between commits:
+#
+#   python -m sushi_gui.benchmark --sizes 4x4x16,16x8x32 --output before.json
+#   python -m sushi_gui.benchmark --sizes 4x4x16,16x8x32 --compare before.json
+RESULT_VERSION = 1
+DEFAULT_SIZES = '4x4x16,16x8x32,4x4x128'
+WINDOW_SIZE = (1600, 900)
+NOTIFICATION_STREAMS = 6
+
+
+def _rss() -> int:
+    # Resident memory of this process in bytes
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        # Peak rather than current on platforms without /proc, kilobytes on Linux but bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _wait_for(app: QApplication, condition: Callable[[], bool], timeout: float) -> float:
+    # Runs the event loop until condition is true, returns the time it took
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError('Timed out waiting for the GUI')
+        app.processEvents()
+        time.sleep(0.0005)
+    return time.perf_counter() - start
+
+
+def _percentiles(samples: List[float]) -> dict:
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    return {'count': len(samples),
+            'mean': statistics.fmean(samples),
+            'p50': samples[len(samples) // 2],
+            'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+            'max': samples[-1]}
+
+
+def _parse_size(size: str) -> Tuple[int, int, int]:
+    tracks, processors, parameters = (int(x) for x in size.lower().split('x'))
+    return tracks, processors, parameters
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Benchmark:
+    def __init__(self, app: QApplication, tracks: int, processors: int, parameters: int, latency: float,
+                 runs: int, duration: float, samples: int, timeout: float) -> None:
+        self._app = app
+        self._tracks = tracks
+        self._processors = processors
+        self._parameters = parameters
+        self._runs = runs
+        self._duration = duration
+        self._samples = samples
+        self._timeout = timeout
+        # elkpy leaves its notification streams open when a controller is closed, so every window
+        # opened keeps NOTIFICATION_STREAMS of the server's threads busy until the server stops
+        windows = 2 * runs + 2
+        self._server = MockSushiServer('localhost:0', tracks, processors, parameters, latency=latency,
+                                       workers=16 + windows * NOTIFICATION_STREAMS)
+
+    def run(self) -> dict:
+        self._server.start()
+        try:
+            results = {'startup': self.startup(cached=False),
+                       'startup_cached': self.startup(cached=True)}
+            window = self._open_window()
+            try:
+                results.update(self.parameter_widgets(window))
+                results['notification_throughput'] = self.notification_throughput(window)
+                results['slider_to_rpc'] = self.slider_to_rpc(window)
+            finally:
+                self._close_window(window)
+        finally:
+            self._server.stop()
+            self._forget_layout()
+        return results
+
+    def startup(self, cached: bool) -> dict:
+        # Time from MainWindow(...) until every track is in the graph model and the visible ones are built.
+        # With cached, the layout saved by the previous run is drawn before the live graph arrives
+        construct, loaded, built = [], [], []
+        if cached:
+            self._close_window(self._open_window())
+        for _ in range(self._runs):
+            if not cached:
+                self._forget_layout()
+            start = time.perf_counter()
+            window = self._create_window()
+            construct.append(time.perf_counter() - start)
+            try:
+                window.show()
+                self._wait_for_graph(window)
+                loaded.append(time.perf_counter() - start)
+                self._wait_for_visible_tracks(window)
+                built.append(time.perf_counter() - start)
+            finally:
+                self._close_window(window)
+        return {'construct': _percentiles(construct), 'graph_loaded': _percentiles(loaded),
+                'visible_tracks_built': _percentiles(built)}
+
+    def parameter_widgets(self, window) -> dict:
+        # Builds every track and expands every processor, memory is compared before and after
+        from .widgets import ParameterWidget
+        self._wait_for_visible_tracks(window)
+        rss_before = _rss()
+        start = time.perf_counter()
+        for track_id, track_snapshot in list(window._unbuilt_tracks.items()):
+            del window._unbuilt_tracks[track_id]
+            window._build_track(track_snapshot)
+        processors = [p for t in window.tracks.values() for p in t.processors.values()]
+        for p in processors:
+            p.expand()
+        _wait_for(self._app, lambda: all(p._body is not None for p in processors), self._timeout)
+        self._app.processEvents()
+        elapsed = time.perf_counter() - start
+        rss_delta = _rss() - rss_before
+
+        widget_count = len(window.findChildren(ParameterWidget))
+        parameter_count = self._tracks * self._processors * self._parameters
+        return {'expand_all': {'seconds': elapsed, 'processors': len(processors)},
+                'memory': {'rss_delta': rss_delta,
+                           'parameters': parameter_count,
+                           'parameter_widgets': widget_count,
+                           'rss_per_parameter': rss_delta / max(parameter_count, 1),
+                           'rss_per_parameter_widget': rss_delta / widget_count if widget_count else None}}
+
+    def notification_throughput(self, window) -> dict:
+        # Parameter notifications dispatched through process_parameter_notification as fast as possible,
+        # with the event loop run after each pass so the cost of repainting the widgets is included
+        from .main_window import sushi_grpc_types as types
+        graph = window._controller.graph
+        notifications = [types.ParameterUpdate(parameter=types.ParameterIdentifier(processor_id=proc_id,
+                                                                                   parameter_id=p.info.id),
+                                               normalized_value=(i % 100) / 100, formatted_value=str(i % 100))
+                         for proc_id, processor in graph.processors.items()
+                         for i, p in enumerate(processor.parameters or [])]
+        count = 0
+        passes = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < self._duration:
+            for n in notifications:
+                window.process_parameter_notification(n)
+            self._app.processEvents()
+            count += len(notifications)
+            passes += 1
+        elapsed = time.perf_counter() - start
+        return {'notifications': count, 'passes': passes, 'seconds': elapsed,
+                'per_second': count / elapsed if elapsed > 0 else 0.0}
+
+    def slider_to_rpc(self, window) -> dict:
+        # Delay from a slider move in the GUI until the set_parameter_value call to Sushi starts and
+        # returns. Moves are spaced out so the write queue is idle and its rate limit isn't measured
+        from .widgets import ParameterWidget
+        controller = window._controller
+        calls = []
+        original = controller.parameters.set_parameter_value
+
+        def timed(*args):
+            called = time.perf_counter()
+            original(*args)
+            calls.append((called, time.perf_counter()))
+
+        controller.parameters.set_parameter_value = timed
+        try:
+            move = self._slider_mover(window, ParameterWidget)
+            if move is None:
+                return {}
+            to_call, to_return = [], []
+            for i in range(self._samples):
+                expected = len(calls) + 1
+                start = time.perf_counter()
+                move(i)
+                _wait_for(self._app, lambda: len(calls) >= expected, self._timeout)
+                called, returned = calls[-1]
+                to_call.append(called - start)
+                to_return.append(returned - start)
+                time.sleep(1.0 / WRITE_RATE)
+            return {'to_call': _percentiles(to_call), 'to_return': _percentiles(to_return)}
+        finally:
+            del controller.parameters.set_parameter_value
+
+    def _slider_mover(self, window, widget_type) -> Optional[Callable[[int], None]]:
+        # Moves either a ParameterWidget slider or a row in a parameter list, whichever processors use.
+        # Cycles through three values, since Sushi echoing the previous move may set the slider back to it
+        widgets = window.findChildren(widget_type)
+        if widgets:
+            slider = next(w for w in widgets if w._value_slider.isEnabled())._value_slider
+            return lambda i: slider.setValue(100 + i % 3 * 100)
+        for track in window.tracks.values():
+            for processor in track.processors.values():
+                if processor._parameter_list is not None:
+                    model = processor._parameter_list
+                    return lambda i: model.set_value(0, 0.1 + i % 3 * 0.1)
+        return None
+
+    def _create_window(self):
+        from .main_window import MainWindow
+        window = MainWindow(sushi_address=self._server.address)
+        window.resize(*WINDOW_SIZE)
+        return window
+
+    def _open_window(self):
+        window = self._create_window()
+        window.show()
+        self._wait_for_graph(window)
+        return window
+
+    def _close_window(self, window) -> None:
+        window.close()
+        window._controller.close()
+        window.deleteLater()
+        self._app.processEvents()
+
+    def _wait_for_graph(self, window) -> None:
+        controller = window._controller
+        processor_count = self._tracks * self._processors
+        _wait_for(self._app, lambda: len(controller.graph.tracks) == self._tracks and
+                  len(controller.graph.processors) == processor_count, self._timeout)
+
+    def _wait_for_visible_tracks(self, window) -> None:
+        # The view has picked up every track and built the ones in view
+        _wait_for(self._app, lambda: len(window.tracks) + len(window._unbuilt_tracks) == self._tracks and
+                  not window._build_timer.isActive(), self._timeout)
+
+    def _forget_layout(self) -> None:
+        try:
+            os.remove(layout_cache._layout_path(self._server.address))
+        except OSError:
+            pass
+
+
+def _flatten(results: dict, prefix: str = '') -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: dict, results: dict) -> None:
+    # Prints the relative change of every metric that is in both result files
+    old = _flatten(baseline['results'])
+    new = _flatten(results['results'])
+    for name in sorted(old.keys() & new.keys()):
+        if old[name]:
+            change = (new[name] - old[name]) / old[name] * 100
+            print(f'{name:70} {old[name]:14.6g} {new[name]:14.6g} {change:+8.1f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Sushi GUI against a mock Sushi server')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='Comma separated graph sizes, as tracks x processors per track x parameters per processor')
+    parser.add_argument('--latency', type=float, default=0.0, help='Added latency per gRPC call, in seconds')
+    parser.add_argument('--runs', type=int, default=3, help='Startup runs per size')
+    parser.add_argument('--duration', type=float, default=2.0, help='Seconds to run the notification benchmark')
+    parser.add_argument('--samples', type=int, default=50, help='Slider moves to time per size')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Max seconds to wait for the GUI')
+    parser.add_argument('--output', help='Write the results to this file instead of printing them')
+    parser.add_argument('--compare', help='Result file of an earlier run to compare with')
+    args = parser.parse_args()
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QApplication(sys.argv[:1])
+    app.setStyle('Fusion')
+
+    results = {'version': RESULT_VERSION,
+               'commit': _git_commit(),
+               'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(),
+               'qt': PySide6.__version__,
+               'platform': platform.platform(),
+               'latency': args.latency,
+               'results': {}}
+    for size in args.sizes.split(','):
+        tracks, processors, parameters = _parse_size(size)
+        print(f'Benchmarking {tracks} tracks x {processors} processors x {parameters} parameters', file=sys.stderr)
+        benchmark = Benchmark(app, tracks, processors, parameters, args.latency, args.runs, args.duration,
+                              args.samples, args.timeout)
+        results['results'][size] = benchmark.run()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+from threading import Lock
+
+import grpc
+
+
+# One gRPC channel per Sushi address, shared by every controller connected to it and by all of
+# their sub-controllers. elkpy opens a channel per sub-controller, so without this each controller
+# would hold a dozen connections to the same device. Channels are closed when the last user releases them.
+class ChannelPool:
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._channels = {}
+
+    def acquire(self, address: str) -> grpc.Channel:
+        with self._lock:
+            channel, users = self._channels.get(address, (None, 0))
+            if channel is None:
+                channel = grpc.insecure_channel(address)
+            self._channels[address] = (channel, users + 1)
+            return channel
+
+    def release(self, address: str) -> None:
+        with self._lock:
+            channel, users = self._channels[address]
+            if users > 1:
+                self._channels[address] = (channel, users - 1)
+                return
+            del self._channels[address]
+        channel.close()
+
+
+channels = ChannelPool()
@@ -0,0 +1,40 @@
+import time
+from threading import Lock
+from typing import Dict, List, Tuple
+
+
+# Collects parameter and property notifications from the gRPC threads and keeps only the
+# latest one per parameter/property. The GUI picks them up in batches once per frame,
+# so a burst of updates to the same parameter costs one widget update instead of many.
+# For each parameter/property the time its oldest pending notification arrived is kept,
+# to measure how long changes wait before they are shown.
+class NotificationCoalescer:
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._parameters = {}
+        self._properties = {}
+        self._parameter_arrivals = {}
+        self._property_arrivals = {}
+
+    def add_parameter(self, notification) -> None:
+        key = (notification.parameter.processor_id, notification.parameter.parameter_id)
+        now = time.perf_counter()
+        with self._lock:
+            self._parameters[key] = notification
+            self._parameter_arrivals.setdefault(key, now)
+
+    def add_property(self, notification) -> None:
+        key = (notification.property.processor_id, notification.property.property_id)
+        now = time.perf_counter()
+        with self._lock:
+            self._properties[key] = notification
+            self._property_arrivals.setdefault(key, now)
+
+    def take(self) -> Tuple[List, List, Dict[str, List[float]]]:
+        with self._lock:
+            parameters, self._parameters = self._parameters, {}
+            properties, self._properties = self._properties, {}
+            parameter_arrivals, self._parameter_arrivals = self._parameter_arrivals, {}
+            property_arrivals, self._property_arrivals = self._property_arrivals, {}
+        return (list(parameters.values()), list(properties.values()),
+                {'parameter': list(parameter_arrivals.values()), 'property': list(property_arrivals.values())})
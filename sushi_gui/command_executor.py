@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Hashable, Optional
+
+_local = threading.local()
+
+
+def current_deadline() -> Optional[float]:
+    # The deadline of the command running on this thread, None outside of the executor
+    return getattr(_local, 'deadline', None)
+
+
+# Forwards every call to a gRPC stub, adding the deadline of the command that is running, or
+# default_deadline for calls made outside of a command, e.g. from the GUI thread or a scheduler thread.
+# elkpy doesn't expose timeouts, so this is wrapped around the stubs of its sub-controllers.
+# Calls are timed into stats, if given and enabled, under '<name>.<method>'
+class DeadlineStub:
+    def __init__(self, stub, name: str = '', stats: Optional['RpcStats'] = None,
+                 default_deadline: Optional[float] = None) -> None:
+        self._stub = stub
+        self._name = name
+        self._stats = stats
+        self._default_deadline = default_deadline
+
+    def __getattr__(self, name: str):
+        method = getattr(self._stub, name)
+        if not callable(method):
+            return method
+        stats = self._stats
+        default_deadline = self._default_deadline
+        method_name = f'{self._name}.{name}'
+
+        def call(*args, **kwargs):
+            deadline = current_deadline() or default_deadline
+            if deadline is not None and 'timeout' not in kwargs:
+                kwargs['timeout'] = deadline
+            if stats is None or not stats.enabled:
+                return method(*args, **kwargs)
+
+            started = time.time()
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                stats.record(method_name, started, time.perf_counter() - start, e)
+                raise
+            stats.record(method_name, started, time.perf_counter() - start)
+            return result
+
+        return call
+
+
+# Runs commands on a thread pool so the GUI never waits for Sushi. Commands that share a
+# target are run one at a time in the order they were submitted, commands for different
+# targets run concurrently. Errors are passed to on_error as well as set on the future.
+class CommandExecutor:
+    def __init__(self, workers: int, default_deadline: float,
+                 on_error: Optional[Callable[[str, Exception], None]] = None) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._default_deadline = default_deadline
+        self._on_error = on_error
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def submit(self, target: Hashable, function: Callable, *args, deadline: Optional[float] = None,
+               description: str = '') -> Future:
+        future = Future()
+        command = (function, args, deadline or self._default_deadline, description or function.__name__, future)
+        with self._lock:
+            queue = self._queues.get(target)
+            if queue is not None:
+                queue.append(command)
+                return future
+            self._queues[target] = deque()
+
+        self._start(target, command)
+        return future
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def _start(self, target: Hashable, command: tuple) -> None:
+        try:
+            self._executor.submit(self._run, target, command)
+        except RuntimeError as e:
+            # Executor is shut down, fail this and everything queued behind it
+            self._fail_remaining(target, command, e)
+
+    def _run(self, target: Hashable, command: tuple) -> None:
+        function, args, deadline, description, future = command
+        if future.set_running_or_notify_cancel():
+            _local.deadline = deadline
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+                self._report(description, e)
+            finally:
+                _local.deadline = None
+
+        with self._lock:
+            queue = self._queues[target]
+            if not queue:
+                del self._queues[target]
+                return
+            next_command = queue.popleft()
+        self._start(target, next_command)
+
+    def _fail_remaining(self, target: Hashable, command: tuple, error: Exception) -> None:
+        with self._lock:
+            commands = [command] + list(self._queues.pop(target, []))
+        for c in commands:
+            if c[-1].set_running_or_notify_cancel():
+                c[-1].set_exception(error)
+
+    def _report(self, description: str, error: Exception) -> None:
+        if self._on_error:
+            try:
+                self._on_error(description, error)
+            except Exception as e:
+                print(e)
@@ -1,3 +1,4 @@
+import os
 from enum import IntEnum
 
 SYNCMODES = ['Internal', 'Midi', 'Link']
@@ -16,10 +17,112 @@ SLIDER_HEIGHT = 15
 SLIDER_MIN_WIDTH = 100
 PAN_SLIDER_WIDTH = 60
 FILE_BUTTON_WIDTH = 40
+PARAMETER_ROW_HEIGHT = 22
+# Approximate width of a track with its scroll bar, used for placeholders of tracks that aren't built yet
+TRACK_WIDTH = PROCESSOR_WIDTH * MAX_COLUMNS + 40
+
+# Tracks within this many pixels of the visible part of the track strip are built
+TRACK_BUILD_MARGIN = TRACK_WIDTH
+
+# Processors with more parameters than this show them in a scrolling list that only draws the visible rows,
+# instead of one widget per parameter. The list shows at most PARAMETER_LIST_ROWS rows at a time
+PARAMETER_LIST_THRESHOLD = 32
+PARAMETER_LIST_ROWS = 16
+
+# Processors start collapsed and only fetch their parameters and properties when expanded.
+# With FREE_COLLAPSED_PROCESSORS, collapsing drops the widgets again and expanding fetches fresh values
+PROCESSORS_START_COLLAPSED = True
+FREE_COLLAPSED_PROCESSORS = False
 
 # Slider values are ints in QT, so we need to scale with an integer factor to get 0-1 floats
 SLIDER_MAX_VALUE = 1024
 
+# Number of gRPC requests in flight when fetching processor snapshots
+SNAPSHOT_WORKERS = 16
+
+# How many times per second parameter and property notifications are applied to the widgets.
+# Notifications in between are merged so only the latest value of each parameter is shown
+NOTIFICATION_FRAME_RATE = 30
+
+# Max number of times per second slider and tempo changes are sent to Sushi.
+# Changes in between are merged so only the latest value of each parameter is sent
+WRITE_RATE = 50
+
+# Commands (mute, delete, add plugin, etc) run on a thread pool with a deadline in seconds, which is also the
+# deadline of calls made outside of commands
+COMMAND_WORKERS = 4
+COMMAND_DEADLINE = 5.0
+SESSION_DEADLINE = 60.0
+
+# Notification lag, from arriving on the gRPC thread until the widgets are updated, is shown in the status bar
+# as p50/p99 over the latest NOTIFICATION_LAG_SAMPLES notifications of each kind, updated every interval in ms
+NOTIFICATION_LAG_SAMPLES = 1000
+NOTIFICATION_LAG_INTERVAL = 1000
+
+# Timing of every gRPC call, shown in Tools > RPC latency. Off at startup, it can be turned on from there.
+# Histogram bucket bounds are in seconds, and the slowest calls are picked from the last RPC_RECENT_CALLS
+RPC_STATS_ENABLED = False
+RPC_HISTOGRAM_BOUNDS = [0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+RPC_RECENT_CALLS = 1000
+RPC_SLOWEST_SHOWN = 20
+
+# Batch mode (sushi-batch.py) keeps this many calls to Sushi in flight, and polls this often, in seconds,
+# for tracks and processors it created to show up
+BATCH_WORKERS = 32
+BATCH_POLL_INTERVAL = 0.01
+
+# Dashboard (sushi-dashboard.py): seconds between attempts to reach an offline device, seconds without
+# timing notifications before a device is shown as not responding, and width of the address and status columns
+DASHBOARD_RETRY_INTERVAL = 5.0
+DASHBOARD_STALE_AFTER = 5.0
+DEVICE_LABEL_WIDTH = 160
+
+# Mirroring to follower devices: max batches of writes per second to each follower, coalesced like WRITE_RATE,
+# how many writes to each follower are in flight at once, the number of latest writes the lag p50/p99 is taken over,
+# and how long to wait for a follower to answer when it is added, in seconds
+MIRROR_WRITE_RATE = 50
+MIRROR_WORKERS = 8
+MIRROR_LAG_SAMPLES = 1000
+MIRROR_CONNECT_TIMEOUT = 5.0
+
+# Sessions are read and written in chunks of this many bytes, with progress shown in between. Files saved
+# with a .gz extension are compressed at this level
+SESSION_CHUNK_SIZE = 1 << 20
+SESSION_COMPRESSION_LEVEL = 6
+
+# Autosaves, when turned on in Settings: seconds between them, and how many distinct sessions are kept per address
+SESSION_AUTOSAVE_INTERVAL = 60
+SESSION_AUTOSAVE_KEEP = 20
+
+# Parameter snapshots (Tools > Snapshots): values closer than this to the current one aren't sent on recall,
+# and room for this many parameters is added to the value table each time it fills up
+PARAMETER_SNAPSHOT_TOLERANCE = 1e-6
+PARAMETER_TABLE_GROWTH = 1024
+
+# Morphing between snapshots: updates sent per second, and the number of steps each parameter's range is divided
+# into. A parameter is only sent when the morph moves it to another step
+MORPH_RATE = 30
+MORPH_RESOLUTION = 1000
+
+# Automation recording and playback. Recordings hold up to AUTOMATION_MAX_EVENTS parameter changes, 28 bytes each,
+# in buffers that start at AUTOMATION_INITIAL_EVENTS and double as needed. Playback sleeps until it's
+# AUTOMATION_SPIN_TIME seconds from the next change and then spins, and keeps the lateness of the last
+# AUTOMATION_JITTER_SAMPLES changes for its statistics
+AUTOMATION_MAX_EVENTS = 1 << 21
+AUTOMATION_INITIAL_EVENTS = 1 << 12
+AUTOMATION_SPIN_TIME = 0.002
+AUTOMATION_JITTER_SAMPLES = 10000
+
+# Generated gRPC modules are cached here, in a sub directory per version of the proto file
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'sushi-gui')
+PROTO_CACHE_DIR = os.path.join(CACHE_DIR, 'grpc')
+
+# The last graph shown for each Sushi address, drawn at startup before the live graph is loaded
+LAYOUT_CACHE_DIR = os.path.join(CACHE_DIR, 'layouts')
+
+# Autosaved sessions, stored by the hash of their contents so unchanged sessions aren't written again
+SESSION_STORE_DIR = os.path.join(CACHE_DIR, 'sessions')
+
 
 # Convenience enum
 class Direction(IntEnum):
@@ -1,20 +1,368 @@
-from PySide6.QtWidgets import QFileDialog
+import os
+from concurrent.futures import ThreadPoolExecutor, Future
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterator, List, Optional
+
 from elkpy.sushicontroller import SushiController
 from elkpy import sushi_info_types as sushi
 
-from .dialogs import AddTrackDialog, AddPluginDialog
-from .constants import Direction
+from .constants import Direction, SNAPSHOT_WORKERS, WRITE_RATE, COMMAND_WORKERS, COMMAND_DEADLINE, SESSION_DEADLINE, \
+    PROCESSORS_START_COLLAPSED, RPC_STATS_ENABLED
+from .coalescer import NotificationCoalescer
+from .notification_monitor import NotificationMonitor
+from .write_queue import WriteQueue
+from . import proto_cache, layout_cache, session_store
+from .channel_pool import channels
+from .command_executor import CommandExecutor, DeadlineStub
+from .rpc_stats import RpcStats
+from .mirror import Mirror
+from .parameter_snapshots import SnapshotStore
+from .automation import Automation
+from .graph_model import AudioGraphModel, TrackSnapshot, ProcessorSnapshot, ParameterSnapshot, PropertySnapshot
 
 
 # Expand the controller with a few convenience functions that better match our use case
 class Controller(SushiController):
 
-    def __init__(self, address: str, proto_file: str) -> None:
+    def __init__(self, address: str, proto_file: str,
+                 notification_monitor: Optional[NotificationMonitor] = None) -> None:
+        proto_cache.install()
         super().__init__(address, proto_file)
+        self._address = address
+        self._proto_file = proto_file
+        self._sushi_types, _ = proto_cache.modules_from_proto(proto_file)
         self._view = None
-        
+        self._closed = False
+        # Bumped on every reconnect, so graph loads started before it can tell they're stale
+        self._connection = 0
+        self.graph = AudioGraphModel()
+        self.pending_notifications = NotificationCoalescer()
+        # Views that outlive a controller, like the dashboard's rows across reconnection attempts, pass their own
+        self.notification_monitor = notification_monitor or NotificationMonitor()
+        # The command pools only start threads once they're used. The write queue, mirroring, snapshots
+        # and automation are created on first use, so a controller that only watches Sushi stays light
+        self.commands = CommandExecutor(COMMAND_WORKERS, COMMAND_DEADLINE, self.report_command_error)
+        self._lazy_lock = Lock()
+        self._writes: Optional[WriteQueue] = None
+        self._mirror: Optional[Mirror] = None
+        self._snapshots: Optional[SnapshotStore] = None
+        self._automation: Optional[Automation] = None
+        self.rpc_stats = RpcStats(RPC_STATS_ENABLED)
+        self._autosave = None
+        self._channel_address = None
+        self._wrap_stubs()
+        self._executor = ThreadPoolExecutor(max_workers=SNAPSHOT_WORKERS)
+
+    @property
+    def writes(self) -> WriteQueue:
+        return self._create('_writes', lambda: WriteQueue(WRITE_RATE))
+
+    @property
+    def mirror(self) -> Mirror:
+        return self._create('_mirror', lambda: Mirror(self))
+
+    @property
+    def snapshots(self) -> SnapshotStore:
+        return self._create('_snapshots', lambda: SnapshotStore(self))
+
+    @property
+    def automation(self) -> Automation:
+        return self._create('_automation', lambda: Automation(self))
+
+    def _create(self, name: str, create: Callable):
+        value = getattr(self, name)
+        if value is None:
+            with self._lazy_lock:
+                value = getattr(self, name)
+                if value is None:
+                    value = create()
+                    setattr(self, name, value)
+        return value
+
+    def _wrap_stubs(self) -> None:
+        # All sub-controllers are moved to the pooled channel for the address, the channels elkpy
+        # opened for them are closed once their stubs are dropped
+        if self._channel_address is not None:
+            channels.release(self._channel_address)
+        channel = channels.acquire(self._address)
+        self._channel_address = self._address
+        for name in ['keyboard', 'midi_controller', 'cv_gate_controller', 'osc_controller']:
+            controller = getattr(self, name)
+            controller._stub = type(controller._stub)(channel)
+        for name in ['audio_graph', 'parameters', 'programs', 'transport', 'session', 'system', 'audio_routing',
+                     'timings']:
+            controller = getattr(self, name)
+            controller._stub = DeadlineStub(type(controller._stub)(channel), name, self.rpc_stats, COMMAND_DEADLINE)
+
+    def reconnect(self, address: str) -> None:
+        # Opens new connections and notification streams but keeps the graph model, then compares
+        # the model with Sushi's graph so the view only has to update what changed while disconnected
+        self.notifications.close()
+        self._connection += 1
+        self._address = address
+        SushiController.__init__(self, address, self._proto_file)
+        self._wrap_stubs()
+        # Ids are only unique within one run of Sushi
+        self.graph.forget_deleted()
+        if self._mirror is not None:
+            self._mirror.forget_names()
+        self.subscribe_to_notifications()
+        Thread(target=self._reconcile_tracks, args=(list(self.graph.tracks.values()),), daemon=True).start()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._snapshots is not None:
+            self._snapshots.stop_morph()
+        if self._automation is not None:
+            self._automation.stop_playback()
+        if self._mirror is not None:
+            self._mirror.close()
+        if self._writes is not None:
+            self._writes.close()
+        super().close()
+        self._executor.shutdown(wait=False)
+        self.commands.shutdown()
+        channels.release(self._channel_address)
+
+    def load_tracks(self, track_ids: Optional[List[int]] = None) -> None:
+        # Graph discovery runs on its own thread and every track is handed over to
+        # the view as soon as its snapshot is complete, like the notifications are
+        Thread(target=self._load_tracks, args=(track_ids,), daemon=True).start()
+
+    def load_cached_tracks(self) -> List[TrackSnapshot]:
+        # Returns the tracks shown last time for this address, and starts checking them against Sushi
+        cached = layout_cache.load_layout(self._address) or []
+        cached = [t for t in cached if self.graph.add_track(t)]
+        Thread(target=self._reconcile_tracks, args=(cached,), daemon=True).start()
+        return cached
+
+    def save_layout(self) -> None:
+        # Parameters of collapsed processors are fetched on expansion anyway, so they aren't saved
+        layout_cache.save_layout(self._address, list(self.graph.tracks.values()),
+                                 parameters=not PROCESSORS_START_COLLAPSED)
+
+    def load_processor(self, track_id: int, processor_id: int) -> None:
+        Thread(target=self._load_processor, args=(track_id, processor_id), daemon=True).start()
+
+    def _load_tracks(self, track_ids: Optional[List[int]]) -> None:
+        try:
+            if track_ids is None:
+                track_infos = self.audio_graph.get_all_tracks()
+            else:
+                track_infos = [self.audio_graph.get_track_info(t) for t in track_ids]
+            self._view.track_list_received.emit(track_infos)
+
+            for snapshot in self.iter_track_snapshots(track_infos):
+                if self._closed:
+                    break
+                if self.graph.add_track(snapshot):
+                    self._view.track_snapshot_received.emit(snapshot)
+        except Exception as e:
+            if not self._closed:
+                print(f'Error loading tracks: {e}')
+
+    def load_processor_parameters(self, processor_id: int) -> None:
+        Thread(target=self._load_processor_parameters, args=(processor_id,), daemon=True).start()
+
+    def unload_processor_parameters(self, processor_id: int) -> None:
+        self.graph.set_processor_parameters(processor_id, None, None)
+
+    def _load_processor_parameters(self, processor_id: int) -> None:
+        try:
+            parameters, properties = self._collect_processor_parameters(self._request_processor_parameters(processor_id))
+            if not self._closed and self.graph.set_processor_parameters(processor_id, parameters, properties):
+                self._view.processor_parameters_received.emit(processor_id, parameters, properties)
+        except Exception as e:
+            if not self._closed:
+                print(f'Error loading parameters: {e}')
+
+    def _reconcile_tracks(self, cached: List[TrackSnapshot]) -> None:
+        # Tracks that look the same as last time only get their values patched,
+        # tracks that changed are rebuilt, and new tracks are loaded as usual
+        connection = self._connection
+        try:
+            cached = {t.info.id: t for t in cached}
+            # The tempo may have changed too, and isn't notified about after the fact
+            self._view.tempo_received.emit(self.transport.get_tempo())
+            track_infos = self.audio_graph.get_all_tracks()
+            self._view.track_list_received.emit(track_infos)
+
+            for snapshot in self.iter_track_snapshots(track_infos):
+                if self._closed or connection != self._connection:
+                    return
+                track_id = snapshot.info.id
+                old = cached.pop(track_id, None)
+                if old is not None:
+                    self._load_expanded_parameters(old, snapshot)
+                if old is None:
+                    if self.graph.add_track(snapshot):
+                        self._view.track_snapshot_received.emit(snapshot)
+                elif layout_cache.same_layout(old, snapshot):
+                    self._patch_values(old, snapshot)
+                elif self.graph.replace_track(snapshot):
+                    self._view.track_replaced.emit(snapshot)
+
+            for track_id in cached:
+                self.graph.remove_track(track_id)
+                self._view.track_removed.emit(track_id)
+            self.save_layout()
+        except Exception as e:
+            if not self._closed:
+                print(f'Error loading tracks: {e}')
+
+    def _load_expanded_parameters(self, old: TrackSnapshot, new: TrackSnapshot) -> None:
+        # Processors that have been expanded need their parameters compared too
+        old_processors = {p.info.id: p for p in old.processors}
+        for processor in new.processors:
+            old_processor = old_processors.get(processor.info.id)
+            if processor.parameters is None and old_processor is not None and old_processor.parameters is not None:
+                request = self._request_processor_parameters(processor.info.id)
+                processor.parameters, processor.properties = self._collect_processor_parameters(request)
+
+    def _patch_values(self, old: TrackSnapshot, new: TrackSnapshot) -> None:
+        # Differences take the same path to the widgets as notifications, but aren't mirrored or recorded,
+        # since nothing changed in Sushi itself
+        types = self._sushi_types
+        old_processors = [(old.info.id, old.parameters, [])] + [(p.info.id, p.parameters, p.properties) for p in old.processors]
+        new_processors = [(new.info.id, new.parameters, [])] + [(p.info.id, p.parameters, p.properties) for p in new.processors]
+        for (proc_id, old_params, old_props), (_, new_params, new_props) in zip(old_processors, new_processors):
+            if old_params is None or new_params is None:
+                continue
+            for o, n in zip(old_params, new_params):
+                if o.value != n.value or o.txt_value != n.txt_value:
+                    self._apply_parameter_update(types.ParameterUpdate(
+                        parameter=types.ParameterIdentifier(processor_id=proc_id, parameter_id=n.info.id),
+                        normalized_value=n.value, formatted_value=n.txt_value))
+            for o, n in zip(old_props, new_props):
+                if o.value != n.value:
+                    self._apply_property_update(types.PropertyValue(
+                        property=types.PropertyIdentifier(processor_id=proc_id, property_id=n.info.id),
+                        value=n.value))
+
+    def _load_processor(self, track_id: int, processor_id: int) -> None:
+        try:
+            snapshot = self.get_processor_snapshot(self.audio_graph.get_processor_info(processor_id))
+            # Only the order is needed from the track, everything else is already in the model
+            track_order = self.audio_graph.get_track_info(track_id).processors
+            position = track_order.index(processor_id)
+            index = len([p for p in track_order[:position] if self.graph.processor_track(p) == track_id])
+            if not self._closed and self.graph.add_processor(track_id, snapshot, index):
+                self._view.processor_snapshot_received.emit(track_id, index, snapshot)
+        except Exception as e:
+            if not self._closed:
+                print(f'Error loading processor: {e}')
+
+    def iter_track_snapshots(self, track_infos: List[sushi.TrackInfo],
+                             parameters: bool = False) -> Iterator[TrackSnapshot]:
+        # Every request is queued up front and follow-up requests are chained onto the ones
+        # they depend on, so the whole graph is fetched in a few pipelined round trips.
+        # Snapshots are still returned in track order, each as soon as it is complete.
+        # With parameters, those of collapsed processors are fetched too
+        requests = [self._request_track(t, parameters) for t in track_infos]
+        for request in requests:
+            yield self._collect_track(request)
+
+    def get_track_snapshots(self, track_infos: List[sushi.TrackInfo],
+                            parameters: bool = False) -> List[TrackSnapshot]:
+        return list(self.iter_track_snapshots(track_infos, parameters))
+
+    def get_track_snapshot(self, track_info: sushi.TrackInfo) -> TrackSnapshot:
+        return self.get_track_snapshots([track_info])[0]
+
+    def get_processor_snapshots(self, processor_infos: List[sushi.ProcessorInfo]) -> List[ProcessorSnapshot]:
+        requests = [self._request_processor(p) for p in processor_infos]
+        return [self._collect_processor(r) for r in requests]
+
+    def get_processor_snapshot(self, processor_info: sushi.ProcessorInfo) -> ProcessorSnapshot:
+        return self.get_processor_snapshots([processor_info])[0]
+
+    def _then(self, future: Future, callback: Callable) -> Future:
+        # Run callback on the result of future without blocking the caller.
+        # The callback must only queue more work, never wait for it.
+        chained = Future()
+
+        def done(f: Future) -> None:
+            try:
+                chained.set_result(callback(f.result()))
+            except Exception as e:
+                chained.set_exception(e)
+
+        future.add_done_callback(done)
+        return chained
+
+    def _request_track(self, track_info: sushi.TrackInfo, parameters: bool = False) -> dict:
+        submit = self._executor.submit
+        return {'info': track_info,
+                'parameters': self._request_parameter_values(track_info.id,
+                                                             submit(self.parameters.get_track_parameters, track_info.id)),
+                'processors': self._then(submit(self.audio_graph.get_track_processors, track_info.id),
+                                         lambda processors: [self._request_processor(p, parameters)
+                                                             for p in processors])}
+
+    def _request_processor(self, processor_info: sushi.ProcessorInfo, parameters: bool = False) -> dict:
+        submit = self._executor.submit
+        proc_id = processor_info.id
+        # Collapsed processors fetch their parameters and properties when first expanded
+        request = {'info': processor_info,
+                   'parameters': None,
+                   'properties': None,
+                   'bypassed': submit(self.audio_graph.get_processor_bypass_state, proc_id),
+                   'programs': None,
+                   'current_program': None}
+        if parameters or not PROCESSORS_START_COLLAPSED:
+            request.update(self._request_processor_parameters(proc_id))
+        if processor_info.program_count > 0:
+            request['programs'] = submit(self.programs.get_processor_programs, proc_id)
+            request['current_program'] = submit(self.programs.get_processor_current_program, proc_id)
+        return request
+
+    def _request_processor_parameters(self, processor_id: int) -> dict:
+        submit = self._executor.submit
+        return {'parameters': self._request_parameter_values(processor_id,
+                                                             submit(self.parameters.get_processor_parameters, processor_id)),
+                'properties': self._then(submit(self.parameters.get_processor_properties, processor_id),
+                                         lambda properties: [(p, submit(self.parameters.get_property_value, processor_id, p.id))
+                                                             for p in properties])}
+
+    def _request_parameter_values(self, processor_id: int, parameters: Future) -> Future:
+        submit = self._executor.submit
+        return self._then(parameters, lambda params: [(p, submit(self.parameters.get_parameter_value, processor_id, p.id),
+                                                       submit(self.parameters.get_parameter_value_as_string, processor_id, p.id))
+                                                      for p in params])
+
+    def _collect_track(self, request: dict) -> TrackSnapshot:
+        return TrackSnapshot(request['info'],
+                             self._collect_parameter_values(request['parameters']),
+                             [self._collect_processor(r) for r in request['processors'].result()])
+
+    def _collect_processor(self, request: dict) -> ProcessorSnapshot:
+        programs = request['programs']
+        current_program = request['current_program']
+        parameters, properties = self._collect_processor_parameters(request)
+        return ProcessorSnapshot(request['info'],
+                                 parameters,
+                                 properties,
+                                 programs.result() if programs else [],
+                                 current_program.result() if current_program else 0,
+                                 request['bypassed'].result())
+
+    def _collect_processor_parameters(self, request: dict) -> tuple:
+        if request['parameters'] is None:
+            return None, None
+        return (self._collect_parameter_values(request['parameters']),
+                [PropertySnapshot(p, value.result()) for p, value in request['properties'].result()])
+
+    @staticmethod
+    def _collect_parameter_values(parameters: Future) -> List[ParameterSnapshot]:
+        return [ParameterSnapshot(p, value.result(), txt_value.result()) for p, value, txt_value in parameters.result()]
+
     def emit_track_notification(self, notification) -> None:
         try:
+            if notification.action == 2:  # TRACK_DELETED
+                self.graph.remove_track(notification.track.id)
+            self.notification_monitor.queued('track')
             self._view.track_notification_received.emit(notification)
         # Note, if an exception in a notification handler is not caught, that notification stops working
         except Exception as e:
@@ -22,57 +370,165 @@ class Controller(SushiController):
 
     def emit_processor_notification(self, notification) -> None:
         try:
+            if notification.action == 2:  # PROCESSOR_DELETED
+                self.graph.remove_processor(notification.parent_track.id, notification.processor.id)
+            self.notification_monitor.queued('processor')
             self._view.processor_notification_received.emit(notification)
         except Exception as e:
             print(e)
 
     def emit_parameter_notification(self, notification) -> None:
         try:
-            self._view.parameter_notification_received.emit(notification)
+            self._apply_parameter_update(notification)
+            # Nothing is recorded or mirrored before automation or mirroring have been used
+            if self._automation is not None:
+                self._automation.record_parameter_notification(notification)
+            if self._mirror is not None:
+                self._mirror.parameter(notification.parameter.processor_id, notification.parameter.parameter_id,
+                                       notification.normalized_value)
         except Exception as e:
             print(e)
 
     def emit_transport_notification(self, notification) -> None:
         try:
+            if self._mirror is not None:
+                self._mirror.transport_notification(notification)
+            if self._automation is not None:
+                self._automation.transport_notification(notification)
+            self.notification_monitor.queued('transport')
             self._view.transport_notification_received.emit(notification)
         except Exception as e:
             print(e)
 
     def emit_timing_notification(self, notification) -> None:
         try:
+            self.notification_monitor.queued('timing')
             self._view.timing_notification_received.emit(notification)
         except Exception as e:
             print(e)
 
     def emit_property_notification(self, notification) -> None:
         try:
-            self._view.property_notification_received.emit(notification)
+            self._apply_property_update(notification)
         except Exception as e:
             print(e)
 
-    def subscribe_to_notifications(self) -> None:
+    def _apply_parameter_update(self, notification) -> None:
+        # Updates the model and the view only
+        self.graph.apply_parameter_notification(notification)
+        self.pending_notifications.add_parameter(notification)
+        if self._snapshots is not None:
+            self._snapshots.apply_parameter_notification(notification)
+
+    def _apply_property_update(self, notification) -> None:
+        self.graph.apply_property_notification(notification)
+        self.pending_notifications.add_property(notification)
+
+    def subscribe_to_notifications(self, processors: bool = True) -> None:
+        # Views that don't show processors, like the dashboard, skip processor, parameter and property notifications
         self.notifications.subscribe_to_track_changes(self.emit_track_notification)
-        self.notifications.subscribe_to_processor_changes(self.emit_processor_notification)
-        self.notifications.subscribe_to_parameter_updates(self.emit_parameter_notification)
         self.notifications.subscribe_to_transport_changes(self.emit_transport_notification)
         self.notifications.subscribe_to_timing_updates(self.emit_timing_notification)
-        self.notifications.subscribe_to_property_updates(self.emit_property_notification)
+        if processors:
+            self.notifications.subscribe_to_processor_changes(self.emit_processor_notification)
+            self.notifications.subscribe_to_parameter_updates(self.emit_parameter_notification)
+            self.notifications.subscribe_to_property_updates(self.emit_property_notification)
         self.timings.set_timings_enabled(True)
         self.timings.reset_all_timings()
 
+    def queue_parameter_value(self, processor_id: int, parameter_id: int, value: float) -> None:
+        # Changes made in the GUI are mirrored straight away, rather than when Sushi notifies about them
+        self.mirror.parameter(processor_id, parameter_id, value)
+        self.writes.put(('parameter', processor_id, parameter_id), self.parameters.set_parameter_value,
+                        processor_id, parameter_id, value)
+
+    def queue_tempo(self, tempo: float) -> None:
+        self.mirror.tempo(tempo)
+        self.writes.put(('tempo',), self.transport.set_tempo, tempo)
+
+    def flush_writes(self) -> None:
+        self.writes.flush()
+
+    def run_command(self, target, function: Callable, *args, deadline: Optional[float] = None) -> Future:
+        # Commands with the same target, i.e. the same processor or track id, are never reordered
+        return self.commands.submit(target, function, *args, deadline=deadline)
+
+    def report_command_error(self, description: str, error: Exception) -> None:
+        if not self._closed:
+            self._view.command_failed.emit(f'{description} failed: {error}')
+
     def set_playing(self) -> None:
-        self.transport.set_playing_mode(2)
+        self.mirror.playing_mode(2)
+        self.run_command('transport', self.transport.set_playing_mode, 2)
 
     def set_stopped(self) -> None:
-        self.transport.set_playing_mode(1)
+        self.mirror.playing_mode(1)
+        self.run_command('transport', self.transport.set_playing_mode, 1)
+
+    def set_processor_bypass(self, processor_id: int, bypassed: bool) -> Future:
+        self.mirror.bypass(processor_id, bypassed)
+        return self.run_command(processor_id, self._set_processor_bypass, processor_id, bypassed)
+
+    def _set_processor_bypass(self, processor_id: int, bypassed: bool) -> None:
+        self.audio_graph.set_processor_bypass_state(processor_id, bypassed)
+        # Sushi doesn't notify about bypass changes
+        if self.graph.has_processor(processor_id):
+            self.graph.processors[processor_id].bypassed = bypassed
+
+    def set_processor_program(self, processor_id: int, program_id: int) -> Future:
+        self.mirror.program(processor_id, program_id)
+        return self.run_command(processor_id, self._set_processor_program, processor_id, program_id)
+
+    def _set_processor_program(self, processor_id: int, program_id: int) -> None:
+        self.programs.set_processor_program(processor_id, program_id)
+        if self.graph.has_processor(processor_id):
+            self.graph.processors[processor_id].current_program = program_id
+
+    def set_parameter_value(self, processor_id: int, parameter_id: int, value: float) -> Future:
+        self.mirror.parameter(processor_id, parameter_id, value)
+        return self.run_command(processor_id, self.parameters.set_parameter_value, processor_id, parameter_id, value)
+
+    def set_parameter_values(self, processor_ids: List[int], parameter_ids: List[int], values: List[float]) -> None:
+        # Sends many values at once over the snapshot workers and waits for all of them
+        futures = [self._executor.submit(self.parameters.set_parameter_value, processor_id, parameter_id, value)
+                   for processor_id, parameter_id, value in zip(processor_ids, parameter_ids, values)]
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            raise RuntimeError(f'{len(errors)} of {len(futures)} values could not be set, e.g. {errors[0]}')
+
+    def get_parameter_values(self, processor_ids: Optional[List[int]] = None) -> Dict[int, List[ParameterSnapshot]]:
+        # Parameters of tracks and processors, all of them if None. They're taken from the graph model
+        # where loaded, the rest are fetched from Sushi with every request queued up front
+        if processor_ids is None:
+            processor_ids = list(self.graph.tracks) + list(self.graph.processors)
+        values = {}
+        requests = {}
+        for processor_id in processor_ids:
+            if self.graph.has_track(processor_id):
+                values[processor_id] = self.graph.tracks[processor_id].parameters
+            elif self.graph.has_processor(processor_id) and self.graph.processors[processor_id].parameters is not None:
+                values[processor_id] = self.graph.processors[processor_id].parameters
+            else:
+                requests[processor_id] = self._request_parameter_values(
+                    processor_id, self._executor.submit(self.parameters.get_processor_parameters, processor_id))
+        for processor_id, request in requests.items():
+            values[processor_id] = self._collect_parameter_values(request)
+        return values
+
+    def set_property_value(self, processor_id: int, property_id: int, value: str) -> Future:
+        return self.run_command(processor_id, self.parameters.set_property_value, processor_id, property_id, value)
 
     def delete_processor(self, track_id: int, processor_id: int) -> None:
-        self.audio_graph.delete_processor_from_track(processor_id, track_id)
+        # Changes to a track's processors share the track as target, so adds, moves and deletes on a
+        # track run in the order they were made. Bypass, program and value changes use the processor
+        self.run_command(track_id, self.audio_graph.delete_processor_from_track, processor_id, track_id)
 
     def delete_track(self, track_id: int) -> None:
-        super().audio_graph.delete_track(track_id)
+        self.run_command(track_id, self.audio_graph.delete_track, track_id)
 
     def add_track(self) -> None:
+        # Dialogs are imported where they're used, so the controller works without Qt, e.g. for the batch runner
+        from .dialogs import AddTrackDialog
         dialog = AddTrackDialog(self._view)
         if dialog.exec_():
             track_type = dialog.track_type.currentText()
@@ -81,29 +537,28 @@ class Controller(SushiController):
             name = dialog.name_entry.text().strip()
 
             if track_type == 'Multibus':
-                self.audio_graph.create_multibus_track(name, outputs, inputs)
+                self.run_command('graph', self.audio_graph.create_multibus_track, name, outputs, inputs)
             elif track_type == 'Stereo':
-                self.audio_graph.create_track(name, 2)
+                self.run_command('graph', self.audio_graph.create_track, name, 2)
             elif track_type == 'Mono':
-                self.audio_graph.create_track(name, 1)
+                self.run_command('graph', self.audio_graph.create_track, name, 1)
 
     def add_plugin(self, track_id):
+        from .dialogs import AddPluginDialog
         dialog = AddPluginDialog(self._view)
         if dialog.exec_():
             name = dialog.name_entry.text().strip()
             uid = dialog.uid_entry.text().strip()
             path = dialog.path_entry.text().strip()
             p_type = dialog.plugin_type
-            try:
-                self.audio_graph.create_processor_on_track(name, uid, path, p_type, track_id, 0, True)
-            except Exception as e:
-                print('Error creating plugin: {}'.format(e))   
+            self.run_command(track_id, self.audio_graph.create_processor_on_track, name, uid, path, p_type,
+                             track_id, 0, True)
 
     def move_processor(self, track_id, processor_id, direction):
-        track_info = self.audio_graph.get_track_info(track_id)
-        index = track_info.processors.index(processor_id)
+        processors = self.graph.track_processors(track_id)
+        index = processors.index(processor_id)
 
-        proc_count = len(track_info.processors)
+        proc_count = len(processors)
         if (direction == Direction.UP and index == 0) or (direction == direction.DOWN and index == proc_count - 1):
             # Processor is not in a place where it can be moved
             return
@@ -112,41 +567,163 @@ class Controller(SushiController):
         add_to_back = direction == Direction.DOWN and index == proc_count - 2
         before_processor = 0 
         if direction == Direction.UP:
-            before_processor = track_info.processors[index - 1] 
+            before_processor = processors[index - 1] 
         elif not add_to_back:
-            before_processor = track_info.processors[index + 2]
+            before_processor = processors[index + 2]
 
-        self.audio_graph.move_processor_on_track(processor_id, track_id, track_id, add_to_back, before_processor)
+        new_index = index - 1 if direction == Direction.UP else index + 1
+        self.run_command(track_id, self._move_processor, track_id, processor_id, before_processor, add_to_back,
+                         new_index, direction)
 
-        self._view.tracks[track_id].move_processor(processor_id, direction)
+    def _move_processor(self, track_id, processor_id, before_processor, add_to_back, new_index, direction):
+        self.audio_graph.move_processor_on_track(processor_id, track_id, track_id,
+                                                 before_processor=before_processor, add_to_back=add_to_back)
+        # Sushi doesn't notify about moves, so the model has to be updated here
+        self.graph.move_processor(track_id, processor_id, new_index)
+        self._view.processor_moved.emit(track_id, processor_id, direction)
 
     def set_sync_mode_txt(self, txt_mode):
         if txt_mode == 'Internal':
-            self.transport.set_sync_mode(sushi.SyncMode.INTERNAL)
+            self.run_command('transport', self.transport.set_sync_mode, sushi.SyncMode.INTERNAL)
         elif txt_mode == 'Link':
-            self.transport.set_sync_mode(sushi.SyncMode.LINK)
+            self.run_command('transport', self.transport.set_sync_mode, sushi.SyncMode.LINK)
         if txt_mode == 'Midi':
-            self.transport.set_sync_mode(sushi.SyncMode.MIDI)
+            self.run_command('transport', self.transport.set_sync_mode, sushi.SyncMode.MIDI)
 
     def save_session(self):
-        filename, _ = QFileDialog.getSaveFileName(self._view, 'Save Session As', '', '')
+        from PySide6.QtWidgets import QFileDialog
+        filename, selected_filter = QFileDialog.getSaveFileName(
+            self._view, 'Save Session As', '', "Sushi Files (*.sushi);;Compressed Sushi Files (*.sushi.gz)")
 
         if filename:
-            if not filename.endswith('.sushi'):
+            if selected_filter.startswith('Compressed') and not filename.endswith('.gz'):
+                filename = (filename[:-len('.sushi')] if filename.endswith('.sushi') else filename) + '.sushi.gz'
+            elif not filename.endswith('.sushi') and not filename.endswith('.sushi.gz'):
                 filename += '.sushi'
 
-            saved_session = self.session.save_binary_session();
-            with open(filename, 'wb') as f:
-                f.write(saved_session)
+            self.run_command('session', self._save_session, filename, deadline=SESSION_DEADLINE)
+
+    def _save_session(self, filename: str) -> None:
+        self._show_session_progress('Fetching session from Sushi', 0.0)
+        saved_session = self.session.save_binary_session()
+        written = session_store.write_session(filename, saved_session, filename.endswith('.gz'),
+                                              lambda done: self._show_session_progress('Saving session', done))
+        # Every value in the graph is saved next to the session, so it can be restored without rebuilding the graph
+        self._show_session_progress('Saving parameter values', 1.0)
+        tracks = self.get_track_snapshots(self.audio_graph.get_all_tracks(), parameters=True)
+        layout_cache.write_tracks(session_store.values_path(filename), self._address, tracks)
+        self._show_session_progress('Session saved' if written else 'Session unchanged, not saved again', 1.0)
 
     def restore_session(self):
-        filename, _ = QFileDialog.getOpenFileName(self._view, 'Load Session', '', "Sushi Files (*.sushi)")
+        from PySide6.QtWidgets import QFileDialog
+        filename, _ = QFileDialog.getOpenFileName(self._view, 'Load Session', '', "Sushi Files (*.sushi *.sushi.gz)")
 
         if filename:
-            with open(filename, 'rb') as f:
-                saved_session = f.read()
+            self.run_command('session', self._restore_session, filename, deadline=SESSION_DEADLINE)
+
+    def _restore_session(self, filename: str) -> None:
+        saved_session = session_store.read_session(filename,
+                                                   lambda done: self._show_session_progress('Loading session', done))
+        if self._restore_values(filename, saved_session):
+            return
+        self._show_session_progress('Sending session to Sushi', 1.0)
+        self.session.restore_binary_session(saved_session)
+        self._show_session_progress('Session loaded', 1.0)
+
+    def _restore_values(self, filename: str, saved_session: bytes) -> bool:
+        # Restoring the binary session makes Sushi rebuild the whole graph, and the GUI with it. If the
+        # graph already has the saved tracks, processors and parameters only the values that differ are
+        # set instead. Plugins and connections are compared in Sushi's own session, which has them.
+        # Returns False when a full restore is needed
+        values_path = session_store.values_path(filename)
+        if not os.path.exists(values_path):
+            return False
+        try:
+            saved = layout_cache.read_tracks(values_path)
+        except Exception as e:
+            print(f'Could not read saved values: {e}')
+            return False
+        self._show_session_progress('Comparing session with Sushi', 1.0)
+        live = self.get_track_snapshots(self.audio_graph.get_all_tracks(), parameters=True)
+        live_session = self.session.save_binary_session()
+        if saved is None or live_session is None or \
+                not layout_cache.same_structure(saved, live, self._parse_session(saved_session),
+                                                self._parse_session(live_session)):
+            return False
+
+        states, values = [], []
+        for saved_track, live_track in zip(saved, live):
+            values += self._value_writes(live_track.info.id, saved_track.parameters, live_track.parameters, [], [])
+            for saved_processor, live_processor in zip(saved_track.processors, live_track.processors):
+                processor_id = live_processor.info.id
+                set_program = saved_processor.current_program != live_processor.current_program
+                if set_program or saved_processor.bypassed != live_processor.bypassed:
+                    states.append((self._restore_processor_state, live_track.info.id, processor_id,
+                                   saved_processor.bypassed, saved_processor.current_program, set_program))
+                # A program change sets the processor's values, so every saved value is sent after it
+                values += self._value_writes(processor_id, saved_processor.parameters, live_processor.parameters,
+                                             saved_processor.properties, live_processor.properties,
+                                             changed_only=not set_program)
+
+        # Bypass and program changes are sent first and waited for, so a program change can't overwrite
+        # restored values. The values are then sent as one batch over the snapshot workers, and reach
+        # the widgets as notifications like any other change
+        writes = len(states) + len(values)
+        self._show_session_progress(f'Setting {writes} changed values', 1.0)
+        errors = self._run_writes(states) + self._run_writes(values)
+        if errors:
+            raise RuntimeError(f'{len(errors)} of {writes} values could not be set, e.g. {errors[0]}')
+        self._show_session_progress(f'Session loaded, {writes} values changed', 1.0)
+        return True
+
+    def _parse_session(self, data: bytes):
+        session = self._sushi_types.SessionState()
+        session.ParseFromString(data)
+        return session
+
+    def _run_writes(self, writes: list) -> List[Exception]:
+        futures = [self._executor.submit(*write) for write in writes]
+        return [f.exception() for f in futures if f.exception() is not None]
+
+    def _value_writes(self, processor_id: int, saved_parameters: List[ParameterSnapshot],
+                      live_parameters: List[ParameterSnapshot], saved_properties: List[PropertySnapshot],
+                      live_properties: List[PropertySnapshot], changed_only: bool = True) -> list:
+        writes = [(self.parameters.set_parameter_value, processor_id, live.info.id, saved.value)
+                  for saved, live in zip(saved_parameters, live_parameters)
+                  if saved.value != live.value or not changed_only]
+        writes += [(self.parameters.set_property_value, processor_id, live.info.id, saved.value)
+                   for saved, live in zip(saved_properties, live_properties)
+                   if saved.value != live.value or not changed_only]
+        return writes
+
+    def _restore_processor_state(self, track_id: int, processor_id: int, bypassed: bool, program: int,
+                                 set_program: bool) -> None:
+        # Sushi doesn't notify about bypass and program changes, so the view is told directly
+        self.audio_graph.set_processor_bypass_state(processor_id, bypassed)
+        if set_program:
+            self.programs.set_processor_program(processor_id, program)
+        if self.graph.has_processor(processor_id):
+            self.graph.processors[processor_id].bypassed = bypassed
+            self.graph.processors[processor_id].current_program = program
+        self._view.processor_state_received.emit(track_id, processor_id, bypassed, program)
+
+    def autosave_session(self) -> None:
+        # Skipped while the previous autosave, or any other session command, is still running
+        if self._autosave is None or self._autosave.done():
+            self._autosave = self.run_command('session', self._autosave_session, deadline=SESSION_DEADLINE)
+
+    def _autosave_session(self) -> None:
+        session_store.store_session(self._address, self.session.save_binary_session())
+
+    def restore_autosaved_session(self) -> None:
+        filename = session_store.latest_session(self._address)
+        if filename is None:
+            self._view.command_failed.emit('No autosaved session for this address')
+            return
+        self.run_command('session', self._restore_session, filename, deadline=SESSION_DEADLINE)
 
-            self.session.restore_binary_session(saved_session)
+    def _show_session_progress(self, text: str, done: float) -> None:
+        self._view.session_progress.emit(text, int(done * 100))
 
     def set_view(self, view):
         self._view = view
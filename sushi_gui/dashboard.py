@@ -0,0 +1,226 @@
+import time
+from threading import Thread
+from typing import Dict, List, Optional
+
+from PySide6.QtCore import Qt, Signal, QTimer
+from PySide6.QtGui import QAction
+from PySide6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QScrollArea, \
+    QFrame, QInputDialog
+
+from .constants import MODE_PLAYING, DASHBOARD_RETRY_INTERVAL, DASHBOARD_STALE_AFTER, DEVICE_LABEL_WIDTH
+from .controller import Controller
+from .notification_monitor import NotificationMonitor
+from .main_window import MainWindow, proto_file
+
+
+# One row of the dashboard, and the view of that device's controller. Only track, transport and
+# timing notifications are subscribed to, and the controller never writes, mirrors or records, so
+# those parts of it are never created. A device costs its channel and its notification thread.
+class DeviceWidget(QFrame):
+    track_notification_received = Signal(object)
+    transport_notification_received = Signal(object)
+    timing_notification_received = Signal(object)
+    command_failed = Signal(str)
+    connected = Signal(object, int, bool, float)
+    connection_failed = Signal(str)
+
+    def __init__(self, address: str, parent: QWidget) -> None:
+        super().__init__(parent)
+        self.address = address
+        self._controller: Optional[Controller] = None
+        # Kept across controllers, so notifications that arrive while connecting are paired up too
+        self._notification_monitor = NotificationMonitor()
+        self._editor: Optional[MainWindow] = None
+        self._track_count = 0
+        self._playing = False
+        self._tempo = 0.0
+        self._last_update = 0.0
+        self._closed = False
+        self.setFrameShape(QFrame.StyledPanel)
+        self._layout = QHBoxLayout(self)
+        self.setLayout(self._layout)
+
+        self._address_label = QLabel(address, self)
+        self._address_label.setFixedWidth(DEVICE_LABEL_WIDTH)
+        self._layout.addWidget(self._address_label)
+        self._status_label = QLabel('Connecting', self)
+        self._status_label.setFixedWidth(DEVICE_LABEL_WIDTH)
+        self._layout.addWidget(self._status_label)
+        self._cpu_label = QLabel('Cpu: -', self)
+        self._layout.addWidget(self._cpu_label)
+        self._transport_label = QLabel('', self)
+        self._layout.addWidget(self._transport_label)
+        self._tracks_label = QLabel('', self)
+        self._layout.addWidget(self._tracks_label)
+        self._layout.addStretch()
+        self._open_button = QPushButton('Open', self)
+        self._open_button.setEnabled(False)
+        self._layout.addWidget(self._open_button)
+
+        self._retry_timer = QTimer(self)
+        self._retry_timer.setSingleShot(True)
+        self._retry_timer.setInterval(int(DASHBOARD_RETRY_INTERVAL * 1000))
+
+        self._connect_signals()
+        self.connect_device()
+
+    def _connect_signals(self) -> None:
+        self.track_notification_received.connect(self.process_track_notification)
+        self.transport_notification_received.connect(self.process_transport_notification)
+        self.timing_notification_received.connect(self.process_timing_notification)
+        self.command_failed.connect(self._status_label.setText)
+        self.connected.connect(self.set_connected)
+        self.connection_failed.connect(self.set_connection_failed)
+        self._open_button.clicked.connect(self.open_editor)
+        self._retry_timer.timeout.connect(self.connect_device)
+
+    def connect_device(self) -> None:
+        # Connecting blocks until Sushi answers or the connection fails, so it's done in the background
+        self._status_label.setText('Connecting')
+        Thread(target=self._connect, daemon=True).start()
+
+    def _connect(self) -> None:
+        controller = None
+        try:
+            controller = Controller(address=self.address, proto_file=proto_file,
+                                    notification_monitor=self._notification_monitor)
+            controller.set_view(self)
+            controller.subscribe_to_notifications(processors=False)
+            track_count = len(controller.audio_graph.get_all_tracks())
+            playing = controller.transport.get_playing_mode() == MODE_PLAYING
+            tempo = controller.transport.get_tempo()
+            self.connected.emit(controller, track_count, playing, tempo)
+        except Exception as e:
+            if controller is not None:
+                controller.close()
+            self.connection_failed.emit(str(e))
+
+    def set_connected(self, controller: Controller, track_count: int, playing: bool, tempo: float) -> None:
+        if self._closed:
+            controller.close()
+            return
+        self._controller = controller
+        self._track_count = track_count
+        self._playing = playing
+        self._tempo = tempo
+        self._last_update = time.monotonic()
+        self._status_label.setText('Connected')
+        self._open_button.setEnabled(True)
+        self._update_labels()
+
+    def set_connection_failed(self, error: str) -> None:
+        if self._closed:
+            return
+        self._status_label.setText('Offline')
+        self._status_label.setToolTip(error)
+        self._retry_timer.start()
+
+    def check_stale(self) -> None:
+        # Sushi sends timings regularly, if they stop the device or the network is likely down
+        if self._controller is not None and time.monotonic() - self._last_update > DASHBOARD_STALE_AFTER:
+            self._status_label.setText(f'No updates for {time.monotonic() - self._last_update:.0f} s')
+
+    def open_editor(self) -> None:
+        # The editor has a controller of its own, but shares this device's pooled channel
+        if self._editor is None or not self._editor.isVisible():
+            self._editor = MainWindow(sushi_address=self.address)
+            self._editor.setAttribute(Qt.WA_DeleteOnClose)
+            self._editor.destroyed.connect(self._forget_editor)
+        self._editor.show()
+        self._editor.raise_()
+
+    def _forget_editor(self) -> None:
+        self._editor = None
+
+    def close_device(self) -> None:
+        self._closed = True
+        self._retry_timer.stop()
+        if self._editor is not None:
+            self._editor.close()
+        if self._controller is not None:
+            self._controller.close()
+            self._controller = None
+
+    def process_track_notification(self, n) -> None:
+        if n.action == 1:  # TRACK_ADDED
+            self._track_count += 1
+        elif n.action == 2:  # TRACK_DELETED
+            self._track_count = max(self._track_count - 1, 0)
+        self._update_labels()
+        self._delivered('track')
+
+    def process_transport_notification(self, n) -> None:
+        if n.HasField('tempo'):
+            self._tempo = n.tempo
+        elif n.HasField('playing_mode'):
+            self._playing = n.playing_mode.mode == MODE_PLAYING
+        self._update_labels()
+        self._delivered('transport')
+
+    def process_timing_notification(self, n=None) -> None:
+        if n:
+            # Depending on the proto version, the engine's timings are at the top level or under main
+            timings = n.main if hasattr(n, 'main') else n
+            self._last_update = time.monotonic()
+            self._status_label.setText('Connected')
+            self._cpu_label.setText(f'Cpu: {timings.average * 100:.1f}%')
+        self._delivered('timing')
+
+    def _delivered(self, kind: str) -> None:
+        self._notification_monitor.delivered(kind)
+
+    def _update_labels(self) -> None:
+        self._transport_label.setText(f"{'Playing' if self._playing else 'Stopped'}, {self._tempo:.1f} bpm")
+        self._tracks_label.setText(f'Tracks: {self._track_count}')
+
+
+# Overview of many Sushi devices at once, each with its own controller and notification thread
+class DashboardWindow(QMainWindow):
+    def __init__(self, addresses: List[str]) -> None:
+        super().__init__()
+        self.setWindowTitle('Sushi devices')
+        self.devices: Dict[str, DeviceWidget] = {}
+
+        self.file_menu = self.menuBar().addMenu('&File')
+        add_device = QAction('Add device', self)
+        add_device.triggered.connect(self.show_add_device_dialog)
+        self.file_menu.addAction(add_device)
+
+        scroll_area = QScrollArea(self)
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setFrameShape(QFrame.NoFrame)
+        device_list = QWidget(scroll_area)
+        self._device_layout = QVBoxLayout(device_list)
+        self._device_layout.addStretch()
+        scroll_area.setWidget(device_list)
+        self.setCentralWidget(scroll_area)
+
+        self._stale_timer = QTimer(self)
+        self._stale_timer.timeout.connect(self.check_stale)
+        self._stale_timer.start(1000)
+
+        for address in addresses:
+            self.add_device(address)
+
+    def add_device(self, address: str) -> None:
+        if ':' not in address:
+            address += ':51051'
+        if address in self.devices:
+            return
+        device = DeviceWidget(address, self)
+        self._device_layout.insertWidget(self._device_layout.count() - 1, device)
+        self.devices[address] = device
+
+    def show_add_device_dialog(self) -> None:
+        address, ok = QInputDialog.getText(self, 'Add device', 'Address (ip:port):')
+        if ok and address.strip():
+            self.add_device(address.strip())
+
+    def check_stale(self) -> None:
+        for device in self.devices.values():
+            device.check_stale()
+
+    def closeEvent(self, event) -> None:
+        for device in self.devices.values():
+            device.close_device()
+        super().closeEvent(event)
@@ -1,8 +1,12 @@
-from typing import Optional
+import time
+from typing import List, Optional
 
-from PySide6.QtWidgets import QDialog, QGridLayout, QLabel, QLineEdit, QComboBox, QSpinBox, QDialogButtonBox
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtWidgets import QDialog, QGridLayout, QLabel, QLineEdit, QComboBox, QSpinBox, QDialogButtonBox, \
+    QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QAbstractItemView, QPushButton, QInputDialog, \
+    QSlider, QDoubleSpinBox
 
-from .constants import PLUGIN_TYPES
+from .constants import PLUGIN_TYPES, RPC_SLOWEST_SHOWN, SLIDER_MAX_VALUE
 from elkpy import sushi_info_types as sushi
 
 
@@ -169,3 +173,414 @@ class AddPluginDialog(QDialog):
         elif plugin_type == sushi.PluginType.LV2:
             self._path_entry.setEnabled(True)
             self._uid_entry.setEnabled(False)
+
+
+# Tools > RPC latency. Shows the controller's RpcStats, refreshed every second while open
+class RpcStatsDialog(QDialog):
+    def __init__(self, stats: 'RpcStats', parent):
+        super().__init__(parent)
+        self.setWindowTitle('RPC latency')
+        self.resize(800, 600)
+        self._stats = stats
+
+        self._layout = QGridLayout(self)
+        self.setLayout(self._layout)
+
+        self._enabled_box = QCheckBox('Record call timings', self)
+        self._enabled_box.setChecked(stats.enabled)
+        self._layout.addWidget(self._enabled_box, 0, 0)
+
+        self._method_table = self._create_table(['Method', 'Calls', 'Errors', 'Mean ms', 'p50 ms', 'p99 ms', 'Max ms'])
+        self._layout.addWidget(self._method_table, 1, 0)
+
+        self._layout.addWidget(QLabel('Slowest recent calls', self), 2, 0)
+        self._slowest_table = self._create_table(['Method', 'Started', 'ms', 'Error'])
+        self._layout.addWidget(self._slowest_table, 3, 0)
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Reset | QDialogButtonBox.Save | QDialogButtonBox.Close)
+        self._layout.addWidget(self.button_box, 4, 0)
+
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setInterval(1000)
+
+        self._connect_signals()
+        self.refresh()
+
+    def _create_table(self, headers: List[str]) -> QTableWidget:
+        table = QTableWidget(0, len(headers), self)
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        table.verticalHeader().hide()
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        return table
+
+    def _connect_signals(self) -> None:
+        self._enabled_box.toggled.connect(self._stats.set_enabled)
+        self.button_box.button(QDialogButtonBox.Reset).clicked.connect(self.reset)
+        self.button_box.button(QDialogButtonBox.Save).clicked.connect(self.export)
+        self.button_box.rejected.connect(self.reject)
+        self._refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.refresh()
+        self._refresh_timer.start()
+
+    def hideEvent(self, event) -> None:
+        super().hideEvent(event)
+        self._refresh_timer.stop()
+
+    def refresh(self) -> None:
+        methods = self._stats.methods()
+        self._fill_table(self._method_table, [[name, m['calls'], m['errors'], m['mean'] * 1000, m['p50'] * 1000,
+                                               m['p99'] * 1000, m['max'] * 1000] for name, m in methods.items()])
+        self._fill_table(self._slowest_table, [[c['method'], time.strftime('%H:%M:%S', time.localtime(c['started'])),
+                                                c['duration'] * 1000, c['error'] or '']
+                                               for c in self._stats.slowest(RPC_SLOWEST_SHOWN)])
+
+    @staticmethod
+    def _fill_table(table: QTableWidget, rows: List[list]) -> None:
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                text = f'{value:.2f}' if isinstance(value, float) else str(value)
+                table.setItem(row, column, QTableWidgetItem(text))
+
+    def reset(self) -> None:
+        self._stats.reset()
+        self.refresh()
+
+    def export(self) -> None:
+        filename, _ = QFileDialog.getSaveFileName(self, 'Export RPC latency', '', 'JSON Files (*.json)')
+        if filename:
+            if not filename.endswith('.json'):
+                filename += '.json'
+            try:
+                self._stats.export(filename)
+            except Exception as e:
+                print(f'Could not export RPC latency: {e}')
+
+
+class MirrorDialog(QDialog):
+    def __init__(self, mirror: 'Mirror', parent):
+        super().__init__(parent)
+        self.setWindowTitle('Mirroring')
+        self.resize(800, 300)
+        self._mirror = mirror
+
+        self._layout = QGridLayout(self)
+        self.setLayout(self._layout)
+
+        self._layout.addWidget(QLabel('Changes to this Sushi are copied to these devices', self), 0, 0, 1, 3)
+        self._follower_table = QTableWidget(0, 7, self)
+        self._follower_table.setHorizontalHeaderLabels(['Address', 'Pending', 'Writes', 'Errors', 'Lag p50 ms',
+                                                        'Lag p99 ms', 'Last error'])
+        self._follower_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self._follower_table.verticalHeader().hide()
+        self._follower_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self._follower_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self._layout.addWidget(self._follower_table, 1, 0, 1, 3)
+
+        self._add_button = QPushButton('Add', self)
+        self._layout.addWidget(self._add_button, 2, 0)
+        self._remove_button = QPushButton('Remove', self)
+        self._layout.addWidget(self._remove_button, 2, 1)
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        self._layout.addWidget(self.button_box, 2, 2)
+
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setInterval(1000)
+
+        self._connect_signals()
+        self.refresh()
+
+    def _connect_signals(self) -> None:
+        self._add_button.clicked.connect(self.add_follower)
+        self._remove_button.clicked.connect(self.remove_follower)
+        self.button_box.rejected.connect(self.reject)
+        self._refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.refresh()
+        self._refresh_timer.start()
+
+    def hideEvent(self, event) -> None:
+        super().hideEvent(event)
+        self._refresh_timer.stop()
+
+    def refresh(self) -> None:
+        RpcStatsDialog._fill_table(self._follower_table, [[f['address'], f['pending'], f['writes'], f['errors'],
+                                                           f['p50'] * 1000, f['p99'] * 1000, f['last_error']]
+                                                          for f in self._mirror.stats()])
+
+    def add_follower(self) -> None:
+        address, ok = QInputDialog.getText(self, 'Add device', 'Address (ip:port):')
+        if ok and address.strip():
+            # Shows up in the table once connected, errors are reported like those of other commands
+            self._mirror.add_follower(address.strip())
+
+    def remove_follower(self) -> None:
+        row = self._follower_table.currentRow()
+        if row >= 0:
+            self._mirror.remove_follower(self._follower_table.item(row, 0).text())
+            self.refresh()
+
+
+class SnapshotDialog(QDialog):
+    def __init__(self, store: 'SnapshotStore', graph: 'AudioGraphModel', parent):
+        super().__init__(parent)
+        self.setWindowTitle('Snapshots')
+        self.resize(600, 400)
+        self._store = store
+        self._graph = graph
+        self._pending = None
+        self._shown = None
+
+        self._layout = QGridLayout(self)
+        self.setLayout(self._layout)
+
+        self._layout.addWidget(QLabel('Of', self), 0, 0)
+        self._scope = QComboBox(self)
+        self._layout.addWidget(self._scope, 0, 1, 1, 2)
+        self._layout.addWidget(QLabel('Name', self), 1, 0)
+        self._name_entry = QLineEdit('A', self)
+        self._layout.addWidget(self._name_entry, 1, 1)
+        self._capture_button = QPushButton('Capture', self)
+        self._layout.addWidget(self._capture_button, 1, 2)
+
+        self._snapshot_table = QTableWidget(0, 4, self)
+        self._snapshot_table.setHorizontalHeaderLabels(['Name', 'Of', 'Parameters', 'Captured'])
+        self._snapshot_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self._snapshot_table.verticalHeader().hide()
+        self._snapshot_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self._snapshot_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self._layout.addWidget(self._snapshot_table, 2, 0, 1, 3)
+
+        self._recall_button = QPushButton('Recall', self)
+        self._layout.addWidget(self._recall_button, 3, 0)
+        self._delete_button = QPushButton('Delete', self)
+        self._layout.addWidget(self._delete_button, 3, 1)
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        self._layout.addWidget(self.button_box, 3, 2)
+
+        self._layout.addWidget(QLabel('Morph', self), 4, 0)
+        self._morph_start = QComboBox(self)
+        self._layout.addWidget(self._morph_start, 4, 1)
+        self._morph_end = QComboBox(self)
+        self._layout.addWidget(self._morph_end, 4, 2)
+        self._crossfader = QSlider(Qt.Orientation.Horizontal, self)
+        self._crossfader.setRange(0, SLIDER_MAX_VALUE)
+        self._layout.addWidget(self._crossfader, 5, 0, 1, 3)
+        self._morph_time = QDoubleSpinBox(self)
+        self._morph_time.setRange(0.1, 600)
+        self._morph_time.setValue(5)
+        self._morph_time.setSuffix(' s')
+        self._layout.addWidget(self._morph_time, 6, 1)
+        self._morph_button = QPushButton('Morph over', self)
+        self._layout.addWidget(self._morph_button, 6, 0)
+
+        self._status_label = QLabel('', self)
+        self._layout.addWidget(self._status_label, 7, 0, 1, 3)
+
+        # Captures and recalls run in the background, their results are picked up from here
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setInterval(200)
+
+        self._connect_signals()
+        self.refresh()
+
+    def _connect_signals(self) -> None:
+        self._capture_button.clicked.connect(self.capture)
+        self._recall_button.clicked.connect(self.recall)
+        self._snapshot_table.cellDoubleClicked.connect(self.recall)
+        self._delete_button.clicked.connect(self.delete)
+        self._morph_start.currentIndexChanged.connect(self.stop_morph)
+        self._morph_end.currentIndexChanged.connect(self.stop_morph)
+        self._crossfader.valueChanged.connect(self.set_morph_position)
+        self._morph_button.clicked.connect(self.run_morph)
+        self.button_box.rejected.connect(self.reject)
+        self._refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self._fill_scopes()
+        self.refresh()
+        self._refresh_timer.start()
+
+    def hideEvent(self, event) -> None:
+        super().hideEvent(event)
+        self._refresh_timer.stop()
+
+    def _fill_scopes(self) -> None:
+        # Item data is the list of track and processor ids, None for the whole graph
+        self._scope.clear()
+        self._scope.addItem('Whole graph', None)
+        for track in list(self._graph.tracks.values()):
+            self._scope.addItem(f'Track {track.info.name}', [track.info.id] + [p.info.id for p in track.processors])
+            for processor in track.processors:
+                self._scope.addItem(f'    {processor.info.name}', [processor.info.id])
+
+    def refresh(self) -> None:
+        snapshots = list(self._store.snapshots.values())
+        if self._shown != [(s.name, s.time) for s in snapshots]:
+            self._shown = [(s.name, s.time) for s in snapshots]
+            RpcStatsDialog._fill_table(self._snapshot_table, [[s.name, s.scope, len(s.values),
+                                                               time.strftime('%H:%M:%S', time.localtime(s.time))]
+                                                              for s in snapshots])
+            self._fill_morph_selectors([s.name for s in snapshots])
+        morph = self._store.morph
+        if morph is not None and not self._crossfader.isSliderDown():
+            # Follow timed morphs with the crossfader
+            self._crossfader.blockSignals(True)
+            self._crossfader.setValue(round(morph.position * SLIDER_MAX_VALUE))
+            self._crossfader.blockSignals(False)
+            if morph.running_to:
+                self._status_label.setText(f'Morphing {morph.start} to {morph.end}, sent {morph.values_sent} values')
+        if self._pending is not None and self._pending[1].done():
+            description, future = self._pending
+            self._pending = None
+            if future.exception() is None:
+                result = future.result()
+                self._status_label.setText(description if result is None else f'{description}, sent {result} values')
+            else:
+                self._status_label.setText(f'{description} failed: {future.exception()}')
+
+    def capture(self) -> None:
+        name = self._name_entry.text().strip()
+        if name:
+            future = self._store.capture(name, self._scope.currentText().strip(), self._scope.currentData())
+            self._pending = (f'Captured {name}', future)
+            # Suggest the next letter, so A/B comparisons are two clicks
+            if len(name) == 1 and name.isalpha() and name.upper() < 'Z':
+                self._name_entry.setText(chr(ord(name) + 1))
+
+    def recall(self) -> None:
+        row = self._snapshot_table.currentRow()
+        if row >= 0:
+            name = self._snapshot_table.item(row, 0).text()
+            self._pending = (f'Recalled {name}', self._store.recall(name))
+
+    def delete(self) -> None:
+        row = self._snapshot_table.currentRow()
+        if row >= 0:
+            self._store.delete(self._snapshot_table.item(row, 0).text())
+            self.refresh()
+
+    def _fill_morph_selectors(self, names: List[str]) -> None:
+        for selector, default in ((self._morph_start, 0), (self._morph_end, 1)):
+            current = selector.currentText()
+            selector.blockSignals(True)
+            selector.clear()
+            selector.addItems(names)
+            if current in names:
+                selector.setCurrentText(current)
+            elif len(names) > default:
+                selector.setCurrentIndex(default)
+            selector.blockSignals(False)
+
+    def _morph(self) -> Optional['Morph']:
+        start, end = self._morph_start.currentText(), self._morph_end.currentText()
+        morph = self._store.morph
+        if morph is None or (morph.start, morph.end) != (start, end):
+            try:
+                morph = self._store.start_morph(start, end)
+            except (KeyError, ValueError) as e:
+                self._status_label.setText(f'Could not morph: {e}')
+                return None
+        return morph
+
+    def set_morph_position(self, value: int) -> None:
+        morph = self._morph()
+        if morph is not None:
+            morph.set_position(value / SLIDER_MAX_VALUE)
+            self._status_label.setText(f'{morph.start} {1 - morph.position:.0%}, {morph.end} {morph.position:.0%}')
+
+    def run_morph(self) -> None:
+        # Morphs towards whichever end the crossfader is furthest from
+        morph = self._morph()
+        if morph is not None:
+            morph.run_to(0.0 if morph.position > 0.5 else 1.0, self._morph_time.value())
+
+    def stop_morph(self) -> None:
+        self._store.stop_morph()
+
+
+class AutomationDialog(QDialog):
+    def __init__(self, automation: 'Automation', parent):
+        super().__init__(parent)
+        self.setWindowTitle('Automation')
+        self.resize(400, 400)
+        self._automation = automation
+
+        self._layout = QGridLayout(self)
+        self.setLayout(self._layout)
+
+        self._record_button = QPushButton('Record', self)
+        self._layout.addWidget(self._record_button, 0, 0)
+        self._play_button = QPushButton('Play', self)
+        self._layout.addWidget(self._play_button, 0, 1)
+        self._follow_transport = QCheckBox('Follow transport', self)
+        self._follow_transport.setToolTip('Play in time with Sushi, starting when it starts playing')
+        self._layout.addWidget(self._follow_transport, 0, 2)
+
+        self._stats_table = QTableWidget(0, 2, self)
+        self._stats_table.setHorizontalHeaderLabels(['', 'Value'])
+        self._stats_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self._stats_table.verticalHeader().hide()
+        self._stats_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self._layout.addWidget(self._stats_table, 1, 0, 1, 3)
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        self._layout.addWidget(self.button_box, 2, 2)
+
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setInterval(500)
+
+        self._connect_signals()
+        self.refresh()
+
+    def _connect_signals(self) -> None:
+        self._record_button.clicked.connect(self.toggle_recording)
+        self._play_button.clicked.connect(self.toggle_playback)
+        self.button_box.rejected.connect(self.reject)
+        self._refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.refresh()
+        self._refresh_timer.start()
+
+    def hideEvent(self, event) -> None:
+        super().hideEvent(event)
+        self._refresh_timer.stop()
+
+    def refresh(self) -> None:
+        automation = self._automation
+        self._record_button.setText('Stop recording' if automation.recording else 'Record')
+        self._play_button.setText('Stop' if automation.playing_back else 'Play')
+        s = automation.stats()
+        RpcStatsDialog._fill_table(self._stats_table, [['Recorded changes', s['recorded']],
+                                                       ['Dropped, recording full', s['dropped']],
+                                                       ['Recording length s', s['duration']],
+                                                       ['Played changes', s['played']],
+                                                       ['Sent values', s['sent']],
+                                                       ['Batches', s['batches']],
+                                                       ['Changes per second', s['events_per_second']],
+                                                       ['Values sent per second', s['sent_per_second']],
+                                                       ['Lateness p50 ms', s['jitter_p50'] * 1000],
+                                                       ['Lateness p99 ms', s['jitter_p99'] * 1000],
+                                                       ['Lateness max ms', s['jitter_max'] * 1000]])
+
+    def toggle_recording(self) -> None:
+        if self._automation.recording:
+            self._automation.stop_recording()
+        else:
+            self._automation.start_recording()
+        QTimer.singleShot(100, self.refresh)
+
+    def toggle_playback(self) -> None:
+        if self._automation.playing_back:
+            self._automation.stop_playback()
+        else:
+            self._automation.play(self._follow_transport.isChecked())
+        QTimer.singleShot(100, self.refresh)
@@ -0,0 +1,213 @@
+from threading import RLock
+from typing import Dict, List, Optional, Tuple
+
+from elkpy import sushi_info_types as sushi
+
+
+# Plain containers for everything the widgets need to build a processor or track,
+# so they can be fetched in one go instead of one blocking call at a time
+class ParameterSnapshot:
+    def __init__(self, info: sushi.ParameterInfo, value: float, txt_value: str) -> None:
+        self.info = info
+        self.value = value
+        self.txt_value = txt_value
+
+
+class PropertySnapshot:
+    def __init__(self, info: sushi.PropertyInfo, value: str) -> None:
+        self.info = info
+        self.value = value
+
+
+# parameters and properties are None for processors that haven't been expanded yet
+class ProcessorSnapshot:
+    def __init__(self, info: sushi.ProcessorInfo, parameters: Optional[List[ParameterSnapshot]],
+                 properties: Optional[List[PropertySnapshot]], programs: List[sushi.ProgramInfo],
+                 current_program: int, bypassed: bool) -> None:
+        self.info = info
+        self.parameters = parameters
+        self.properties = properties
+        self.programs = programs
+        self.current_program = current_program
+        self.bypassed = bypassed
+
+
+class TrackSnapshot:
+    def __init__(self, info: sushi.TrackInfo, parameters: List[ParameterSnapshot],
+                 processors: List[ProcessorSnapshot]) -> None:
+        self.info = info
+        self.parameters = parameters
+        self.processors = processors
+
+    def parameter(self, name: str) -> Optional[ParameterSnapshot]:
+        for p in self.parameters:
+            if p.info.name == name:
+                return p
+        return None
+
+
+# Client side copy of Sushi's audio graph, built from snapshots and kept up to date by
+# applying notifications, so structural changes don't need to re-download the graph.
+# Notifications and snapshots arrive on different threads, so changes are locked.
+class AudioGraphModel:
+    def __init__(self) -> None:
+        self._lock = RLock()
+        self.tracks: Dict[int, TrackSnapshot] = {}
+        self.processors: Dict[int, ProcessorSnapshot] = {}
+        self._processor_tracks: Dict[int, int] = {}
+        self._parameters: Dict[Tuple[int, int], ParameterSnapshot] = {}
+        self._properties: Dict[Tuple[int, int], PropertySnapshot] = {}
+        # Sushi never reuses ids, this catches snapshots that finish loading after a delete
+        self._deleted = set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.tracks.clear()
+            self.processors.clear()
+            self._processor_tracks.clear()
+            self._parameters.clear()
+            self._properties.clear()
+            self._deleted.clear()
+
+    def forget_deleted(self) -> None:
+        with self._lock:
+            self._deleted.clear()
+
+    def has_track(self, track_id: int) -> bool:
+        return track_id in self.tracks
+
+    def has_processor(self, processor_id: int) -> bool:
+        return processor_id in self.processors
+
+    def track_processors(self, track_id: int) -> List[int]:
+        with self._lock:
+            return [p.info.id for p in self.tracks[track_id].processors]
+
+    def processor_track(self, processor_id: int) -> Optional[int]:
+        return self._processor_tracks.get(processor_id)
+
+    def parameter(self, processor_id: int, parameter_id: int) -> Optional[ParameterSnapshot]:
+        return self._parameters.get((processor_id, parameter_id))
+
+    def property(self, processor_id: int, property_id: int) -> Optional[PropertySnapshot]:
+        return self._properties.get((processor_id, property_id))
+
+    def add_track(self, track: TrackSnapshot) -> bool:
+        with self._lock:
+            track_id = track.info.id
+            if track_id in self._deleted or track_id in self.tracks:
+                return False
+
+            self.tracks[track_id] = track
+            self._index_parameters(track_id, track.parameters, [])
+            for p in track.processors:
+                self._index_processor(track_id, p)
+            return True
+
+    def replace_track(self, track: TrackSnapshot) -> bool:
+        # Swap in a newer snapshot of a track, unlike remove_track the id stays valid
+        with self._lock:
+            old = self.tracks.get(track.info.id)
+            if old is None:
+                return False
+            for p in old.processors:
+                self._forget_processor(p)
+            self._forget_parameters(track.info.id, old.parameters, [])
+            self.tracks[track.info.id] = track
+            self._index_parameters(track.info.id, track.parameters, [])
+            for p in track.processors:
+                self._index_processor(track.info.id, p)
+            return True
+
+    def remove_track(self, track_id: int) -> None:
+        with self._lock:
+            self._deleted.add(track_id)
+            track = self.tracks.pop(track_id, None)
+            if track is None:
+                return
+            for p in track.processors:
+                self._forget_processor(p)
+            self._forget_parameters(track_id, track.parameters, [])
+
+    def add_processor(self, track_id: int, processor: ProcessorSnapshot, index: Optional[int] = None) -> bool:
+        with self._lock:
+            proc_id = processor.info.id
+            if track_id not in self.tracks or proc_id in self._deleted or proc_id in self.processors:
+                return False
+
+            processors = self.tracks[track_id].processors
+            processors.insert(len(processors) if index is None else index, processor)
+            self._index_processor(track_id, processor)
+            self._update_track_info(track_id)
+            return True
+
+    def remove_processor(self, track_id: int, processor_id: int) -> None:
+        with self._lock:
+            self._deleted.add(processor_id)
+            processor = self.processors.get(processor_id)
+            if processor is None or track_id not in self.tracks:
+                return
+            self.tracks[track_id].processors.remove(processor)
+            self._forget_processor(processor)
+            self._update_track_info(track_id)
+
+    def move_processor(self, track_id: int, processor_id: int, index: int) -> None:
+        with self._lock:
+            processors = self.tracks[track_id].processors
+            processor = self.processors[processor_id]
+            processors.remove(processor)
+            processors.insert(index, processor)
+            self._update_track_info(track_id)
+
+    def set_processor_parameters(self, processor_id: int, parameters: Optional[List[ParameterSnapshot]],
+                                 properties: Optional[List[PropertySnapshot]]) -> bool:
+        with self._lock:
+            processor = self.processors.get(processor_id)
+            if processor is None:
+                return False
+            self._forget_parameters(processor_id, processor.parameters, processor.properties)
+            processor.parameters = parameters
+            processor.properties = properties
+            self._index_parameters(processor_id, parameters, properties)
+            return True
+
+    def apply_parameter_notification(self, notification) -> None:
+        parameter = self._parameters.get((notification.parameter.processor_id, notification.parameter.parameter_id))
+        if parameter is not None:
+            parameter.value = notification.normalized_value
+            parameter.txt_value = notification.formatted_value
+
+    def apply_property_notification(self, notification) -> None:
+        prop = self._properties.get((notification.property.processor_id, notification.property.property_id))
+        if prop is not None:
+            prop.value = notification.value
+
+    def _update_track_info(self, track_id: int) -> None:
+        track = self.tracks[track_id]
+        track.info.processors = [p.info.id for p in track.processors]
+
+    def _index_processor(self, track_id: int, processor: ProcessorSnapshot) -> None:
+        proc_id = processor.info.id
+        self.processors[proc_id] = processor
+        self._processor_tracks[proc_id] = track_id
+        self._index_parameters(proc_id, processor.parameters, processor.properties)
+
+    def _forget_processor(self, processor: ProcessorSnapshot) -> None:
+        proc_id = processor.info.id
+        self.processors.pop(proc_id, None)
+        self._processor_tracks.pop(proc_id, None)
+        self._forget_parameters(proc_id, processor.parameters, processor.properties)
+
+    def _index_parameters(self, processor_id: int, parameters: Optional[List[ParameterSnapshot]],
+                          properties: Optional[List[PropertySnapshot]]) -> None:
+        for p in parameters or []:
+            self._parameters[(processor_id, p.info.id)] = p
+        for p in properties or []:
+            self._properties[(processor_id, p.info.id)] = p
+
+    def _forget_parameters(self, processor_id: int, parameters: Optional[List[ParameterSnapshot]],
+                           properties: Optional[List[PropertySnapshot]]) -> None:
+        for p in parameters or []:
+            self._parameters.pop((processor_id, p.info.id), None)
+        for p in properties or []:
+            self._properties.pop((processor_id, p.info.id), None)
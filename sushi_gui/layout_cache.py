@@ -0,0 +1,160 @@
+import gzip
+import json
+import os
+import re
+from typing import Iterable, List, Optional
+
+from elkpy import sushi_info_types as sushi
+
+from .constants import LAYOUT_CACHE_DIR
+from .graph_model import TrackSnapshot, ProcessorSnapshot, ParameterSnapshot, PropertySnapshot
+
+# Bump when the file format changes, older files are then ignored
+LAYOUT_VERSION = 1
+
+
+# The last graph shown for a Sushi address is stored on disk, so the next launch can draw it
+# right away and only has to patch what changed on the device in the meantime
+def save_layout(address: str, tracks: Iterable[TrackSnapshot], parameters: bool = True) -> None:
+    os.makedirs(LAYOUT_CACHE_DIR, exist_ok=True)
+    try:
+        write_tracks(_layout_path(address), address, tracks, parameters)
+    except Exception as e:
+        print(f'Could not save layout: {e}')
+
+
+def load_layout(address: str) -> Optional[List[TrackSnapshot]]:
+    path = _layout_path(address)
+    if not os.path.exists(path):
+        return None
+    try:
+        return read_tracks(path, address)
+    except Exception as e:
+        print(f'Could not load layout: {e}')
+        return None
+
+
+def write_tracks(path: str, address: str, tracks: Iterable[TrackSnapshot], parameters: bool = True) -> None:
+    data = {'version': LAYOUT_VERSION, 'address': address,
+            'tracks': [_track_to_dict(t, processor_parameters=parameters) for t in tracks]}
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def read_tracks(path: str, address: Optional[str] = None) -> Optional[List[TrackSnapshot]]:
+    # None if the file is from another version, or saved from another address when one is given
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != LAYOUT_VERSION or (address is not None and data.get('address') != address):
+        return None
+    return [_track_from_dict(t) for t in data['tracks']]
+
+
+def same_layout(a: TrackSnapshot, b: TrackSnapshot) -> bool:
+    # True if the widgets built from a can show b by only updating parameter and property values.
+    # Parameters are only compared for processors where both sides have them loaded
+    a_dict = _track_to_dict(a, values=False)
+    b_dict = _track_to_dict(b, values=False)
+    for a_proc, b_proc in zip(a_dict['processors'], b_dict['processors']):
+        if a_proc['parameters'] is None or b_proc['parameters'] is None:
+            a_proc['parameters'] = a_proc['properties'] = b_proc['parameters'] = b_proc['properties'] = None
+    return a_dict == b_dict
+
+
+def same_structure(a: List[TrackSnapshot], b: List[TrackSnapshot], a_session=None, b_session=None) -> bool:
+    # True if both have the same tracks, processors, parameters and properties, by name and in the
+    # same order, so that one can be turned into the other by only setting values. Ids are ignored.
+    # Given Sushi's SessionState for both, the plugins must also be loaded from the same uid, path and
+    # type, and the audio and MIDI connections must be the same
+    if [_structure(t) for t in a] != [_structure(t) for t in b]:
+        return False
+    return a_session is None or b_session is None or _routing(a_session) == _routing(b_session)
+
+
+def _structure(track: TrackSnapshot) -> tuple:
+    return (track.info.name, track.info.channels, [p.info.name for p in track.parameters],
+            [(p.info.name, [q.info.name for q in p.parameters or []], [q.info.name for q in p.properties or []],
+              len(p.programs)) for p in track.processors])
+
+
+def _routing(session) -> tuple:
+    # Connections refer to tracks and processors by name, so they compare across runs of Sushi
+    return ([(t.type, t.buses, [(p.uid, p.path, p.type) for p in t.processors]) for t in session.tracks],
+            list(session.engine_state.input_connections), list(session.engine_state.output_connections),
+            session.midi_state)
+
+
+def _layout_path(address: str) -> str:
+    return os.path.join(LAYOUT_CACHE_DIR, re.sub(r'[^A-Za-z0-9_.-]', '_', address) + '.json.gz')
+
+
+def _info_to_dict(info) -> dict:
+    # IntEnums serialize as plain ints
+    return {k: v for k, v in vars(info).items() if not k.startswith('_')}
+
+
+def _info_from_dict(cls, data: dict):
+    # elkpy's info types can only be built from gRPC messages, so bypass the constructor
+    info = cls.__new__(cls)
+    info.__dict__.update(data)
+    return info
+
+
+def _parameters_to_list(parameters: List[ParameterSnapshot], values: bool) -> list:
+    if values:
+        return [[_info_to_dict(p.info), p.value, p.txt_value] for p in parameters]
+    return [_info_to_dict(p.info) for p in parameters]
+
+
+def _parameters_from_list(data: list) -> List[ParameterSnapshot]:
+    parameters = []
+    for info, value, txt_value in data:
+        info = _info_from_dict(sushi.ParameterInfo, info)
+        if isinstance(info.type, int):
+            info.type = sushi.ParameterType(info.type)
+        parameters.append(ParameterSnapshot(info, value, txt_value))
+    return parameters
+
+
+def _processor_to_dict(processor: ProcessorSnapshot, values: bool = True, parameters: bool = True) -> dict:
+    loaded = parameters and processor.parameters is not None
+    data = {'info': _info_to_dict(processor.info),
+            'parameters': _parameters_to_list(processor.parameters, values) if loaded else None,
+            'properties': [_info_to_dict(p.info) for p in processor.properties] if loaded else None,
+            'programs': [_info_to_dict(p) for p in processor.programs],
+            # Bypass and program changes aren't notified, so they are compared as part of the layout
+            'current_program': processor.current_program,
+            'bypassed': processor.bypassed}
+    if values and loaded:
+        data['property_values'] = [p.value for p in processor.properties]
+    return data
+
+
+def _processor_from_dict(data: dict) -> ProcessorSnapshot:
+    parameters = properties = None
+    if data['parameters'] is not None:
+        parameters = _parameters_from_list(data['parameters'])
+        properties = [PropertySnapshot(_info_from_dict(sushi.PropertyInfo, info), value)
+                      for info, value in zip(data['properties'], data['property_values'])]
+    return ProcessorSnapshot(_info_from_dict(sushi.ProcessorInfo, data['info']),
+                             parameters,
+                             properties,
+                             [_info_from_dict(sushi.ProgramInfo, p) for p in data['programs']],
+                             data['current_program'],
+                             data['bypassed'])
+
+
+def _track_to_dict(track: TrackSnapshot, values: bool = True, processor_parameters: bool = True) -> dict:
+    return {'info': _info_to_dict(track.info),
+            'parameters': _parameters_to_list(track.parameters, values),
+            'processors': [_processor_to_dict(p, values, processor_parameters) for p in track.processors]}
+
+
+def _track_from_dict(data: dict) -> TrackSnapshot:
+    info = _info_from_dict(sushi.TrackInfo, data['info'])
+    if isinstance(info.type, int):
+        info.type = sushi.TrackType(info.type)
+    return TrackSnapshot(info, _parameters_from_list(data['parameters']),
+                         [_processor_from_dict(p) for p in data['processors']])
@@ -1,16 +1,20 @@
 import os
 import sys
-from typing import Optional
-from elkpy import grpc_gen
+from typing import Callable, List, Optional
 
-from PySide6.QtCore import Signal
+from PySide6.QtCore import Qt, Signal, QTimer
 from PySide6.QtGui import QAction
-from PySide6.QtWidgets import QVBoxLayout, QWidget, QHBoxLayout, QMainWindow, QMessageBox
+from PySide6.QtWidgets import QVBoxLayout, QWidget, QHBoxLayout, QMainWindow, QMessageBox, QInputDialog, QScrollArea, \
+    QFrame, QLabel
 from elkpy.sushicontroller import SushiController
 from elkpy import sushi_info_types as sushi
-from .constants import MODE_PLAYING
+from .constants import MODE_PLAYING, NOTIFICATION_FRAME_RATE, WRITE_RATE, TRACK_BUILD_MARGIN, \
+    NOTIFICATION_LAG_INTERVAL, SESSION_AUTOSAVE_INTERVAL
+from . import proto_cache
 from .controller import Controller
-from .widgets import TransportBarWidget, TrackWidget
+from .graph_model import TrackSnapshot, ProcessorSnapshot, ParameterSnapshot, PropertySnapshot
+from .widgets import TransportBarWidget, TrackWidget, TrackPlaceholderWidget
+from .dialogs import RpcStatsDialog, MirrorDialog, SnapshotDialog, AutomationDialog
 
 
 # Get protofile to generate grpc library
@@ -24,17 +28,29 @@ if proto_file is None:
         print("No proto file found")
         sys.exit(-1)
 
-# Get the sushi notification types directly from the generated grpc types
-sushi_grpc_types, _ = grpc_gen.modules_from_proto(proto_file)
+# Get the sushi notification types directly from the generated grpc types.
+# The controller reuses the same cached modules
+proto_cache.install()
+sushi_grpc_types, _ = proto_cache.modules_from_proto(proto_file)
 
 
 class MainWindow(QMainWindow):
     track_notification_received = Signal(object)
     processor_notification_received = Signal(object)
-    parameter_notification_received = Signal(object)
     transport_notification_received = Signal(object)
     timing_notification_received = Signal(object)
-    property_notification_received = Signal(object)
+    track_list_received = Signal(object)
+    track_snapshot_received = Signal(object)
+    processor_snapshot_received = Signal(int, int, object)
+    processor_moved = Signal(int, int, object)
+    processor_state_received = Signal(int, int, bool, int)
+    track_replaced = Signal(object)
+    processor_parameters_received = Signal(int, object, object)
+    track_removed = Signal(int)
+    command_failed = Signal(str)
+    info_received = Signal(str)
+    session_progress = Signal(str, int)
+    tempo_received = Signal(float)
 
     def __init__(self, sushi_address: str) -> None:
         super().__init__()
@@ -59,6 +75,9 @@ class MainWindow(QMainWindow):
 
         self.file_menu.addAction(save)
         self.file_menu.addAction(load)
+        restore_autosave = QAction('Load last autosave', self)
+        restore_autosave.triggered.connect(self.restore_autosaved_session)
+        self.file_menu.addAction(restore_autosave)
 
         about = QAction('About Sushi', self)
         about.triggered.connect(self.show_about_sushi)
@@ -74,20 +93,82 @@ class MainWindow(QMainWindow):
         self.help_menu.addAction(tracks)
         self.help_menu.addAction(inputs)
 
+        frame_rate = QAction('Display update rate', self)
+        frame_rate.triggered.connect(self.show_frame_rate_dialog)
+        self.settings_menu.addAction(frame_rate)
+        write_rate = QAction('Parameter send rate', self)
+        write_rate.triggered.connect(self.show_write_rate_dialog)
+        self.settings_menu.addAction(write_rate)
+        self._write_rate = WRITE_RATE
+        autosave = QAction('Autosave session', self)
+        autosave.setCheckable(True)
+        autosave.toggled.connect(self.set_autosave)
+        self.settings_menu.addAction(autosave)
+
+        rpc_latency = QAction('RPC latency', self)
+        rpc_latency.triggered.connect(self.show_rpc_stats)
+        self.tools_menu.addAction(rpc_latency)
+        self._rpc_stats_dialog = None
+        mirroring = QAction('Mirroring', self)
+        mirroring.triggered.connect(self.show_mirror)
+        self.tools_menu.addAction(mirroring)
+        self._mirror_dialog = None
+        snapshots = QAction('Snapshots', self)
+        snapshots.triggered.connect(self.show_snapshots)
+        self.tools_menu.addAction(snapshots)
+        self._snapshot_dialog = None
+        automation = QAction('Automation', self)
+        automation.triggered.connect(self.show_automation)
+        self.tools_menu.addAction(automation)
+        self._automation_dialog = None
+
         self.current_sushi_ip = sushi_address
 
         self.tpbar = TransportBarWidget(parent=self)
         self._window_layout.addWidget(self.tpbar)
         self.tracks = {}
-        self._track_layout = QHBoxLayout(self)
-        self._window_layout.addLayout(self._track_layout)
-
-        self.track_notification_received.connect(self.process_track_notification)
-        self.processor_notification_received.connect(self.process_processor_notification)
-        self.parameter_notification_received.connect(self.process_parameter_notification)
-        self.transport_notification_received.connect(self.process_transport_notification)
-        self.timing_notification_received.connect(self.process_timing_notification)
-        self.property_notification_received.connect(self.process_property_notification)
+        self._placeholders = {}
+        # Snapshots of tracks that are loaded but still shown as placeholders, since they are out of view
+        self._unbuilt_tracks = {}
+        # Notification routing tables, (processor id, parameter/property id) -> handler
+        self._parameter_routes = {}
+        self._property_routes = {}
+        self._create_track_strip()
+
+        self.track_notification_received.connect(self._monitored('track', self.process_track_notification))
+        self.processor_notification_received.connect(self._monitored('processor',
+                                                                     self.process_processor_notification))
+        self.transport_notification_received.connect(self._monitored('transport',
+                                                                     self.process_transport_notification))
+        self.timing_notification_received.connect(self._monitored('timing', self.process_timing_notification))
+        self.track_list_received.connect(self.create_placeholders)
+        self.track_snapshot_received.connect(self.add_track_snapshot)
+        self.processor_snapshot_received.connect(self.add_processor_snapshot)
+        self.processor_moved.connect(self.move_processor)
+        self.processor_state_received.connect(self.set_processor_state)
+        self.track_replaced.connect(self.replace_track)
+        self.processor_parameters_received.connect(self.add_processor_parameters)
+        self.track_removed.connect(self.delete_track)
+        self.command_failed.connect(self.show_command_error)
+        self.info_received.connect(self.show_info)
+        self.session_progress.connect(self.show_session_progress)
+        self.tempo_received.connect(self.tpbar.set_tempo)
+
+        # Parameter and property notifications are coalesced by the controller and applied once per frame
+        self._frame_rate = NOTIFICATION_FRAME_RATE
+        self._frame_timer = QTimer(self)
+        self._frame_timer.timeout.connect(self.process_pending_notifications)
+        self.set_frame_rate(self._frame_rate)
+
+        self._lag_label = QLabel(self)
+        self.statusBar().addPermanentWidget(self._lag_label)
+        self._lag_timer = QTimer(self)
+        self._lag_timer.timeout.connect(self.show_notification_lag)
+        self._lag_timer.start(NOTIFICATION_LAG_INTERVAL)
+
+        self._autosave_timer = QTimer(self)
+        self._autosave_timer.setInterval(int(SESSION_AUTOSAVE_INTERVAL * 1000))
+        self._autosave_timer.timeout.connect(self.autosave_session)
 
         try:
             self.setup_sushi_controller()
@@ -95,19 +176,22 @@ class MainWindow(QMainWindow):
             print(f'NO SUSHI: {e}')
 
     def setup_sushi_controller(self) -> None:
-        for idx, t in self.tracks.items():
-            try:
-                t.deleteLater()
-                self._track_layout.removeWidget(t)
-            except RuntimeError:
-                pass
         if self._controller:
-            self._controller.close()
+            # Keep the widgets, the controller patches them to match the graph it finds
+            self._controller.save_layout()
+            self._controller.reconnect(self.current_sushi_ip)
+            return
+
         self._controller = Controller(address=self.current_sushi_ip, proto_file=proto_file)
         self._controller.set_view(self)
+        self._controller.writes.set_rate(self._write_rate)
         self._controller.subscribe_to_notifications()
         self.tpbar.initialize()
         self.tracks = {}
+        self._placeholders = {}
+        self._unbuilt_tracks = {}
+        self._parameter_routes = {}
+        self._property_routes = {}
         self._create_tracks()
 
     def save_session(self):
@@ -122,81 +206,313 @@ class MainWindow(QMainWindow):
         except:
             pass
 
+    def restore_autosaved_session(self) -> None:
+        if self._controller:
+            self._controller.restore_autosaved_session()
+
+    def set_autosave(self, enabled: bool) -> None:
+        if enabled:
+            self._autosave_timer.start()
+        else:
+            self._autosave_timer.stop()
+
+    def autosave_session(self) -> None:
+        if self._controller:
+            self._controller.autosave_session()
+
+    def show_session_progress(self, text: str, percent: int) -> None:
+        self.statusBar().showMessage(f'{text}, {percent}%' if percent < 100 else text, 5000)
+
+    def _create_track_strip(self) -> None:
+        # Tracks are laid out in a horizontally scrolling strip. TrackWidgets are only built for
+        # tracks in or near the visible part, the rest are placeholders until scrolled to
+        self._track_strip = QScrollArea(self)
+        self._track_strip.setWidgetResizable(True)
+        self._track_strip.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self._track_strip.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self._track_strip.setFrameShape(QFrame.NoFrame)
+        strip = QWidget(self._track_strip)
+        self._track_layout = QHBoxLayout(strip)
+        self._track_layout.setContentsMargins(0, 0, 0, 0)
+        self._track_layout.addStretch()
+        self._track_strip.setWidget(strip)
+        self._window_layout.addWidget(self._track_strip)
+
+        # Building is deferred to the event loop, so a burst of scroll or resize events builds once
+        self._build_timer = QTimer(self)
+        self._build_timer.setSingleShot(True)
+        self._build_timer.setInterval(0)
+        self._build_timer.timeout.connect(self._build_visible_tracks)
+        self._track_strip.horizontalScrollBar().valueChanged.connect(self._schedule_track_build)
+
+    def _schedule_track_build(self) -> None:
+        self._build_timer.start()
+
+    def resizeEvent(self, event) -> None:
+        super().resizeEvent(event)
+        self._schedule_track_build()
+
+    def _add_track_widget(self, widget: QWidget) -> None:
+        # Keep the stretch at the end
+        self._track_layout.insertWidget(self._track_layout.count() - 1, widget)
+
+    def _build_visible_tracks(self) -> None:
+        if not self._unbuilt_tracks:
+            return
+        left = self._track_strip.horizontalScrollBar().value() - TRACK_BUILD_MARGIN
+        right = left + self._track_strip.viewport().width() + 2 * TRACK_BUILD_MARGIN
+        for track_id, track_snapshot in list(self._unbuilt_tracks.items()):
+            placeholder = self._placeholders[track_id]
+            if placeholder.x() <= right and placeholder.x() + placeholder.width() >= left:
+                del self._unbuilt_tracks[track_id]
+                self._build_track(track_snapshot)
+
+    def _build_track(self, track_snapshot: TrackSnapshot) -> None:
+        # The snapshot belongs to the controller's graph model, which is kept up to date
+        # from notifications, so it's current even if the track was out of view for a while
+        track_id = track_snapshot.info.id
+        placeholder = self._placeholders.pop(track_id)
+        track = TrackWidget(self._controller, track_snapshot, self)
+        self._track_layout.replaceWidget(placeholder, track)
+        placeholder.deleteLater()
+        self.tracks[track_id] = track
+        self._add_routes(track)
+
     def delete_track(self, track_id: int) -> None:
-        track = self.tracks.pop(track_id)
+        self._unbuilt_tracks.pop(track_id, None)
+        if track_id in self.tracks:
+            track = self.tracks.pop(track_id)
+            self._remove_routes(track)
+        elif track_id in self._placeholders:
+            track = self._placeholders.pop(track_id)
+        else:
+            return
         track.deleteLater() # Otherwise traces are left hanging
         self._track_layout.removeWidget(track)
 
-    def create_track(self, track_info: sushi.TrackInfo) -> None:
-        if track_info.id not in self.tracks:
-            track = TrackWidget(self._controller, track_info, self)
-            self._track_layout.addWidget(track)
-            self.tracks[track_info.id] = track
-
-    def create_processor_on_track(self, plugin_info: sushi.ProcessorInfo, track_id: int) -> None:
-        self.tracks[track_id].create_processor(plugin_info)
+    def create_placeholders(self, track_infos: List[sushi.TrackInfo]) -> None:
+        for t in track_infos:
+            if t.id in self.tracks or t.id in self._placeholders:
+                continue
+            placeholder = TrackPlaceholderWidget(t, self)
+            self._add_track_widget(placeholder)
+            self._placeholders[t.id] = placeholder
+
+    def add_track_snapshot(self, track_snapshot: TrackSnapshot) -> None:
+        # The placeholder will be gone if the track was deleted while loading
+        track_id = track_snapshot.info.id
+        if track_id not in self._placeholders:
+            return
+
+        self._placeholders[track_id].set_loaded()
+        self._unbuilt_tracks[track_id] = track_snapshot
+        self._schedule_track_build()
+
+    def replace_track(self, track_snapshot: TrackSnapshot) -> None:
+        # The track changed since the layout was cached, so it's rebuilt from the new snapshot
+        track_id = track_snapshot.info.id
+        if track_id in self._unbuilt_tracks:
+            self._unbuilt_tracks[track_id] = track_snapshot
+        if track_id not in self.tracks:
+            return
+
+        old = self.tracks[track_id]
+        self._remove_routes(old)
+        track = TrackWidget(self._controller, track_snapshot, self)
+        self._track_layout.replaceWidget(old, track)
+        old.deleteLater()
+        self.tracks[track_id] = track
+        self._add_routes(track)
+
+    def add_processor_snapshot(self, track_id: int, index: int, processor_snapshot: ProcessorSnapshot) -> None:
+        if track_id in self.tracks:
+            track = self.tracks[track_id]
+            track.add_processor(processor_snapshot, index)
+            self._add_routes(track.processors[processor_snapshot.info.id])
+
+    def add_processor_parameters(self, processor_id: int, parameters: List[ParameterSnapshot],
+                                 properties: List[PropertySnapshot]) -> None:
+        track_id = self._controller.graph.processor_track(processor_id)
+        if track_id in self.tracks and processor_id in self.tracks[track_id].processors:
+            processor = self.tracks[track_id].processors[processor_id]
+            processor.set_parameters(parameters, properties)
+            self._add_routes(processor)
+
+    def delete_processor(self, track_id: int, processor_id: int) -> None:
+        track = self.tracks[track_id]
+        if processor_id in track.processors:
+            self._remove_routes(track.processors[processor_id])
+            track.delete_processor(processor_id)
+
+    def _add_routes(self, widget: QWidget) -> None:
+        self._parameter_routes.update(widget.parameter_routes())
+        self._property_routes.update(widget.property_routes())
+
+    def _remove_routes(self, widget: QWidget) -> None:
+        for key in widget.parameter_routes():
+            self._parameter_routes.pop(key, None)
+        for key in widget.property_routes():
+            self._property_routes.pop(key, None)
 
     def _create_tracks(self) -> None:
-        tracks = self._controller.audio_graph.get_all_tracks()
-        for t in tracks:
-            self.create_track(t)
+        # Show the layout from last time straight away, the controller patches it to match Sushi
+        for track_snapshot in self._controller.load_cached_tracks():
+            placeholder = TrackPlaceholderWidget(track_snapshot.info, self)
+            placeholder.set_loaded()
+            self._add_track_widget(placeholder)
+            self._placeholders[track_snapshot.info.id] = placeholder
+            self._unbuilt_tracks[track_snapshot.info.id] = track_snapshot
+        self._schedule_track_build()
+
+    def closeEvent(self, event) -> None:
+        if self._controller:
+            self._controller.save_layout()
+            self._controller.close()
+        super().closeEvent(event)
 
     def show_about_sushi(self) -> None:
+        self._request_info(self._about_sushi_text)
+
+    def _about_sushi_text(self) -> str:
         version = self._controller.system.get_sushi_version()
         build_info = self._controller.system.get_build_info()
         audio_inputs = self._controller.system.get_input_audio_channel_count()
         audio_outputs = self._controller.system.get_output_audio_channel_count()
 
-        about = QMessageBox()
-        about.setText(f"Sushi version: {version}\n"
-                      f"Buidl info: {build_info}\n"
-                      f"Audio input count: {audio_inputs}\n"
-                      f"Audio output count: {audio_outputs}")
-        about.exec_()
+        return (f"Sushi version: {version}\n"
+                f"Buidl info: {build_info}\n"
+                f"Audio input count: {audio_inputs}\n"
+                f"Audio output count: {audio_outputs}")
 
     def show_all_processors(self) -> None:
-        r = self._controller.audio_graph.get_all_processors()
-        info = QMessageBox()
-        info.setText(f"{r}")
-        info.exec_()
+        self._request_info(self._controller.audio_graph.get_all_processors)
 
     def show_all_tracks(self) -> None:
-        r = self._controller.audio_graph.get_all_tracks()
-        info = QMessageBox()
-        info.setText(f"{r}")
-        info.exec_()
+        self._request_info(self._controller.audio_graph.get_all_tracks)
 
     def show_inputs(self) -> None:
-        r = self._controller.audio_routing.get_all_input_connections()
+        self._request_info(self._controller.audio_routing.get_all_input_connections)
+
+    def _request_info(self, function) -> None:
+        # Queried in the background, the message box is shown when the answer arrives
+        future = self._controller.run_command('info', function)
+        future.add_done_callback(lambda f: f.exception() is None and self.info_received.emit(f"{f.result()}"))
+
+    def show_info(self, text: str) -> None:
         info = QMessageBox()
-        info.setText(f"{r}")
+        info.setText(text)
         info.exec_()
 
+    def show_rpc_stats(self) -> None:
+        if self._controller is None:
+            return
+        if self._rpc_stats_dialog is None:
+            self._rpc_stats_dialog = RpcStatsDialog(self._controller.rpc_stats, self)
+        self._rpc_stats_dialog.show()
+        self._rpc_stats_dialog.raise_()
+
+    def show_mirror(self) -> None:
+        if self._controller is None:
+            return
+        if self._mirror_dialog is None:
+            self._mirror_dialog = MirrorDialog(self._controller.mirror, self)
+        self._mirror_dialog.show()
+        self._mirror_dialog.raise_()
+
+    def show_snapshots(self) -> None:
+        if self._controller is None:
+            return
+        if self._snapshot_dialog is None:
+            self._snapshot_dialog = SnapshotDialog(self._controller.snapshots, self._controller.graph, self)
+        self._snapshot_dialog.show()
+        self._snapshot_dialog.raise_()
+
+    def show_automation(self) -> None:
+        if self._controller is None:
+            return
+        if self._automation_dialog is None:
+            self._automation_dialog = AutomationDialog(self._controller.automation, self)
+        self._automation_dialog.show()
+        self._automation_dialog.raise_()
+
+    def show_command_error(self, message: str) -> None:
+        print(message)
+        self.statusBar().showMessage(message, 5000)
+
+    def move_processor(self, track_id: int, processor_id: int, direction) -> None:
+        if track_id in self.tracks:
+            self.tracks[track_id].move_processor(processor_id, direction)
+
+    def set_processor_state(self, track_id: int, processor_id: int, bypassed: bool, program: int) -> None:
+        if track_id in self.tracks and processor_id in self.tracks[track_id].processors:
+            self.tracks[track_id].processors[processor_id].set_state(bypassed, program)
+
     def process_track_notification(self, n) -> None:
         if n.action == 1:   # TRACK_ADDED
-            for t in self._controller.audio_graph.get_all_tracks():
-                if t.id == n.track.id:
-                    self.create_track(t)
-                    break
-        elif n.action == 2:  # TRACK_DELETED
+            if n.track.id not in self.tracks and n.track.id not in self._placeholders:
+                self._controller.load_tracks([n.track.id])
+        elif n.action == 2 and (n.track.id in self.tracks or n.track.id in self._placeholders):  # TRACK_DELETED
             self.delete_track(n.track.id)
 
     def process_processor_notification(self, n) -> None:
         if n.action == 1:  # PROCESSOR_ADDED
-            for t in self._controller.audio_graph.get_track_processors(n.parent_track.id):
-                if t.id == n.processor.id:
-                    self.create_processor_on_track(t, n.parent_track.id)
-                    break
-        elif n.action == 2:  # PROCESSOR_DELETED
-            self.tracks[n.parent_track.id].delete_processor(n.processor.id)
+            self._controller.load_processor(n.parent_track.id, n.processor.id)
+        elif n.action == 2 and n.parent_track.id in self.tracks:  # PROCESSOR_DELETED
+            self.delete_processor(n.parent_track.id, n.processor.id)
+
+    def set_frame_rate(self, rate: int) -> None:
+        self._frame_rate = rate
+        self._frame_timer.start(int(1000 / rate))
+
+    def show_frame_rate_dialog(self) -> None:
+        rate, ok = QInputDialog.getInt(self, 'Display update rate', 'Updates per second:', self._frame_rate, 1, 240)
+        if ok:
+            self.set_frame_rate(rate)
+
+    def show_write_rate_dialog(self) -> None:
+        rate, ok = QInputDialog.getInt(self, 'Parameter send rate', 'Max updates per second:', self._write_rate, 1, 1000)
+        if ok:
+            self._write_rate = rate
+            if self._controller:
+                self._controller.writes.set_rate(rate)
+
+    def process_pending_notifications(self) -> None:
+        if self._controller is None:
+            return
+        parameters, properties, arrivals = self._controller.pending_notifications.take()
+        for n in parameters:
+            self.process_parameter_notification(n)
+        for n in properties:
+            self.process_property_notification(n)
+        monitor = self._controller.notification_monitor
+        monitor.coalesced('parameter', arrivals['parameter'], len(parameters))
+        monitor.coalesced('property', arrivals['property'], len(properties))
+
+    def _monitored(self, kind: str, process: Callable) -> Callable:
+        # Notifications that come as queued signals are reported to the monitor once they're handled
+        def handle(n) -> None:
+            try:
+                process(n)
+            finally:
+                if self._controller:
+                    self._controller.notification_monitor.delivered(kind)
+        return handle
+
+    def show_notification_lag(self) -> None:
+        if self._controller is None:
+            return
+        monitor = self._controller.notification_monitor
+        lag = monitor.lag_percentiles()
+        self._lag_label.setText(f"Lag p50 {lag['p50'] * 1000:.0f} ms, p99 {lag['p99'] * 1000:.0f} ms, "
+                                f"queued {monitor.depth()}")
+        self._lag_label.setToolTip('\n'.join(f"{kind}: p50 {s['p50'] * 1000:.1f} ms, p99 {s['p99'] * 1000:.1f} ms, "
+                                             f"queued {s['depth']} (max {s['max_depth']})"
+                                             for kind, s in monitor.stats().items()))
 
     def process_parameter_notification(self, n) -> None:
-        for id, track in self.tracks.items():
-            if n.parameter.processor_id == id:
-                track.handle_parameter_notification(n)
-
-            elif n.parameter.processor_id in track.processors:
-                track.processors[n.parameter.processor_id].handle_parameter_notification(n)
+        handler = self._parameter_routes.get((n.parameter.processor_id, n.parameter.parameter_id))
+        if handler:
+            handler(n)
 
     def process_transport_notification(self, n) -> None:
         if n.HasField('tempo'):
@@ -206,10 +522,12 @@ class MainWindow(QMainWindow):
             self.tpbar.set_playing(n.playing_mode.mode == MODE_PLAYING)
 
     def process_timing_notification(self, n = None) -> None:
-        if n: 
-            self.tpbar.set_cpu_value(n.average)
+        if n:
+            # Depending on the proto version, the engine's timings are at the top level or under main
+            timings = n.main if hasattr(n, 'main') else n
+            self.tpbar.set_cpu_value(timings.average)
 
     def process_property_notification(self, n) -> None:
-        for t, v in self.tracks.items():
-            if n.property.processor_id in v.processors:
-                v.processors[n.property.processor_id].handle_property_notification(n)
+        handler = self._property_routes.get((n.property.processor_id, n.property.property_id))
+        if handler:
+            handler(n)
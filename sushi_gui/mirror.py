@@ -0,0 +1,267 @@
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Lock
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import grpc
+from elkpy.sushicontroller import SushiController
+
+from .constants import MIRROR_WRITE_RATE, MIRROR_WORKERS, MIRROR_LAG_SAMPLES, MIRROR_CONNECT_TIMEOUT, \
+    COMMAND_DEADLINE
+from .channel_pool import channels
+from .command_executor import DeadlineStub
+from .write_queue import WriteQueue
+
+
+# Copies parameter, bypass, program and transport changes from the primary Sushi to any number of
+# followers running the same graph, e.g. a backup device. Ids can differ between devices, so
+# processors and parameters are matched by name. Every follower has an elkpy controller and a write
+# queue of its own, so a slow or unreachable follower never holds back the others or the GUI.
+class Mirror:
+    def __init__(self, controller) -> None:
+        self._controller = controller
+        self._lock = Lock()
+        self.followers: Dict[str, 'Follower'] = {}
+        # Primary (processor id, parameter id) -> (is track, processor name, parameter name)
+        self._names = {}
+
+    def add_follower(self, address: str) -> Future:
+        # Connecting can take a while, so it's done on the primary's command pool
+        if ':' not in address:
+            address += ':51051'
+        return self._controller.run_command(('follower', address), self._add_follower, address)
+
+    def _add_follower(self, address: str) -> None:
+        if address in self.followers:
+            return
+        # Connected without holding the lock, which the other followers' writes need to look up names
+        controller = _connect(address, self._controller._proto_file)
+        with self._lock:
+            follower = None
+            if address not in self.followers:
+                followers = dict(self.followers)
+                follower = followers[address] = Follower(address, self, controller)
+                # Replaced rather than changed, so notification threads can iterate it without locking
+                self.followers = followers
+        if follower is None:
+            controller.close()
+            channels.release(address)
+            return
+        self._sync(follower)
+
+    def remove_follower(self, address: str) -> None:
+        with self._lock:
+            followers = dict(self.followers)
+            follower = followers.pop(address, None)
+            self.followers = followers
+        if follower is not None:
+            follower.close()
+            channels.release(address)
+
+    def close(self) -> None:
+        for address in list(self.followers):
+            self.remove_follower(address)
+
+    def _sync(self, follower: 'Follower') -> None:
+        # A new follower starts out with the values the primary's graph model has, parameters of
+        # processors that were never expanded aren't known and are only mirrored once they change
+        for track in list(self._controller.graph.tracks.values()):
+            for p in track.parameters:
+                follower.put(('parameter', track.info.id, p.info.id), p.value, follower.set_parameter, track.info.id,
+                             p.info.id, p.value)
+            for processor in list(track.processors):
+                processor_id = processor.info.id
+                follower.put(('bypass', processor_id), processor.bypassed, follower.set_bypass, processor_id,
+                             processor.bypassed)
+                if processor.programs:
+                    follower.put(('program', processor_id), processor.current_program, follower.set_program,
+                                 processor_id, processor.current_program)
+                for p in processor.parameters or []:
+                    follower.put(('parameter', processor_id, p.info.id), p.value, follower.set_parameter,
+                                 processor_id, p.info.id, p.value)
+
+    def forget_names(self) -> None:
+        # After reconnecting the primary's ids no longer match the names looked up before
+        with self._lock:
+            self._names.clear()
+
+    def parameter(self, processor_id: int, parameter_id: int, value: float) -> None:
+        for follower in self.followers.values():
+            follower.put(('parameter', processor_id, parameter_id), value, follower.set_parameter, processor_id,
+                         parameter_id, value)
+
+    def bypass(self, processor_id: int, bypassed: bool) -> None:
+        for follower in self.followers.values():
+            follower.put(('bypass', processor_id), bypassed, follower.set_bypass, processor_id, bypassed)
+
+    def program(self, processor_id: int, program_id: int) -> None:
+        for follower in self.followers.values():
+            follower.put(('program', processor_id), program_id, follower.set_program, processor_id, program_id)
+
+    def tempo(self, tempo: float) -> None:
+        for follower in self.followers.values():
+            follower.put(('tempo',), tempo, follower.controller.transport.set_tempo, tempo)
+
+    def playing_mode(self, mode: int) -> None:
+        for follower in self.followers.values():
+            follower.put(('playing_mode',), mode, follower.controller.transport.set_playing_mode, mode)
+
+    def transport_notification(self, n) -> None:
+        if n.HasField('tempo'):
+            self.tempo(n.tempo)
+        elif n.HasField('playing_mode'):
+            self.playing_mode(n.playing_mode.mode)
+
+    def stats(self) -> List[dict]:
+        return [follower.stats() for follower in self.followers.values()]
+
+    def processor_name(self, processor_id: int) -> Tuple[bool, str]:
+        # Called from the followers' write threads, the graph model is used when the processor is
+        # loaded, otherwise the primary is asked
+        return self.parameter_name(processor_id, None)[:2]
+
+    def parameter_name(self, processor_id: int, parameter_id: Optional[int]) -> Tuple[bool, str, str]:
+        key = (processor_id, parameter_id)
+        names = self._names.get(key)
+        if names is None:
+            names = self._look_up_names(processor_id, parameter_id)
+            with self._lock:
+                self._names[key] = names
+        return names
+
+    def _look_up_names(self, processor_id: int, parameter_id: Optional[int]) -> Tuple[bool, str, str]:
+        graph = self._controller.graph
+        is_track = graph.has_track(processor_id)
+        if is_track:
+            processor_name = graph.tracks[processor_id].info.name
+        elif graph.has_processor(processor_id):
+            processor_name = graph.processors[processor_id].info.name
+        else:
+            try:
+                processor_name = self._controller.audio_graph.get_processor_info(processor_id).name
+            except Exception:
+                is_track = True
+                processor_name = self._controller.audio_graph.get_track_info(processor_id).name
+        if parameter_id is None:
+            return is_track, processor_name, ''
+        parameter = graph.parameter(processor_id, parameter_id)
+        if parameter is not None:
+            return is_track, processor_name, parameter.info.name
+        return is_track, processor_name, self._controller.parameters.get_parameter_info(processor_id, parameter_id).name
+
+
+def _connect(address: str, proto_file: str) -> SushiController:
+    # Followers are only written to, so a plain elkpy controller without notification streams will do,
+    # on the pooled channel for the address. Raises if the follower doesn't answer in time
+    controller = SushiController(address, proto_file)
+    controller.notifications.close()
+    channel = channels.acquire(address)
+    try:
+        grpc.channel_ready_future(channel).result(timeout=MIRROR_CONNECT_TIMEOUT)
+    except grpc.FutureTimeoutError:
+        channels.release(address)
+        raise TimeoutError(f'{address} did not answer within {MIRROR_CONNECT_TIMEOUT:.0f} s')
+    for name in ['audio_graph', 'parameters', 'programs', 'transport']:
+        sub_controller = getattr(controller, name)
+        sub_controller._stub = DeadlineStub(type(sub_controller._stub)(channel), name,
+                                            default_deadline=COMMAND_DEADLINE)
+    return controller
+
+
+# One follower device. Writes are coalesced per target like the primary's own writes, and values
+# the follower already has, such as Sushi echoing a change made in the GUI, are not sent again.
+class Follower:
+    def __init__(self, address: str, mirror: Mirror, controller) -> None:
+        self.address = address
+        self.controller = controller
+        self._mirror = mirror
+        self._writes = WriteQueue(MIRROR_WRITE_RATE, MIRROR_WORKERS)
+        self._lock = Lock()
+        # When the oldest change not yet written to each target was made, and the last value written
+        self._queued = {}
+        self._sent = {}
+        # The follower's ids, by processor name and by (processor id, parameter name), shared by the write workers
+        self._ids = {}
+        self._lags = deque(maxlen=MIRROR_LAG_SAMPLES)
+        self._writes_done = 0
+        self._errors = 0
+        self._last_error = ''
+
+    def put(self, key: Hashable, value, function: Callable, *args) -> None:
+        with self._lock:
+            if key not in self._queued and self._sent.get(key) == value:
+                return
+            self._queued.setdefault(key, time.perf_counter())
+        self._writes.put(key, self._write, key, value, function, args)
+
+    def close(self) -> None:
+        self._writes.close()
+        self.controller.close()
+
+    def set_parameter(self, processor_id: int, parameter_id: int, value: float) -> None:
+        is_track, processor_name, parameter_name = self._mirror.parameter_name(processor_id, parameter_id)
+        follower_processor = self._processor_id(is_track, processor_name)
+        parameter = self._id((follower_processor, parameter_name), self.controller.parameters.get_parameter_id,
+                             follower_processor, parameter_name)
+        self.controller.parameters.set_parameter_value(follower_processor, parameter, value)
+
+    def set_bypass(self, processor_id: int, bypassed: bool) -> None:
+        follower_processor = self._processor_id(*self._mirror.processor_name(processor_id))
+        self.controller.audio_graph.set_processor_bypass_state(follower_processor, bypassed)
+
+    def set_program(self, processor_id: int, program_id: int) -> None:
+        follower_processor = self._processor_id(*self._mirror.processor_name(processor_id))
+        self.controller.programs.set_processor_program(follower_processor, program_id)
+
+    def _processor_id(self, is_track: bool, name: str) -> int:
+        audio_graph = self.controller.audio_graph
+        return self._id(name, audio_graph.get_track_id if is_track else audio_graph.get_processor_id, name)
+
+    def _id(self, key: Hashable, look_up: Callable, *args) -> int:
+        # Looked up without holding the lock, two workers may both look up the same id, which is harmless
+        with self._lock:
+            found = self._ids.get(key)
+        if found is None:
+            found = look_up(*args)
+            with self._lock:
+                self._ids[key] = found
+        return found
+
+    def _write(self, key: Hashable, value, function: Callable, args: tuple) -> None:
+        with self._lock:
+            queued = self._queued.pop(key, None)
+        try:
+            try:
+                function(*args)
+            except Exception:
+                # The follower's graph may have been rebuilt since its ids were looked up
+                with self._lock:
+                    self._ids.clear()
+                function(*args)
+        except Exception as e:
+            with self._lock:
+                self._sent.pop(key, None)
+                self._errors += 1
+                # An unreachable follower fails every write, only the first of a run of errors is printed
+                repeated, self._last_error = bool(self._last_error), str(e)
+            if not repeated:
+                print(f'Error mirroring to {self.address}: {e}')
+            return
+        with self._lock:
+            self._sent[key] = value
+            self._writes_done += 1
+            self._last_error = ''
+            if queued is not None:
+                self._lags.append(time.perf_counter() - queued)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lags = sorted(self._lags)
+            return {'address': self.address,
+                    'pending': len(self._queued),
+                    'writes': self._writes_done,
+                    'errors': self._errors,
+                    'last_error': self._last_error,
+                    'p50': lags[len(lags) // 2] if lags else 0.0,
+                    'p99': lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0}
@@ -0,0 +1,671 @@
+import os
+import sys
+import time
+import queue
+import random
+import argparse
+import threading
+from concurrent import futures
+from typing import Optional
+
+import grpc
+
+from .proto_cache import modules_from_proto
+
+# A stand-in for Sushi's gRPC interface with a synthetic audio graph, so the GUI can be run,
+# measured and load tested without Sushi. Start it with `python -m sushi_gui.mock_server`
+# and point the GUI at the address it prints, or create a MockSushiServer in-process.
+SUSHI_ADDRESS = 'localhost:51051'
+
+proto_file = os.environ.get('SUSHI_GRPC_ELKPY_PROTO', './sushi-grpc-api/sushi_rpc.proto')
+pb, pb_grpc = modules_from_proto(proto_file)
+
+
+# Sushi's state: tracks, processors, parameter and property values, programs and transport.
+# Everything that changes the graph notifies through the function given to set_notifier
+class MockGraph:
+    def __init__(self, tracks: int = 4, processors: int = 4, parameters: int = 16, properties: int = 1,
+                 programs: int = 4) -> None:
+        self.lock = threading.RLock()
+        self.tracks = {}
+        self.processors = {}
+        self.parameters = {}
+        self.values = {}
+        self.properties = {}
+        self.property_values = {}
+        self.programs = {}
+        self.current_program = {}
+        self.bypass = {}
+        self.tempo = 120.0
+        self.playing_mode = 1
+        self.sync_mode = 1
+        self._next_id = 0
+        self._notify = None
+        self.defaults = (processors, parameters, properties, programs)
+
+        for t in range(tracks):
+            self.create_track(f'track_{t}', 2, 1)
+
+    def set_notifier(self, notify) -> None:
+        self._notify = notify
+
+    def notify(self, kind: str, notification) -> None:
+        if self._notify:
+            self._notify(kind, notification)
+
+    def _new_id(self) -> int:
+        new_id = self._next_id
+        self._next_id += 1
+        return new_id
+
+    def create_track(self, name: str, channels: int, buses: int, populate: bool = True) -> int:
+        with self.lock:
+            track_id = self._new_id()
+            self.tracks[track_id] = {'name': name, 'channels': channels, 'buses': buses, 'processors': []}
+            params = ['gain', 'pan', 'mute']
+            for bus in range(1, buses):
+                params += [f'gain_sub_{bus}', f'pan_sub_{bus}']
+            self._add_parameters(track_id, params)
+            self.properties[track_id] = []
+            self.programs[track_id] = []
+
+        if populate:
+            processors, parameters, properties, programs = self.defaults
+            for p in range(processors):
+                self.create_processor(track_id, f'{name}_proc_{p}', parameters, properties, programs, notify=False)
+
+        self._emit_track(1, track_id)
+        return track_id
+
+    def _add_parameters(self, processor_id: int, names: list) -> None:
+        infos = []
+        for i, name in enumerate(names):
+            infos.append(pb.ParameterInfo(id=i, type=pb.ParameterType(type=3), label=name.capitalize(), name=name,
+                                          unit='dB' if name.startswith('gain') else '', automatable=True,
+                                          min_domain_value=0.0, max_domain_value=1.0))
+            self.values[(processor_id, i)] = random.random() if name != 'mute' else 0.0
+        self.parameters[processor_id] = infos
+
+    def create_processor(self, track_id: int, name: str, parameters: int, properties: int, programs: int,
+                         before: Optional[int] = None, notify: bool = True) -> int:
+        with self.lock:
+            proc_id = self._new_id()
+            self.processors[proc_id] = {'name': name, 'label': name.capitalize(), 'track': track_id,
+                                        'program_count': programs}
+            self._add_parameters(proc_id, [f'param_{i}' for i in range(parameters)])
+            self.properties[proc_id] = [pb.PropertyInfo(id=i, name=f'prop_{i}', label=f'Prop {i}')
+                                        for i in range(properties)]
+            for i in range(properties):
+                self.property_values[(proc_id, i)] = ''
+            self.programs[proc_id] = [pb.ProgramInfo(id=pb.ProgramIdentifier(program=i), name=f'program_{i}')
+                                      for i in range(programs)]
+            self.current_program[proc_id] = 0
+            self.bypass[proc_id] = False
+            track_procs = self.tracks[track_id]['processors']
+            if before is not None and before in track_procs:
+                track_procs.insert(track_procs.index(before), proc_id)
+            else:
+                track_procs.append(proc_id)
+
+        if notify:
+            self._emit_processor(1, proc_id, track_id)
+        return proc_id
+
+    def delete_processor(self, track_id: int, proc_id: int) -> None:
+        with self.lock:
+            self.tracks[track_id]['processors'].remove(proc_id)
+            self._forget(proc_id)
+        self._emit_processor(2, proc_id, track_id)
+
+    def delete_track(self, track_id: int) -> None:
+        with self.lock:
+            track = self.tracks.pop(track_id)
+            for proc_id in track['processors']:
+                self._forget(proc_id)
+            self._forget(track_id)
+        self._emit_track(2, track_id)
+
+    def _forget(self, proc_id: int) -> None:
+        self.processors.pop(proc_id, None)
+        for p in self.parameters.pop(proc_id, []):
+            self.values.pop((proc_id, p.id), None)
+        for p in self.properties.pop(proc_id, []):
+            self.property_values.pop((proc_id, p.id), None)
+        self.programs.pop(proc_id, None)
+        self.current_program.pop(proc_id, None)
+        self.bypass.pop(proc_id, None)
+
+    def set_parameter(self, proc_id: int, param_id: int, value: float, notify: bool = True) -> None:
+        with self.lock:
+            if (proc_id, param_id) not in self.values:
+                return
+            self.values[(proc_id, param_id)] = min(max(value, 0.0), 1.0)
+        if notify:
+            self.notify('parameter', self.parameter_update(proc_id, param_id))
+
+    def parameter_update(self, proc_id: int, param_id: int):
+        value = self.values.get((proc_id, param_id), 0.0)
+        return pb.ParameterUpdate(parameter=pb.ParameterIdentifier(processor_id=proc_id, parameter_id=param_id),
+                                  normalized_value=value, domain_value=value, formatted_value=f'{value:.2f}')
+
+    def track_info(self, track_id: int):
+        t = self.tracks[track_id]
+        return pb.TrackInfo(id=track_id, label=t['name'].capitalize(), name=t['name'], channels=t['channels'],
+                            buses=t['buses'], type=pb.TrackType(type=1),
+                            processors=[pb.ProcessorIdentifier(id=p) for p in t['processors']])
+
+    def processor_info(self, proc_id: int):
+        p = self.processors[proc_id]
+        return pb.ProcessorInfo(id=proc_id, label=p['label'], name=p['name'],
+                                parameter_count=len(self.parameters[proc_id]), program_count=p['program_count'])
+
+    def _emit_track(self, action: int, track_id: int) -> None:
+        self.notify('track', pb.TrackUpdate(action=action, track=pb.TrackIdentifier(id=track_id)))
+
+    def _emit_processor(self, action: int, proc_id: int, track_id: int) -> None:
+        self.notify('processor', pb.ProcessorUpdate(action=action, processor=pb.ProcessorIdentifier(id=proc_id),
+                                                    parent_track=pb.TrackIdentifier(id=track_id)))
+
+    def save_state(self):
+        with self.lock:
+            state = pb.SessionState(save_date=time.strftime('%Y-%m-%d %H:%M'))
+            state.engine_state.tempo = self.tempo
+            for track_id, t in self.tracks.items():
+                track = state.tracks.add(name=t['name'], label=t['name'].capitalize(), channels=t['channels'],
+                                         buses=t['buses'])
+                track.track_state.CopyFrom(self.processor_state(track_id))
+                for proc_id in t['processors']:
+                    p = self.processors[proc_id]
+                    plugin = track.processors.add(name=p['name'], label=p['label'], uid=f'mock.{proc_id}')
+                    plugin.state.CopyFrom(self.processor_state(proc_id))
+            return state
+
+    def processor_state(self, proc_id: int):
+        state = pb.ProcessorState()
+        state.bypassed.has_value = True
+        state.bypassed.value = self.bypass.get(proc_id, False)
+        if self.programs.get(proc_id):
+            state.program_id.has_value = True
+            state.program_id.value = self.current_program[proc_id]
+        for p in self.parameters[proc_id]:
+            state.parameters.add(parameter=pb.ParameterIdentifier(processor_id=proc_id, parameter_id=p.id),
+                                 value=self.values[(proc_id, p.id)])
+        for p in self.properties[proc_id]:
+            state.properties.add(property=pb.PropertyIdentifier(processor_id=proc_id, property_id=p.id),
+                                 value=self.property_values[(proc_id, p.id)])
+        return state
+
+    def restore_state(self, state) -> None:
+        for track_id in list(self.tracks):
+            self.delete_track(track_id)
+        self.tempo = state.engine_state.tempo or self.tempo
+        for track in state.tracks:
+            track_id = self.create_track(track.name, track.channels, track.buses, populate=False)
+            self._apply_state(track_id, track.track_state)
+            for plugin in track.processors:
+                proc_id = self.create_processor(track_id, plugin.name, len(plugin.state.parameters),
+                                                len(plugin.state.properties), self.defaults[3])
+                self._apply_state(proc_id, plugin.state)
+
+    def _apply_state(self, proc_id: int, state) -> None:
+        with self.lock:
+            if state.bypassed.has_value:
+                self.bypass[proc_id] = state.bypassed.value
+            if state.program_id.has_value:
+                self.current_program[proc_id] = state.program_id.value
+            for i, p in enumerate(state.parameters):
+                self.values[(proc_id, i)] = p.value
+            for i, p in enumerate(state.properties):
+                self.property_values[(proc_id, i)] = p.value
+
+
+def _ok():
+    return pb.CommandResponse()
+
+
+class AudioGraphServicer(pb_grpc.AudioGraphControllerServicer):
+    def __init__(self, graph: MockGraph) -> None:
+        self._graph = graph
+
+    def GetAllProcessors(self, request, context):
+        with self._graph.lock:
+            return pb.ProcessorInfoList(processors=[self._graph.processor_info(p) for p in self._graph.processors])
+
+    def GetAllTracks(self, request, context):
+        with self._graph.lock:
+            return pb.TrackInfoList(tracks=[self._graph.track_info(t) for t in self._graph.tracks])
+
+    def GetTrackId(self, request, context):
+        for track_id, t in self._graph.tracks.items():
+            if t['name'] == request.value:
+                return pb.TrackIdentifier(id=track_id)
+        context.abort(grpc.StatusCode.NOT_FOUND, 'No track with that name')
+
+    def GetTrackInfo(self, request, context):
+        with self._graph.lock:
+            if request.id not in self._graph.tracks:
+                context.abort(grpc.StatusCode.NOT_FOUND, 'No track with that id')
+            return self._graph.track_info(request.id)
+
+    def GetTrackProcessors(self, request, context):
+        with self._graph.lock:
+            if request.id not in self._graph.tracks:
+                context.abort(grpc.StatusCode.NOT_FOUND, 'No track with that id')
+            return pb.ProcessorInfoList(processors=[self._graph.processor_info(p)
+                                                    for p in self._graph.tracks[request.id]['processors']])
+
+    def GetProcessorId(self, request, context):
+        for proc_id, p in self._graph.processors.items():
+            if p['name'] == request.value:
+                return pb.ProcessorIdentifier(id=proc_id)
+        context.abort(grpc.StatusCode.NOT_FOUND, 'No processor with that name')
+
+    def GetProcessorInfo(self, request, context):
+        with self._graph.lock:
+            if request.id not in self._graph.processors:
+                context.abort(grpc.StatusCode.NOT_FOUND, 'No processor with that id')
+            return self._graph.processor_info(request.id)
+
+    def GetProcessorBypassState(self, request, context):
+        return pb.GenericBoolValue(value=self._graph.bypass.get(request.id, False))
+
+    def GetProcessorState(self, request, context):
+        with self._graph.lock:
+            return self._graph.processor_state(request.id)
+
+    def SetProcessorBypassState(self, request, context):
+        self._graph.bypass[request.processor.id] = request.value
+        return _ok()
+
+    def CreateTrack(self, request, context):
+        self._graph.create_track(request.name, request.channels, 1, populate=False)
+        return _ok()
+
+    def CreateMultibusTrack(self, request, context):
+        self._graph.create_track(request.name, request.buses * 2, request.buses, populate=False)
+        return _ok()
+
+    def CreateProcessorOnTrack(self, request, context):
+        if request.track.id not in self._graph.tracks:
+            context.abort(grpc.StatusCode.NOT_FOUND, 'No track with that id')
+        before = None if request.position.add_to_back else request.position.before_processor.id
+        _, parameters, properties, programs = self._graph.defaults
+        self._graph.create_processor(request.track.id, request.name, parameters, properties, programs, before)
+        return _ok()
+
+    def MoveProcessorOnTrack(self, request, context):
+        graph = self._graph
+        with graph.lock:
+            source = graph.tracks[request.source_track.id]['processors']
+            dest = graph.tracks[request.dest_track.id]['processors']
+            source.remove(request.processor.id)
+            if request.position.add_to_back or request.position.before_processor.id not in dest:
+                dest.append(request.processor.id)
+            else:
+                dest.insert(dest.index(request.position.before_processor.id), request.processor.id)
+            graph.processors[request.processor.id]['track'] = request.dest_track.id
+        return _ok()
+
+    def DeleteProcessorFromTrack(self, request, context):
+        self._graph.delete_processor(request.track.id, request.processor.id)
+        return _ok()
+
+    def DeleteTrack(self, request, context):
+        self._graph.delete_track(request.id)
+        return _ok()
+
+
+class ParameterServicer(pb_grpc.ParameterControllerServicer):
+    def __init__(self, graph: MockGraph) -> None:
+        self._graph = graph
+
+    def _parameters(self, proc_id: int, context):
+        if proc_id not in self._graph.parameters:
+            context.abort(grpc.StatusCode.NOT_FOUND, 'No processor with that id')
+        return self._graph.parameters[proc_id]
+
+    def GetTrackParameters(self, request, context):
+        return pb.ParameterInfoList(parameters=self._parameters(request.id, context))
+
+    def GetProcessorParameters(self, request, context):
+        return pb.ParameterInfoList(parameters=self._parameters(request.id, context))
+
+    def GetParameterId(self, request, context):
+        for p in self._parameters(request.processor.id, context):
+            if p.name == request.ParameterName:
+                return pb.ParameterIdentifier(processor_id=request.processor.id, parameter_id=p.id)
+        context.abort(grpc.StatusCode.NOT_FOUND, 'No parameter with that name')
+
+    def GetParameterInfo(self, request, context):
+        params = self._parameters(request.processor_id, context)
+        if request.parameter_id >= len(params):
+            context.abort(grpc.StatusCode.NOT_FOUND, 'No parameter with that id')
+        return params[request.parameter_id]
+
+    def GetParameterValue(self, request, context):
+        key = (request.processor_id, request.parameter_id)
+        if key not in self._graph.values:
+            context.abort(grpc.StatusCode.NOT_FOUND, 'No parameter with that id')
+        return pb.GenericFloatValue(value=self._graph.values[key])
+
+    def GetParameterValueInDomain(self, request, context):
+        return self.GetParameterValue(request, context)
+
+    def GetParameterValueAsString(self, request, context):
+        key = (request.processor_id, request.parameter_id)
+        if key not in self._graph.values:
+            context.abort(grpc.StatusCode.NOT_FOUND, 'No parameter with that id')
+        return pb.GenericStringValue(value=f'{self._graph.values[key]:.2f}')
+
+    def SetParameterValue(self, request, context):
+        self._graph.set_parameter(request.parameter.processor_id, request.parameter.parameter_id, request.value)
+        return _ok()
+
+    def GetTrackProperties(self, request, context):
+        return pb.PropertyInfoList(properties=self._graph.properties.get(request.id, []))
+
+    def GetProcessorProperties(self, request, context):
+        return pb.PropertyInfoList(properties=self._graph.properties.get(request.id, []))
+
+    def GetPropertyId(self, request, context):
+        for p in self._graph.properties.get(request.processor.id, []):
+            if p.name == request.property_name:
+                return pb.PropertyIdentifier(processor_id=request.processor.id, property_id=p.id)
+        context.abort(grpc.StatusCode.NOT_FOUND, 'No property with that name')
+
+    def GetPropertyInfo(self, request, context):
+        return self._graph.properties[request.processor_id][request.property_id]
+
+    def GetPropertyValue(self, request, context):
+        return pb.GenericStringValue(value=self._graph.property_values.get((request.processor_id,
+                                                                            request.property_id), ''))
+
+    def SetPropertyValue(self, request, context):
+        key = (request.property.processor_id, request.property.property_id)
+        self._graph.property_values[key] = request.value
+        self._graph.notify('property', request)
+        return _ok()
+
+
+class ProgramServicer(pb_grpc.ProgramControllerServicer):
+    def __init__(self, graph: MockGraph) -> None:
+        self._graph = graph
+
+    def GetProcessorCurrentProgram(self, request, context):
+        return pb.ProgramIdentifier(program=self._graph.current_program.get(request.id, 0))
+
+    def GetProcessorCurrentProgramName(self, request, context):
+        programs = self._graph.programs.get(request.id, [])
+        current = self._graph.current_program.get(request.id, 0)
+        return pb.GenericStringValue(value=programs[current].name if programs else '')
+
+    def GetProcessorProgramName(self, request, context):
+        return pb.GenericStringValue(value=self._graph.programs[request.processor.id][request.program].name)
+
+    def GetProcessorPrograms(self, request, context):
+        return pb.ProgramInfoList(programs=self._graph.programs.get(request.id, []))
+
+    def SetProcessorProgram(self, request, context):
+        self._graph.current_program[request.processor.id] = request.program.program
+        return _ok()
+
+
+class TransportServicer(pb_grpc.TransportControllerServicer):
+    def __init__(self, graph: MockGraph) -> None:
+        self._graph = graph
+
+    def GetSamplerate(self, request, context):
+        return pb.GenericFloatValue(value=48000.0)
+
+    def GetPlayingMode(self, request, context):
+        return pb.PlayingMode(mode=self._graph.playing_mode)
+
+    def GetSyncMode(self, request, context):
+        return pb.SyncMode(mode=self._graph.sync_mode)
+
+    def GetTimeSignature(self, request, context):
+        return pb.TimeSignature(numerator=4, denominator=4)
+
+    def GetTempo(self, request, context):
+        return pb.GenericFloatValue(value=self._graph.tempo)
+
+    def SetTempo(self, request, context):
+        self._graph.tempo = request.value
+        self._graph.notify('transport', pb.TransportUpdate(tempo=request.value))
+        return _ok()
+
+    def SetPlayingMode(self, request, context):
+        self._graph.playing_mode = request.mode
+        self._graph.notify('transport', pb.TransportUpdate(playing_mode=request))
+        return _ok()
+
+    def SetSyncMode(self, request, context):
+        self._graph.sync_mode = request.mode
+        return _ok()
+
+    def SetTimeSignature(self, request, context):
+        return _ok()
+
+
+class TimingServicer(pb_grpc.TimingControllerServicer):
+    def GetTimingsEnabled(self, request, context):
+        return pb.GenericBoolValue(value=True)
+
+    def SetTimingsEnabled(self, request, context):
+        return _ok()
+
+    def GetEngineTimings(self, request, context):
+        return pb.CpuTimings(main=pb.Timings(average=0.1, min=0.05, max=0.2))
+
+    def ResetAllTimings(self, request, context):
+        return _ok()
+
+
+class SystemServicer(pb_grpc.SystemControllerServicer):
+    def GetSushiVersion(self, request, context):
+        return pb.GenericStringValue(value='mock')
+
+    def GetSushiApiVersion(self, request, context):
+        return pb.GenericStringValue(value='mock')
+
+    def GetBuildInfo(self, request, context):
+        return pb.SushiBuildInfo(version='mock', audio_buffer_size=64)
+
+    def GetInputAudioChannelCount(self, request, context):
+        return pb.GenericIntValue(value=2)
+
+    def GetOutputAudioChannelCount(self, request, context):
+        return pb.GenericIntValue(value=2)
+
+
+class AudioRoutingServicer(pb_grpc.AudioRoutingControllerServicer):
+    def GetAllInputConnections(self, request, context):
+        return pb.AudioConnectionList()
+
+    def GetAllOutputConnections(self, request, context):
+        return pb.AudioConnectionList()
+
+
+class SessionServicer(pb_grpc.SessionControllerServicer):
+    def __init__(self, graph: MockGraph) -> None:
+        self._graph = graph
+
+    def SaveSession(self, request, context):
+        return self._graph.save_state()
+
+    def RestoreSession(self, request, context):
+        self._graph.restore_state(request)
+        return _ok()
+
+
+class NotificationServicer(pb_grpc.NotificationControllerServicer):
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers = {'track': [], 'processor': [], 'parameter': [], 'property': [], 'transport': [],
+                             'timing': []}
+
+    def broadcast(self, kind: str, notification) -> None:
+        with self._lock:
+            for q in self._subscribers[kind]:
+                q.put(notification)
+
+    def _stream(self, kind: str, context):
+        q = queue.Queue()
+        with self._lock:
+            self._subscribers[kind].append(q)
+        try:
+            while context.is_active():
+                try:
+                    yield q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        finally:
+            with self._lock:
+                self._subscribers[kind].remove(q)
+
+    def SubscribeToTransportChanges(self, request, context):
+        return self._stream('transport', context)
+
+    def SubscribeToEngineCpuTimingUpdates(self, request, context):
+        return self._stream('timing', context)
+
+    def SubscribeToTrackChanges(self, request, context):
+        return self._stream('track', context)
+
+    def SubscribeToProcessorChanges(self, request, context):
+        return self._stream('processor', context)
+
+    def SubscribeToParameterUpdates(self, request, context):
+        return self._stream('parameter', context)
+
+    def SubscribeToPropertyUpdates(self, request, context):
+        return self._stream('property', context)
+
+
+# Delays every unary call by latency plus a random amount up to jitter, to simulate a remote device
+class LatencyInterceptor(grpc.ServerInterceptor):
+    def __init__(self, latency: float, jitter: float) -> None:
+        self._latency = latency
+        self._jitter = jitter
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+
+        # Sleep inside the handler, interceptors themselves run on the server's polling thread
+        behavior = handler.unary_unary
+
+        def delayed(request, context):
+            time.sleep(self._latency + random.uniform(0, self._jitter))
+            return behavior(request, context)
+
+        return grpc.unary_unary_rpc_method_handler(delayed, handler.request_deserializer,
+                                                   handler.response_serializer)
+
+
+class MockSushiServer:
+    def __init__(self, address: str = SUSHI_ADDRESS, tracks: int = 4, processors: int = 4, parameters: int = 16,
+                 properties: int = 1, programs: int = 4, latency: float = 0.0, jitter: float = 0.0,
+                 parameter_rate: float = 0.0, property_rate: float = 0.0, timing_rate: float = 0.0,
+                 workers: int = 16) -> None:
+        self.graph = MockGraph(tracks, processors, parameters, properties, programs)
+        self.notifications = NotificationServicer()
+        self.graph.set_notifier(self.notifications.broadcast)
+        self._rates = {'parameter': parameter_rate, 'property': property_rate, 'timing': timing_rate}
+        self._running = False
+        self._emitters = []
+
+        interceptors = [LatencyInterceptor(latency, jitter)] if latency > 0 or jitter > 0 else []
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers), interceptors=interceptors)
+        pb_grpc.add_AudioGraphControllerServicer_to_server(AudioGraphServicer(self.graph), self._server)
+        pb_grpc.add_ParameterControllerServicer_to_server(ParameterServicer(self.graph), self._server)
+        pb_grpc.add_ProgramControllerServicer_to_server(ProgramServicer(self.graph), self._server)
+        pb_grpc.add_TransportControllerServicer_to_server(TransportServicer(self.graph), self._server)
+        pb_grpc.add_TimingControllerServicer_to_server(TimingServicer(), self._server)
+        pb_grpc.add_SystemControllerServicer_to_server(SystemServicer(), self._server)
+        pb_grpc.add_AudioRoutingControllerServicer_to_server(AudioRoutingServicer(), self._server)
+        pb_grpc.add_SessionControllerServicer_to_server(SessionServicer(self.graph), self._server)
+        pb_grpc.add_NotificationControllerServicer_to_server(self.notifications, self._server)
+        self.port = self._server.add_insecure_port(address)
+        self.address = f'{address.rsplit(":", 1)[0]}:{self.port}'
+
+    def start(self) -> None:
+        self._server.start()
+        self._running = True
+        for kind, rate in self._rates.items():
+            if rate > 0:
+                emitter = threading.Thread(target=self._emit_loop, args=(kind, rate), daemon=True)
+                emitter.start()
+                self._emitters.append(emitter)
+
+    def stop(self) -> None:
+        self._running = False
+        self._server.stop(grace=None)
+        for emitter in self._emitters:
+            emitter.join()
+
+    def wait(self) -> None:
+        self._server.wait_for_termination()
+
+    def _emit_loop(self, kind: str, rate: float) -> None:
+        period = 1.0 / rate
+        next_time = time.perf_counter()
+        while self._running:
+            self._emit_one(kind)
+            next_time += period
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.perf_counter()
+
+    def _emit_one(self, kind: str) -> None:
+        graph = self.graph
+        if kind == 'timing':
+            self.notifications.broadcast('timing', pb.CpuTimings(main=pb.Timings(average=random.uniform(0.05, 0.3))))
+            return
+
+        with graph.lock:
+            if not graph.processors:
+                return
+            proc_id = random.choice(list(graph.processors))
+            if kind == 'parameter' and graph.parameters[proc_id]:
+                param_id = random.randrange(len(graph.parameters[proc_id]))
+                graph.set_parameter(proc_id, param_id, random.random())
+            elif kind == 'property' and graph.properties[proc_id]:
+                prop_id = random.randrange(len(graph.properties[proc_id]))
+                value = f'value_{random.randrange(1000)}'
+                graph.property_values[(proc_id, prop_id)] = value
+                self.notifications.broadcast('property', pb.PropertyValue(
+                    property=pb.PropertyIdentifier(processor_id=proc_id, property_id=prop_id), value=value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock Sushi gRPC server with a synthetic audio graph')
+    parser.add_argument('--address', default=SUSHI_ADDRESS)
+    parser.add_argument('--tracks', type=int, default=4)
+    parser.add_argument('--processors', type=int, default=4, help='Processors per track')
+    parser.add_argument('--parameters', type=int, default=16, help='Parameters per processor')
+    parser.add_argument('--properties', type=int, default=1, help='Properties per processor')
+    parser.add_argument('--programs', type=int, default=4, help='Programs per processor')
+    parser.add_argument('--latency', type=float, default=0.0, help='Added latency per call, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency per call, in seconds')
+    parser.add_argument('--parameter-rate', type=float, default=0.0, help='Parameter notifications per second')
+    parser.add_argument('--property-rate', type=float, default=0.0, help='Property notifications per second')
+    parser.add_argument('--timing-rate', type=float, default=0.0, help='Timing notifications per second')
+    args = parser.parse_args()
+
+    server = MockSushiServer(args.address, args.tracks, args.processors, args.parameters, args.properties,
+                             args.programs, args.latency, args.jitter, args.parameter_rate, args.property_rate,
+                             args.timing_rate)
+    server.start()
+    print(f'Mock Sushi listening on {server.address}')
+    try:
+        server.wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
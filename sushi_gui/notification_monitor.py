@@ -0,0 +1,63 @@
+import time
+from collections import deque
+from typing import Dict, Iterable
+
+from .constants import NOTIFICATION_LAG_SAMPLES
+
+# Notifications that cross to the GUI thread as queued Qt signals, one at a time
+SIGNAL_KINDS = ['track', 'processor', 'transport', 'timing']
+# Notifications that are coalesced and applied once per frame
+COALESCED_KINDS = ['parameter', 'property']
+
+
+# Measures how long notifications take from arriving on the gRPC thread until the widgets are
+# updated, and how many are waiting for the GUI thread. Queued signals are delivered in the order
+# they were emitted, so the arrival times of each kind are kept in a FIFO matching Qt's queue.
+class NotificationMonitor:
+    def __init__(self) -> None:
+        self._queued = {kind: deque() for kind in SIGNAL_KINDS}
+        self._lags = {kind: deque(maxlen=NOTIFICATION_LAG_SAMPLES) for kind in SIGNAL_KINDS + COALESCED_KINDS}
+        self._coalesced_depth = {kind: 0 for kind in COALESCED_KINDS}
+        self._max_depth = {kind: 0 for kind in SIGNAL_KINDS + COALESCED_KINDS}
+
+    def queued(self, kind: str) -> None:
+        # Called on the gRPC thread right before the notification's signal is emitted
+        queue = self._queued[kind]
+        queue.append(time.perf_counter())
+        if len(queue) > self._max_depth[kind]:
+            self._max_depth[kind] = len(queue)
+
+    def delivered(self, kind: str) -> None:
+        # Called on the GUI thread once the notification has been applied to the widgets
+        queue = self._queued[kind]
+        if queue:
+            self._lags[kind].append(time.perf_counter() - queue.popleft())
+
+    def coalesced(self, kind: str, arrivals: Iterable[float], depth: int) -> None:
+        # arrivals are the times the applied notifications first arrived, depth how many were pending
+        now = time.perf_counter()
+        self._lags[kind].extend(now - t for t in arrivals)
+        self._coalesced_depth[kind] = depth
+        if depth > self._max_depth[kind]:
+            self._max_depth[kind] = depth
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queued.values()) + sum(self._coalesced_depth.values())
+
+    def lag_percentiles(self) -> Dict[str, float]:
+        # Over the latest NOTIFICATION_LAG_SAMPLES of every kind, in seconds
+        return self._percentiles([lag for lags in self._lags.values() for lag in lags])
+
+    def stats(self) -> Dict[str, dict]:
+        stats = {}
+        for kind, lags in self._lags.items():
+            depth = len(self._queued[kind]) if kind in self._queued else self._coalesced_depth[kind]
+            stats[kind] = dict(self._percentiles(list(lags)), depth=depth, max_depth=self._max_depth[kind])
+        return stats
+
+    @staticmethod
+    def _percentiles(lags: list) -> Dict[str, float]:
+        if not lags:
+            return {'p50': 0.0, 'p99': 0.0}
+        lags.sort()
+        return {'p50': lags[len(lags) // 2], 'p99': lags[min(len(lags) - 1, int(len(lags) * 0.99))]}
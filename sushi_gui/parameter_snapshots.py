@@ -0,0 +1,236 @@
+import time
+from concurrent.futures import Future
+from threading import Condition, Lock, Thread
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .constants import PARAMETER_SNAPSHOT_TOLERANCE, PARAMETER_TABLE_GROWTH, MORPH_RATE, MORPH_RESOLUTION
+
+
+# The latest known value of every parameter that is in a snapshot, one row per parameter in flat
+# arrays, so comparing a snapshot with the current state is a handful of vector operations.
+# Rows are added when a parameter is first captured and kept up to date from notifications.
+class ParameterTable:
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self._rows: Dict[Tuple[int, int], int] = {}
+        self.size = 0
+        self.processors = np.zeros(0, dtype=np.int32)
+        self.parameters = np.zeros(0, dtype=np.int32)
+        self.values = np.zeros(0, dtype=np.float32)
+
+    def rows(self, keys: Iterable[Tuple[int, int]]) -> np.ndarray:
+        # Row of every (processor id, parameter id), adding the ones not seen before. Call with the lock held
+        keys = list(keys)
+        new = [k for k in dict.fromkeys(keys) if k not in self._rows]
+        if self.size + len(new) > len(self.values):
+            self._grow(self.size + len(new))
+        for processor_id, parameter_id in new:
+            self._rows[(processor_id, parameter_id)] = self.size
+            self.processors[self.size] = processor_id
+            self.parameters[self.size] = parameter_id
+            self.size += 1
+        return np.fromiter((self._rows[k] for k in keys), dtype=np.int64, count=len(keys))
+
+    def set(self, processor_id: int, parameter_id: int, value: float) -> None:
+        row = self._rows.get((processor_id, parameter_id))
+        if row is not None:
+            with self.lock:
+                self.values[row] = value
+
+    def _grow(self, size: int) -> None:
+        size = max(size, len(self.values) + PARAMETER_TABLE_GROWTH)
+        for name in ('processors', 'parameters', 'values'):
+            array = getattr(self, name)
+            grown = np.zeros(size, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+
+class Snapshot:
+    def __init__(self, name: str, scope: str, rows: np.ndarray, values: np.ndarray) -> None:
+        self.name = name
+        self.scope = scope
+        self.rows = rows
+        self.values = values
+        self.time = time.time()
+
+
+# Named snapshots of the parameter values of a processor, a track or the whole graph, kept in memory.
+# Recalling one only sends the parameters that differ from their current value, all at once.
+class SnapshotStore:
+    def __init__(self, controller) -> None:
+        self._controller = controller
+        self._table = ParameterTable()
+        self.snapshots: Dict[str, Snapshot] = {}
+        self.morph: Optional[Morph] = None
+
+    def capture(self, name: str, scope: str, processor_ids: Optional[List[int]] = None) -> Future:
+        # processor_ids are processors and/or tracks, None for the whole graph
+        return self._controller.run_command('snapshots', self._capture, name, scope, processor_ids)
+
+    def recall(self, name: str) -> Future:
+        # The future's result is the number of parameters that were sent
+        return self._controller.run_command('snapshots', self._recall, name)
+
+    def delete(self, name: str) -> None:
+        self.snapshots.pop(name, None)
+
+    def start_morph(self, start: str, end: str) -> 'Morph':
+        # Only one morph runs at a time, position it with set_position or run_to
+        self.stop_morph()
+        self.morph = Morph(self._controller, self._table, self.snapshots[start], self.snapshots[end])
+        return self.morph
+
+    def stop_morph(self) -> None:
+        if self.morph is not None:
+            self.morph.stop()
+            self.morph = None
+
+    def apply_parameter_notification(self, notification) -> None:
+        self._table.set(notification.parameter.processor_id, notification.parameter.parameter_id,
+                        notification.normalized_value)
+
+    def _capture(self, name: str, scope: str, processor_ids: Optional[List[int]]) -> None:
+        values = self._controller.get_parameter_values(processor_ids)
+        keys = [(processor_id, p.info.id) for processor_id, parameters in values.items() for p in parameters]
+        snapshot_values = np.fromiter((p.value for parameters in values.values() for p in parameters),
+                                      dtype=np.float32, count=len(keys))
+        table = self._table
+        with table.lock:
+            rows = table.rows(keys)
+            table.values[rows] = snapshot_values
+        self.snapshots[name] = Snapshot(name, scope, rows, snapshot_values)
+
+    def _recall(self, name: str) -> int:
+        snapshot = self.snapshots[name]
+        table = self._table
+        with table.lock:
+            changed = np.abs(table.values[snapshot.rows] - snapshot.values) > PARAMETER_SNAPSHOT_TOLERANCE
+            rows = snapshot.rows[changed]
+            values = snapshot.values[changed]
+            processors = table.processors[rows]
+            parameters = table.parameters[rows]
+
+        self._controller.set_parameter_values(processors.tolist(), parameters.tolist(), values.tolist())
+        # Sushi's notifications will say the same, this keeps a quick A/B/A from resending everything.
+        # Only done once sent, so a recall that failed sends everything again next time
+        with table.lock:
+            table.values[rows] = values
+        return len(values)
+
+
+# Moves the parameters two snapshots have in common from one to the other, by a position from 0 to 1 that
+# is set directly, e.g. by a crossfader, or moved over time. A scheduler thread interpolates all of them
+# at once MORPH_RATE times per second and sends the ones that moved to another of MORPH_RESOLUTION steps.
+# A batch is always done before the next is computed, so a slow Sushi gets fewer updates rather than a backlog.
+class Morph:
+    def __init__(self, controller, table: ParameterTable, start: Snapshot, end: Snapshot) -> None:
+        rows, start_index, end_index = np.intersect1d(start.rows, end.rows, return_indices=True)
+        if len(rows) == 0:
+            raise ValueError(f'{start.name} and {end.name} have no parameters in common')
+        self.start = start.name
+        self.end = end.name
+        self._controller = controller
+        self._table = table
+        self._rows = rows
+        self._start = start.values[start_index].astype(np.float64)
+        self._delta = end.values[end_index] - self._start
+        with table.lock:
+            self._processors = table.processors[rows].copy()
+            self._parameters = table.parameters[rows].copy()
+            self._values = table.values[rows].astype(np.float64)
+        self._sent = np.rint(self._values * MORPH_RESOLUTION).astype(np.int32)
+
+        self._condition = Condition()
+        self._position = 0.0
+        # Timed morphs go from _from to _to between the two times, in time.monotonic()
+        self._from = self._to = 0.0
+        self._started = self._ends = 0.0
+        self._moved = False
+        self._running = True
+        self.updates = 0
+        self.values_sent = 0
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def position(self) -> float:
+        with self._condition:
+            return self._current_position(time.monotonic())
+
+    @property
+    def running_to(self) -> bool:
+        # True while a timed morph is under way
+        with self._condition:
+            return bool(self._ends)
+
+    def set_position(self, position: float) -> None:
+        with self._condition:
+            self._position = min(max(position, 0.0), 1.0)
+            self._ends = 0.0
+            self._moved = True
+            self._condition.notify()
+
+    def run_to(self, position: float, seconds: float) -> None:
+        with self._condition:
+            now = time.monotonic()
+            self._from = self._current_position(now)
+            self._to = min(max(position, 0.0), 1.0)
+            self._started = now
+            self._ends = now + max(seconds, 0.0)
+            self._moved = True
+            self._condition.notify()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+    def _current_position(self, now: float) -> float:
+        if now < self._ends:
+            return self._from + (self._to - self._from) * (now - self._started) / (self._ends - self._started)
+        if self._ends:
+            self._position, self._ends = self._to, 0.0
+        return self._position
+
+    def _run(self) -> None:
+        period = 1.0 / MORPH_RATE
+        next_update = time.monotonic()
+        while True:
+            with self._condition:
+                # Idle until the position is changed, unless a timed morph is running
+                while self._running and not self._moved and not self._ends:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                self._moved = False
+                position = self._current_position(time.monotonic())
+
+            values = self._start + self._delta * position
+            steps = np.rint(values * MORPH_RESOLUTION).astype(np.int32)
+            if position in (0.0, 1.0):
+                # Land exactly on the snapshot, not just on its step
+                changed = np.flatnonzero(np.abs(values - self._values) > PARAMETER_SNAPSHOT_TOLERANCE)
+            else:
+                changed = np.flatnonzero(steps != self._sent)
+            if len(changed):
+                try:
+                    self._controller.set_parameter_values(self._processors[changed].tolist(),
+                                                          self._parameters[changed].tolist(),
+                                                          values[changed].tolist())
+                except Exception as e:
+                    # Nothing is marked as sent, so the next update sends all of them again
+                    print(f'Error morphing: {e}')
+                else:
+                    self._sent[changed] = steps[changed]
+                    self._values[changed] = values[changed]
+                    with self._table.lock:
+                        self._table.values[self._rows[changed]] = values[changed]
+                    self.updates += 1
+                    self.values_sent += len(changed)
+
+            next_update = max(next_update + period, time.monotonic())
+            time.sleep(max(next_update - time.monotonic(), 0.0))
@@ -0,0 +1,154 @@
+from typing import List, Optional
+
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize
+from PySide6.QtGui import QPainter
+from PySide6.QtWidgets import QListView, QStyledItemDelegate, QStyleOptionSlider, QStyleOptionViewItem, QStyle, \
+    QAbstractItemView, QWidget, QFrame
+
+from elkpy import sushi_info_types as sushi
+
+from .graph_model import ParameterSnapshot
+from .constants import PARAMETER_VALUE_WIDTH, SLIDER_MIN_WIDTH, SLIDER_MAX_VALUE, PARAMETER_ROW_HEIGHT, \
+    PARAMETER_LIST_ROWS
+
+# Extra roles for the slider delegate, Qt.DisplayRole is the parameter name
+VALUE_ROLE = Qt.UserRole
+TEXT_ROLE = Qt.UserRole + 1
+AUTOMATABLE_ROLE = Qt.UserRole + 2
+
+
+# Model/view version of a column of ParameterWidgets for processors with many parameters.
+# The view only paints the rows that are visible, so the cost doesn't grow with the parameter count.
+class ParameterListModel(QAbstractListModel):
+    def __init__(self, parameters: List[ParameterSnapshot], processor_id: int, controller: 'SushiController',
+                 parent: Optional[QWidget] = None) -> None:
+        super().__init__(parent)
+        self._controller = controller
+        self._processor_id = processor_id
+        self._infos = [p.info for p in parameters]
+        self._values = [p.value for p in parameters]
+        self._texts = [p.txt_value for p in parameters]
+        self._rows = {p.info.id: row for row, p in enumerate(parameters)}
+
+    def parameter_ids(self) -> List[int]:
+        return [info.id for info in self._infos]
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._infos)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        info = self._infos[row]
+        if role == Qt.DisplayRole:
+            return info.name
+        if role == VALUE_ROLE:
+            return self._values[row]
+        if role == TEXT_ROLE:
+            return self._texts[row] + ' ' + info.unit
+        if role == AUTOMATABLE_ROLE:
+            return info.automatable
+        if role == Qt.ToolTipRole:
+            return info.label
+        return None
+
+    def set_value(self, row: int, value: float) -> None:
+        # Called when the user drags a slider, the label is updated when Sushi notifies back
+        value = min(max(value, 0.0), 1.0)
+        if value == self._values[row]:
+            return
+        self._values[row] = value
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [VALUE_ROLE])
+        self._controller.queue_parameter_value(self._processor_id, self._infos[row].id, value)
+
+    def flush(self) -> None:
+        self._controller.flush_writes()
+
+    def handle_notification(self, notif: sushi.ParameterInfo) -> None:
+        row = self._rows.get(notif.parameter.parameter_id)
+        if row is None:
+            return
+        self._values[row] = notif.normalized_value
+        self._texts[row] = notif.formatted_value
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [VALUE_ROLE, TEXT_ROLE])
+
+
+# Paints a row the same way a ParameterWidget looks: name, slider and value
+class ParameterSliderDelegate(QStyledItemDelegate):
+    def slider_rect(self, rect: QRect) -> QRect:
+        return QRect(rect.left() + PARAMETER_VALUE_WIDTH, rect.top(), SLIDER_MIN_WIDTH, rect.height())
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex) -> None:
+        rect = option.rect
+        widget = option.widget
+        style = widget.style()
+        enabled = index.data(AUTOMATABLE_ROLE)
+
+        painter.save()
+        text_flags = Qt.AlignVCenter | Qt.TextSingleLine
+        name_rect = QRect(rect.left(), rect.top(), PARAMETER_VALUE_WIDTH, rect.height())
+        painter.drawText(name_rect, text_flags | Qt.AlignLeft,
+                         option.fontMetrics.elidedText(index.data(Qt.DisplayRole), Qt.ElideRight, PARAMETER_VALUE_WIDTH))
+        value_rect = QRect(rect.right() - PARAMETER_VALUE_WIDTH, rect.top(), PARAMETER_VALUE_WIDTH, rect.height())
+        painter.drawText(value_rect, text_flags | Qt.AlignRight, index.data(TEXT_ROLE))
+        painter.restore()
+
+        slider = QStyleOptionSlider()
+        slider.initFrom(widget)
+        slider.rect = self.slider_rect(rect)
+        slider.orientation = Qt.Orientation.Horizontal
+        slider.minimum = 0
+        slider.maximum = SLIDER_MAX_VALUE
+        slider.sliderPosition = int(index.data(VALUE_ROLE) * SLIDER_MAX_VALUE)
+        slider.sliderValue = slider.sliderPosition
+        slider.subControls = QStyle.SC_SliderGroove | QStyle.SC_SliderHandle
+        if not enabled:
+            slider.state &= ~QStyle.State_Enabled
+        style.drawComplexControl(QStyle.CC_Slider, slider, painter, widget)
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        return QSize(PARAMETER_VALUE_WIDTH * 2 + SLIDER_MIN_WIDTH, PARAMETER_ROW_HEIGHT)
+
+
+class ParameterListView(QListView):
+    def __init__(self, model: ParameterListModel, parent: QWidget) -> None:
+        super().__init__(parent)
+        self._delegate = ParameterSliderDelegate(self)
+        self._drag_row = None
+        self.setModel(model)
+        self.setItemDelegate(self._delegate)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setFrameShape(QFrame.NoFrame)
+        self.setFixedHeight(min(model.rowCount(), PARAMETER_LIST_ROWS) * PARAMETER_ROW_HEIGHT + 2)
+
+    def mousePressEvent(self, event) -> None:
+        index = self.indexAt(event.position().toPoint())
+        if index.isValid() and index.data(AUTOMATABLE_ROLE):
+            slider = self._delegate.slider_rect(self.visualRect(index))
+            if slider.contains(event.position().toPoint()):
+                self._drag_row = index.row()
+                self._set_from_position(event.position().x(), slider)
+                return
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event) -> None:
+        if self._drag_row is None:
+            return super().mouseMoveEvent(event)
+        slider = self._delegate.slider_rect(self.visualRect(self.model().index(self._drag_row)))
+        self._set_from_position(event.position().x(), slider)
+
+    def mouseReleaseEvent(self, event) -> None:
+        if self._drag_row is None:
+            return super().mouseReleaseEvent(event)
+        self._drag_row = None
+        self.model().flush()
+
+    def _set_from_position(self, x: float, slider: QRect) -> None:
+        self.model().set_value(self._drag_row, (x - slider.left()) / max(slider.width(), 1))
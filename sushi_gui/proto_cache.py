@@ -0,0 +1,98 @@
+import hashlib
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+from threading import Lock
+from types import ModuleType
+from typing import Tuple
+
+import grpc_tools.protoc as gprotoc
+from elkpy import grpc_gen
+
+from .constants import PROTO_CACHE_DIR
+
+_lock = Lock()
+_modules = {}
+
+
+# Same as elkpy's grpc_gen.modules_from_proto, but the generated modules are kept in a cache
+# directory named after a hash of the proto file, so protoc only runs when the proto changes
+def modules_from_proto(proto_filename: str) -> Tuple[ModuleType, ModuleType]:
+    full_path = os.path.abspath(proto_filename)
+    with open(full_path, 'rb') as f:
+        proto_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+
+    with _lock:
+        if proto_hash in _modules:
+            return _modules[proto_hash]
+
+        inc_path, rel_proto_filename = os.path.split(full_path)
+        proto_base_name = os.path.splitext(rel_proto_filename)[0]
+        proto_module_name = f'{proto_base_name}_pb2'
+        grpc_module_name = f'{proto_base_name}_pb2_grpc'
+
+        out_dir = os.path.join(PROTO_CACHE_DIR, proto_hash)
+        if not os.path.exists(os.path.join(out_dir, f'{grpc_module_name}.py')):
+            _generate(inc_path, rel_proto_filename, out_dir)
+
+        # Imported from their files under names with the hash in them, so protos that differ never share
+        # modules. The generated grpc module imports the protobuf module by its plain name, which is
+        # pointed at this proto's module while it's imported
+        try:
+            proto_module = _import(f'{proto_module_name}_{proto_hash}',
+                                   os.path.join(out_dir, f'{proto_module_name}.py'))
+        except TypeError as e:
+            # protobuf keeps one file per name for the whole process
+            raise RuntimeError(f'A different {rel_proto_filename} is already loaded, restart to use {full_path}') \
+                from e
+        plain_module = sys.modules.get(proto_module_name)
+        sys.modules[proto_module_name] = proto_module
+        try:
+            grpc_module = _import(f'{grpc_module_name}_{proto_hash}', os.path.join(out_dir, f'{grpc_module_name}.py'))
+        finally:
+            if plain_module is None:
+                del sys.modules[proto_module_name]
+            else:
+                sys.modules[proto_module_name] = plain_module
+        _modules[proto_hash] = proto_module, grpc_module
+        return proto_module, grpc_module
+
+
+def _import(name: str, path: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+def _generate(inc_path: str, rel_proto_filename: str, out_dir: str) -> None:
+    os.makedirs(PROTO_CACHE_DIR, exist_ok=True)
+    # Generate next to the final location and rename, so a half written cache is never used
+    tmp_dir = tempfile.mkdtemp(dir=PROTO_CACHE_DIR)
+    try:
+        result = gprotoc.main(['protoc',
+                               f'-I{inc_path}',
+                               f'--python_out={tmp_dir}',
+                               f'--grpc_python_out={tmp_dir}',
+                               rel_proto_filename])
+        if result != 0:
+            raise RuntimeError(f'protoc failed to compile {rel_proto_filename}')
+        try:
+            os.rename(tmp_dir, out_dir)
+        except OSError:
+            # Another instance got there first
+            pass
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def install() -> None:
+    # elkpy's sub-controllers each compile the proto when created, point them to the cache instead
+    grpc_gen.modules_from_proto = modules_from_proto
@@ -0,0 +1,85 @@
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+from threading import Lock
+from typing import List, Optional
+
+from .constants import RPC_HISTOGRAM_BOUNDS, RPC_RECENT_CALLS
+
+
+class MethodStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        # One count per bound in RPC_HISTOGRAM_BOUNDS, plus one for calls slower than the last bound
+        self.histogram = [0] * (len(RPC_HISTOGRAM_BOUNDS) + 1)
+
+    def percentile(self, fraction: float) -> float:
+        # Upper bound of the histogram bucket the percentile falls in, the max for the last bucket
+        target = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return RPC_HISTOGRAM_BOUNDS[bucket] if bucket < len(RPC_HISTOGRAM_BOUNDS) else self.max
+        return 0.0
+
+    def to_dict(self) -> dict:
+        return {'calls': self.calls,
+                'errors': self.errors,
+                'mean': self.total / self.calls if self.calls else 0.0,
+                'p50': self.percentile(0.5),
+                'p99': self.percentile(0.99),
+                'max': self.max,
+                'histogram': dict(zip([str(b) for b in RPC_HISTOGRAM_BOUNDS] + ['inf'], self.histogram))}
+
+
+# Call counts and latency histograms for every gRPC method the controller calls, keyed by
+# sub-controller and method, e.g. 'parameters.GetParameterValue', and the most recent calls so
+# the slowest of them can be listed. Recording is off by default, and costs one check when off.
+class RpcStats:
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._lock = Lock()
+        self._methods = {}
+        self._recent = deque(maxlen=RPC_RECENT_CALLS)
+
+    def set_enabled(self, enabled: bool) -> None:
+        self.enabled = enabled
+
+    def record(self, method: str, started: float, duration: float, error: Optional[Exception] = None) -> None:
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = MethodStats()
+            stats.calls += 1
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+            stats.histogram[bisect_left(RPC_HISTOGRAM_BOUNDS, duration)] += 1
+            if error is not None:
+                stats.errors += 1
+            self._recent.append((duration, method, started, None if error is None else str(error)))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._methods.clear()
+            self._recent.clear()
+
+    def methods(self) -> dict:
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in sorted(self._methods.items())}
+
+    def slowest(self, count: int) -> List[dict]:
+        # The slowest of the last RPC_RECENT_CALLS calls, started is wall clock time
+        with self._lock:
+            recent = sorted(self._recent, key=lambda c: c[0], reverse=True)[:count]
+        return [{'method': method, 'started': started, 'duration': duration, 'error': error}
+                for duration, method, started, error in recent]
+
+    def export(self, filename: str) -> None:
+        with open(filename, 'w') as f:
+            json.dump({'time': time.time(), 'methods': self.methods(), 'slowest': self.slowest(RPC_RECENT_CALLS)},
+                      f, indent=2)
@@ -0,0 +1,157 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Callable, Optional, Tuple
+
+from .constants import SESSION_CHUNK_SIZE, SESSION_COMPRESSION_LEVEL, SESSION_AUTOSAVE_KEEP, SESSION_STORE_DIR
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+# Sessions are written next to a .sha256 file holding the checksum of the session itself, i.e.
+# before compression. Files are written to a temporary name and then renamed, so an interrupted
+# save never leaves a half written session or checksum behind.
+def write_session(filename: str, data: bytes, compress: bool = False,
+                  progress: Optional[Callable[[float], None]] = None) -> bool:
+    # Returns False if the file already holds this session and wasn't written again
+    digest = hashlib.sha256(data).hexdigest()
+    if _read_checksum(filename) == digest and _is_compressed(filename) == compress:
+        return False
+
+    tmp_path = filename + '.tmp'
+    with open(tmp_path, 'wb') as raw:
+        f = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=SESSION_COMPRESSION_LEVEL, mtime=0) if compress \
+            else raw
+        view = memoryview(data)
+        for start in range(0, len(data), SESSION_CHUNK_SIZE):
+            f.write(view[start:start + SESSION_CHUNK_SIZE])
+            if progress:
+                progress(min(start + SESSION_CHUNK_SIZE, len(data)) / len(data))
+        if compress:
+            f.close()
+    # The old checksum goes first, a session without one is read unchecked, but never taken as damaged
+    if os.path.exists(filename + '.sha256'):
+        os.remove(filename + '.sha256')
+    os.replace(tmp_path, filename)
+    _write_checksum(filename, digest)
+    return True
+
+
+def read_session(filename: str, progress: Optional[Callable[[float], None]] = None) -> bytes:
+    # Compressed files are recognised by their contents, and the checksum is verified if there is one
+    size = max(os.path.getsize(filename), 1)
+    data = bytearray()
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as raw:
+        f = gzip.GzipFile(fileobj=raw, mode='rb') if _is_compressed(filename) else raw
+        while True:
+            chunk = f.read(SESSION_CHUNK_SIZE)
+            if not chunk:
+                break
+            data += chunk
+            digest.update(chunk)
+            if progress:
+                progress(min(raw.tell() / size, 1.0))
+
+    checksum = _read_checksum(filename)
+    if checksum is not None and checksum != digest.hexdigest():
+        raise ValueError(f'{os.path.basename(filename)} is damaged, its checksum does not match')
+    return bytes(data)
+
+
+def values_path(filename: str) -> str:
+    # Every parameter, property, program and bypass value of a session is saved next to it in this file
+    return filename + '.values.json.gz'
+
+
+def store_session(address: str, data: bytes) -> Tuple[str, bool]:
+    # Adds a session to the autosaves of an address. A session that is already stored, e.g. because
+    # nothing changed since the last autosave, is not written again. Returns the hash and whether it was written
+    os.makedirs(SESSION_STORE_DIR, exist_ok=True)
+    digest = hashlib.sha256(data).hexdigest()
+    path = _object_path(digest)
+    written = not os.path.exists(path)
+    if written:
+        write_session(path, data, compress=True)
+
+    index = _read_index(address)
+    if not index or index[-1]['digest'] != digest:
+        index.append({'time': time.time(), 'digest': digest})
+        dropped = index[:-SESSION_AUTOSAVE_KEEP]
+        index = index[-SESSION_AUTOSAVE_KEEP:]
+        _write_index(address, index)
+        _remove_unused(d['digest'] for d in dropped)
+    return digest, written
+
+
+def latest_session(address: str) -> Optional[str]:
+    # Filename of the last session autosaved for the address
+    index = _read_index(address)
+    if not index:
+        return None
+    path = _object_path(index[-1]['digest'])
+    return path if os.path.exists(path) else None
+
+
+def _is_compressed(filename: str) -> Optional[bool]:
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(2) == GZIP_MAGIC
+    except OSError:
+        return None
+
+
+def _read_checksum(filename: str) -> Optional[str]:
+    try:
+        with open(filename + '.sha256') as f:
+            return f.read().split()[0]
+    except (OSError, IndexError):
+        return None
+
+
+def _write_checksum(filename: str, digest: str) -> None:
+    tmp_path = filename + '.sha256.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(digest + '\n')
+    os.replace(tmp_path, filename + '.sha256')
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(SESSION_STORE_DIR, digest + '.sushi.gz')
+
+
+def _index_path(address: str) -> str:
+    return os.path.join(SESSION_STORE_DIR, re.sub(r'[^A-Za-z0-9_.-]', '_', address) + '.json')
+
+
+def _read_index(address: str) -> list:
+    try:
+        with open(_index_path(address)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _write_index(address: str, index: list) -> None:
+    path = _index_path(address)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(path + '.tmp', path)
+
+
+def _remove_unused(digests) -> None:
+    # Sessions are shared between addresses with identical sessions, so only unreferenced ones are removed
+    digests = set(digests)
+    if not digests:
+        return
+    for name in os.listdir(SESSION_STORE_DIR):
+        if name.endswith('.json'):
+            with open(os.path.join(SESSION_STORE_DIR, name)) as f:
+                digests -= {d['digest'] for d in json.load(f)}
+    for digest in digests:
+        for path in (_object_path(digest), _object_path(digest) + '.sha256'):
+            if os.path.exists(path):
+                os.remove(path)
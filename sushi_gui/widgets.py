@@ -1,12 +1,18 @@
+from typing import List
+
 from PySide6.QtCore import Qt
 from PySide6.QtWidgets import QGroupBox, QHBoxLayout, QLabel, QComboBox, QDoubleSpinBox, QStyle, QPushButton, \
-    QVBoxLayout, QScrollArea, QAbstractScrollArea, QSizePolicy, QSlider, QWidget, QLineEdit, QFileDialog, QFrame
+    QVBoxLayout, QScrollArea, QAbstractScrollArea, QSizePolicy, QSlider, QWidget, QLineEdit, QFileDialog, QFrame, \
+    QToolButton
 
 from elkpy.sushicontroller import SushiController
 from elkpy import sushi_info_types as sushi
 
+from .parameter_view import ParameterListModel, ParameterListView
+from .graph_model import TrackSnapshot, ProcessorSnapshot, ParameterSnapshot, PropertySnapshot
 from .constants import SYNCMODES, Direction, PROCESSOR_WIDTH, MAX_COLUMNS, ICON_BUTTON_WIDTH, PARAMETER_VALUE_WIDTH, \
-    SLIDER_MIN_WIDTH, SLIDER_MAX_VALUE, PAN_SLIDER_WIDTH
+    SLIDER_MIN_WIDTH, SLIDER_MAX_VALUE, PAN_SLIDER_WIDTH, PARAMETER_LIST_THRESHOLD, PROCESSORS_START_COLLAPSED, \
+    FREE_COLLAPSED_PROCESSORS, TRACK_WIDTH
 
 
 class TransportBarWidget(QGroupBox):
@@ -69,7 +75,8 @@ class TransportBarWidget(QGroupBox):
         self._play_button.clicked.connect(self._controller.set_playing)
         self._stop_button.clicked.connect(self._controller.set_stopped)
         self._syncmode.currentTextChanged.connect(self._controller.set_sync_mode_txt)
-        self._tempo.valueChanged.connect(self._controller.transport.set_tempo)
+        self._tempo.valueChanged.connect(self._controller.queue_tempo)
+        self._tempo.editingFinished.connect(self._controller.flush_writes)
         self._add_track_button.clicked.connect(self._controller.add_track)
 
     def set_playing(self, playing: bool) -> None:
@@ -77,7 +84,10 @@ class TransportBarWidget(QGroupBox):
         self._stop_button.setChecked(not playing)
 
     def set_tempo(self, tempo: float) -> None:
+        # Tempo changes from Sushi aren't sent back to it
+        self._tempo.blockSignals(True)
         self._tempo.setValue(tempo)
+        self._tempo.blockSignals(False)
 
     def set_cpu_value(self, value: float) -> None:
         self._cpu_meter.setText(f"Cpu: {value * 100:.1f}%")
@@ -91,26 +101,43 @@ class TransportBarWidget(QGroupBox):
         self._parent.setup_sushi_controller()
 
 
-class TrackWidget(QGroupBox):
-    def __init__(self, controller: 'SushiController', track_info: sushi.TrackInfo, parent: QWidget) -> None:
+class TrackPlaceholderWidget(QGroupBox):
+    # Stands in for a track while it's being fetched, or while it's scrolled out of view
+    def __init__(self, track_info: sushi.TrackInfo, parent: QWidget) -> None:
         super().__init__(track_info.name, parent)
-        self._id = track_info.id
+        self._layout = QVBoxLayout(self)
+        self.setLayout(self._layout)
+        self.setFixedWidth(TRACK_WIDTH)
+        self._label = QLabel('Loading...', self)
+        self._layout.addWidget(self._label, 0, Qt.AlignHCenter)
+        self._layout.addStretch()
+
+    def set_loaded(self) -> None:
+        self._label.hide()
+
+
+class TrackWidget(QGroupBox):
+    def __init__(self, controller: 'SushiController', track_snapshot: TrackSnapshot, parent: QWidget) -> None:
+        super().__init__(track_snapshot.info.name, parent)
+        self.setMinimumWidth(TRACK_WIDTH)
+        self._id = track_snapshot.info.id
         self._parent = parent
         self._controller = controller
         self._layout = QVBoxLayout(self)
         self.setLayout(self._layout)
         self.processors = {}
-        self._create_processors(track_info)
-        self._create_common_controls(track_info)
+        self._create_processors(track_snapshot)
+        self._create_common_controls(track_snapshot)
         self._connect_signals()
 
-    def create_processor(self, proc_info: sushi.ProcessorInfo) -> None:
-        if proc_info.id not in self.processors:
-            processor = ProcessorWidget(self._controller, proc_info, self._id, self)
-            self._proc_layout.insertWidget(self._proc_layout.count() - 1, processor)
-            self.processors[proc_info.id] = processor
+    def add_processor(self, processor_snapshot: ProcessorSnapshot, index: int) -> None:
+        if processor_snapshot.info.id not in self.processors:
+            processor = ProcessorWidget(self._controller, processor_snapshot, self._id, self)
+            # Never insert past the stretch element at the end
+            self._proc_layout.insertWidget(min(index, self._proc_layout.count() - 1), processor)
+            self.processors[processor_snapshot.info.id] = processor
 
-    def _create_processors(self, track_info: sushi.TrackInfo) -> None:
+    def _create_processors(self, track_snapshot: TrackSnapshot) -> None:
         scroll = QScrollArea()
         scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
@@ -126,29 +153,29 @@ class TrackWidget(QGroupBox):
         scroll.setWidget(frame)
         self._layout.addWidget(scroll)
 
-        processors = self._controller.audio_graph.get_track_processors(track_info.id)
-        for p in processors:
-            processor = ProcessorWidget(self._controller, p, track_info.id, self)
+        for p in track_snapshot.processors:
+            processor = ProcessorWidget(self._controller, p, self._id, self)
             self._proc_layout.addWidget(processor, 0)
-            self.processors[p.id] = processor
+            self.processors[p.info.id] = processor
 
         self._proc_layout.addStretch()
 
-    def _create_common_controls(self, track_info: sushi.TrackInfo) -> None:
+    def _create_common_controls(self, track_snapshot: TrackSnapshot) -> None:
         pan_gain_layout = QHBoxLayout(self)
         pan_gain_layout.setContentsMargins(0,0,0,0)
         pan_gain_box = QGroupBox('Master', self)
         pan_gain_box.setMaximumHeight(220)
         pan_gain_box.setLayout(pan_gain_layout)
         self._layout.addWidget(pan_gain_box)
-        self._pan_gain = [PanGainWidget(self._id, 'Main Bus', 0, 1, self._controller, self)]
+        self._pan_gain = [PanGainWidget(self._id, 'Main Bus', track_snapshot.parameter('gain'),
+                                        track_snapshot.parameter('pan'), self._controller, self)]
         pan_gain_layout.addWidget(self._pan_gain[0], 0, Qt.AlignLeft)
 
         # Create 1 pan/gain control per extra output bus
-        for bus in range(1, track_info.buses):
-            gain_id = self._controller.parameters.get_parameter_id(track_info.id, 'gain_sub_' + str(bus))
-            pan_id = self._controller.parameters.get_parameter_id(track_info.id, 'pan_sub_' + str(bus))
-            pan_gain = PanGainWidget(self._id, 'Sub Bus ' + str(bus), gain_id, pan_id, self._controller, self)
+        for bus in range(1, track_snapshot.info.buses):
+            gain = track_snapshot.parameter('gain_sub_' + str(bus))
+            pan = track_snapshot.parameter('pan_sub_' + str(bus))
+            pan_gain = PanGainWidget(self._id, 'Sub Bus ' + str(bus), gain, pan, self._controller, self)
             pan_gain_layout.addWidget(pan_gain)
             self._pan_gain.append(pan_gain)
 
@@ -158,8 +185,12 @@ class TrackWidget(QGroupBox):
         self._mute_button = QPushButton('Mute', self)
         self._track_buttons.addWidget(self._mute_button)
         self._mute_button.setCheckable(True)
-        self._mute_id = self._controller.parameters.get_parameter_id(track_info.id, 'mute')
-        self._mute_button.setChecked(self._controller.parameters.get_parameter_value(self._id, self._mute_id) == 1)
+        mute = track_snapshot.parameter('mute')
+        self._mute_id = mute.info.id if mute is not None else None
+        if mute is not None:
+            self._mute_button.setChecked(mute.value == 1)
+        else:
+            self._mute_button.setEnabled(False)
 
         self._delete_button = QPushButton('Delete', self)
         self._track_buttons.addWidget(self._delete_button)
@@ -172,32 +203,43 @@ class TrackWidget(QGroupBox):
         self._delete_button.clicked.connect(self.delete_track)
         self._add_plugin_button.clicked.connect(self.add_plugin)
 
-    def handle_parameter_notification(self, notif: sushi.ParameterInfo) -> None:
+    # Map of (processor id, parameter id) to the function that should handle its notifications,
+    # for this track and all its processors
+    def parameter_routes(self) -> dict:
+        routes = {(self._id, self._mute_id): self.handle_mute_notification}
         for pan_gain in self._pan_gain:
-            if notif.parameter.parameter_id == pan_gain.pan_id:
-                pan_gain.set_pan_slider(notif.normalized_value)
-                pan_gain.set_pan_label(notif.formatted_value)
-
-            elif notif.parameter.parameter_id == pan_gain.gain_id:
-                pan_gain.set_gain_slider(notif.normalized_value)
-                pan_gain.set_gain_label(notif.formatted_value)
-
-        if notif.parameter.parameter_id == self._mute_id:
-            self._mute_button.blockSignals(True)
-            self._mute_button.setChecked(True if notif.normalized_value > 0.5 else False)
-            self._mute_button.blockSignals(False)
+            routes[(self._id, pan_gain.pan_id)] = pan_gain.handle_pan_notification
+            routes[(self._id, pan_gain.gain_id)] = pan_gain.handle_gain_notification
+        # Controls the track doesn't have parameters for
+        routes = {key: route for key, route in routes.items() if key[1] is not None}
+        for p in self.processors.values():
+            routes.update(p.parameter_routes())
+        return routes
+
+    def property_routes(self) -> dict:
+        routes = {}
+        for p in self.processors.values():
+            routes.update(p.property_routes())
+        return routes
+
+    def handle_mute_notification(self, notif: sushi.ParameterInfo) -> None:
+        self._mute_button.blockSignals(True)
+        self._mute_button.setChecked(True if notif.normalized_value > 0.5 else False)
+        self._mute_button.blockSignals(False)
 
     def mute_track(self, arg) -> None:
         state = self._mute_button.isChecked()
-        muted = self._controller.parameters.set_parameter_value(self._id, self._mute_id, 1 if state == True else 0)
+        self._controller.set_parameter_value(self._id, self._mute_id, 1 if state == True else 0)
 
     def delete_track(self, arg) -> None:
-        self._controller.audio_graph.delete_track(self._id)
+        self._controller.delete_track(self._id)
 
     def add_plugin(self, arg):
         self._controller.add_plugin(self._id)
 
     def delete_processor(self, processor_id: int) -> None:
+        if processor_id not in self.processors:
+            return
         p = self.processors.pop(processor_id)
         p.deleteLater() # Otherwise traces are left hanging
         self._proc_layout.removeWidget(p)
@@ -218,60 +260,130 @@ class TrackWidget(QGroupBox):
 
 
 class ProcessorWidget(QGroupBox):
-    def __init__(self, controller: SushiController, processor_info: sushi.ProcessorInfo, track_id: int, parent: QWidget) -> None:
-        super().__init__(processor_info.name, parent)
+    def __init__(self, controller: SushiController, processor_snapshot: ProcessorSnapshot, track_id: int, parent: QWidget) -> None:
+        super().__init__(processor_snapshot.info.name, parent)
         self.setFixedWidth(PROCESSOR_WIDTH * MAX_COLUMNS)
         # Make sure the ProcessorWidget doesn't expand to much, as that looks ugly
         self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Maximum)
         self._controller = controller
-        self._id = processor_info.id
+        self._id = processor_snapshot.info.id
         self._track_id = track_id
         self._parameters = {}
+        self._parameter_list = None
         self._properties = {}
+        # Parameter and property widgets live in _body, which is only built when the processor is expanded
+        self._body = None
+        self._expanded = False
+        self._loading = False
+        self._loaded = None
+        self._parameter_ids = []
+        self._property_ids = []
         self._layout = QVBoxLayout(self)
         self.setLayout(self._layout)
 
-        self._create_common_controls(processor_info)
-        self._create_parameters()
-        self._create_properties()
+        self._create_common_controls(processor_snapshot)
         self._connect_signals()
+        if processor_snapshot.parameters is not None:
+            self.set_parameters(processor_snapshot.parameters, processor_snapshot.properties)
+        if not PROCESSORS_START_COLLAPSED:
+            self.expand()
+
+    def set_parameters(self, parameters: List[ParameterSnapshot], properties: List[PropertySnapshot]) -> None:
+        self._loading = False
+        self._loaded = (parameters, properties)
+        self._parameter_ids = [p.info.id for p in parameters]
+        self._property_ids = [p.info.id for p in properties]
+        if self._expanded and self._body is None:
+            self._create_body()
+
+    def expand(self) -> None:
+        self._expanded = True
+        self._expand_button.setArrowType(Qt.DownArrow)
+        if self._body is not None:
+            self._body.show()
+        elif self._loaded is not None:
+            self._create_body()
+        elif not self._loading:
+            self._loading = True
+            self._controller.load_processor_parameters(self._id)
+
+    def collapse(self) -> None:
+        self._expanded = False
+        self._expand_button.setArrowType(Qt.RightArrow)
+        if self._body is None:
+            return
+        if FREE_COLLAPSED_PROCESSORS:
+            self._body.deleteLater()
+            self._body = None
+            self._parameters = {}
+            self._parameter_list = None
+            self._properties = {}
+            self._loaded = None
+            self._controller.unload_processor_parameters(self._id)
+        else:
+            self._body.hide()
 
-    def _create_parameters(self) -> None:
-        parameters = self._controller.parameters.get_processor_parameters(self._id)
+    def expand_clicked(self) -> None:
+        if self._expanded:
+            self.collapse()
+        else:
+            self.expand()
+
+    def _create_body(self) -> None:
+        self._body = QWidget(self)
+        body_layout = QVBoxLayout(self._body)
+        body_layout.setContentsMargins(0, 0, 0, 0)
+        self._layout.addWidget(self._body)
+        parameters, properties = self._loaded
+        self._create_parameters(parameters, body_layout)
+        self._create_properties(properties, body_layout)
+
+    def _create_parameters(self, parameters: List[ParameterSnapshot], layout: QVBoxLayout) -> None:
         param_count = len(parameters)
+        if param_count > PARAMETER_LIST_THRESHOLD:
+            self._parameter_list = ParameterListModel(parameters, self._id, self._controller, self._body)
+            layout.addWidget(ParameterListView(self._parameter_list, self._body))
+            layout.addStretch()
+            return
+
         param_layout = QHBoxLayout()
-        self._layout.addLayout(param_layout)
+        layout.addLayout(param_layout)
         for col in range(0, MAX_COLUMNS):
             col_layout = QVBoxLayout()
             param_layout.addLayout(col_layout)
             for p in parameters[col::MAX_COLUMNS]:
-                parameter = ParameterWidget(p, self._id, self._controller, self)
+                parameter = ParameterWidget(p, self._id, self._controller, self._body)
                 col_layout.addWidget(parameter)
-                self._parameters[p.id] = parameter
+                self._parameters[p.info.id] = parameter
 
             col_layout.addStretch()
-        self._layout.addStretch()
+        layout.addStretch()
 
-    def _create_properties(self) -> None:
-        properties = self._controller.parameters.get_processor_properties(self._id)
+    def _create_properties(self, properties: List[PropertySnapshot], layout: QVBoxLayout) -> None:
         prop_count = len(properties)
         prop_layout = QVBoxLayout()
-        self._layout.addLayout(prop_layout)
+        layout.addLayout(prop_layout)
 
         for p in properties:
-            property = PropertyWidget(p, self._id, self._controller, self)
+            property = PropertyWidget(p, self._id, self._controller, self._body)
             prop_layout.addWidget(property)
-            self._properties[p.id] = property
+            self._properties[p.info.id] = property
 
-        self._layout.addStretch()
+        layout.addStretch()
 
-    def _create_common_controls(self, processor_info: sushi.ProcessorInfo) -> None:
+    def _create_common_controls(self, processor_snapshot: ProcessorSnapshot) -> None:
         common_layout = QHBoxLayout(self)
         self._layout.addLayout(common_layout)
 
+        self._expand_button = QToolButton(self)
+        self._expand_button.setArrowType(Qt.RightArrow)
+        self._expand_button.setAutoRaise(True)
+        self._expand_button.setToolTip('Show/hide parameters')
+        common_layout.addWidget(self._expand_button)
+
         self._mute_button = QPushButton(self)
         self._mute_button.setCheckable(True)
-        self._mute_button.setChecked(self._controller.audio_graph.get_processor_bypass_state(self._id))
+        self._mute_button.setChecked(processor_snapshot.bypassed)
         self._mute_button.setIcon(self.style().standardIcon(getattr(QStyle, 'SP_MediaVolumeMuted')))
         self._mute_button.setFixedWidth(ICON_BUTTON_WIDTH)
         self._mute_button.setToolTip('Mute processor')
@@ -298,28 +410,46 @@ class ProcessorWidget(QGroupBox):
 
         self._program_selector = QComboBox(self)
         common_layout.addWidget(self._program_selector)
-        if processor_info.program_count > 0:
-            for program in self._controller.programs.get_processor_programs(self._id):
+        if processor_snapshot.info.program_count > 0:
+            for program in processor_snapshot.programs:
                 self._program_selector.addItem(program.name)
-            current_program =self._controller.programs.get_processor_current_program(self._id)
-            self._program_selector.setCurrentIndex(current_program)
+            self._program_selector.setCurrentIndex(processor_snapshot.current_program)
             
         else:
             self._program_selector.addItem('No programs')
     
     def _connect_signals(self) -> None:
+        self._expand_button.clicked.connect(self.expand_clicked)
         self._mute_button.clicked.connect(self.mute_processor_clicked)
         self._program_selector.currentIndexChanged.connect(self.program_selector_changed)
         self._delete_button.clicked.connect(self.delete_processor_clicked)
         # self._up_button.clicked.connect(self.up_clicked)
         # self._down_button.clicked.connect(self.down_clicked)
 
+    def set_state(self, bypassed: bool, program: int) -> None:
+        # Shows a bypass state and program set from elsewhere, without sending them back to Sushi
+        self._mute_button.setChecked(bypassed)
+        if self._program_selector.count() > program:
+            self._program_selector.blockSignals(True)
+            self._program_selector.setCurrentIndex(program)
+            self._program_selector.blockSignals(False)
+
+    def parameter_routes(self) -> dict:
+        # Routed through the processor, since the parameter widgets come and go with expansion
+        return {(self._id, id): self.handle_parameter_notification for id in self._parameter_ids}
+
+    def property_routes(self) -> dict:
+        return {(self._id, id): self.handle_property_notification for id in self._property_ids}
+
     def handle_parameter_notification(self, notif: sushi.ParameterInfo) -> None:
-        self._parameters[notif.parameter.parameter_id].set_slider_value(notif.normalized_value)
-        self._parameters[notif.parameter.parameter_id].set_label_value(notif.formatted_value)
+        if self._parameter_list is not None:
+            self._parameter_list.handle_notification(notif)
+        elif notif.parameter.parameter_id in self._parameters:
+            self._parameters[notif.parameter.parameter_id].handle_notification(notif)
 
     def handle_property_notification(self, notif: sushi.PropertyInfo) -> None:
-        self._properties[notif.property.property_id].set_value(notif.value)
+        if notif.property.property_id in self._properties:
+            self._properties[notif.property.property_id].handle_notification(notif)
 
     def delete_processor_clicked(self) -> None:
         self._controller.delete_processor(self._track_id, self._id)
@@ -332,15 +462,16 @@ class ProcessorWidget(QGroupBox):
 
     def mute_processor_clicked(self, arg) -> None:
         state = self._mute_button.isChecked()
-        self._controller.audio_graph.set_processor_bypass_state(self._id, state)        
+        self._controller.set_processor_bypass(self._id, state)
 
     def program_selector_changed(self, program_id: int) -> None:
-        self._controller.programs.set_processor_program(self._id, program_id)
+        self._controller.set_processor_program(self._id, program_id)
 
 
 class ParameterWidget(QWidget):
-    def __init__(self, parameter_info: sushi.ParameterInfo, processor_id: int, controller: SushiController, parent: QWidget) -> None:
+    def __init__(self, parameter_snapshot: ParameterSnapshot, processor_id: int, controller: SushiController, parent: QWidget) -> None:
         super().__init__(parent)
+        parameter_info = parameter_snapshot.info
         self._controller = controller
         self._id = parameter_info.id
         self._processor_id = processor_id
@@ -363,10 +494,8 @@ class ParameterWidget(QWidget):
         self._layout.addWidget(self._value_label)
         self._layout.setContentsMargins(0, 0, 0, 0)
 
-        value = self._controller.parameters.get_parameter_value(self._processor_id, self._id)
-        self.set_slider_value(value)
-        txt_value = self._controller.parameters.get_parameter_value_as_string(self._processor_id, self._id)
-        self.set_label_value(txt_value)
+        self.set_slider_value(parameter_snapshot.value)
+        self.set_label_value(parameter_snapshot.txt_value)
 
         if parameter_info.automatable:
             self._connect_signals()
@@ -376,10 +505,15 @@ class ParameterWidget(QWidget):
 
     def _connect_signals(self) -> None:
         self._value_slider.valueChanged.connect(self.value_changed)
+        self._value_slider.sliderReleased.connect(self._controller.flush_writes)
 
     def value_changed(self) -> None:
         value = float(self._value_slider.value()) / SLIDER_MAX_VALUE
-        self._controller.parameters.set_parameter_value(self._processor_id, self._id, value)
+        self._controller.queue_parameter_value(self._processor_id, self._id, value)
+
+    def handle_notification(self, notif: sushi.ParameterInfo) -> None:
+        self.set_slider_value(notif.normalized_value)
+        self.set_label_value(notif.formatted_value)
 
     def set_slider_value(self, value: float) -> None:
         ## Set value without triggering a signal
@@ -392,8 +526,9 @@ class ParameterWidget(QWidget):
 
 
 class PropertyWidget(QWidget):
-    def __init__(self, property_info: sushi.PropertyInfo, processor_id: int, controller: 'SushiController' , parent: QWidget) -> None:
+    def __init__(self, property_snapshot: PropertySnapshot, processor_id: int, controller: 'SushiController' , parent: QWidget) -> None:
         super().__init__(parent)
+        property_info = property_snapshot.info
         self._controller = controller
         self._id = property_info.id
         self._processor_id = processor_id
@@ -415,8 +550,7 @@ class PropertyWidget(QWidget):
 
         self._layout.setContentsMargins(0,0,0,0)
 
-        value = self._controller.parameters.get_property_value(self._processor_id, self._id)
-        self._edit_box.setText(value)
+        self._edit_box.setText(property_snapshot.value)
         self._connect_signals()
 
     def _connect_signals(self) -> None:
@@ -424,7 +558,10 @@ class PropertyWidget(QWidget):
 
     def value_changed(self) -> None:
         value = self._edit_box.text()
-        self._controller.parameters.set_property_value(self._processor_id, self._id, value)
+        self._controller.set_property_value(self._processor_id, self._id, value)
+
+    def handle_notification(self, notif: sushi.PropertyInfo) -> None:
+        self.set_value(notif.value)
 
     def set_value(self, value: str) -> None:
         self._edit_box.blockSignals(True)
@@ -436,15 +573,16 @@ class PropertyWidget(QWidget):
         if dialog.exec_():
             filename = dialog.selectedFiles()[0]
             self._edit_box.setText(filename)
-            self._controller.parameters.set_property_value(self._processor_id, self._id, filename)
+            self._controller.set_property_value(self._processor_id, self._id, filename)
 
 
 class PanGainWidget(QWidget):
-    def __init__(self, processor_id: int, name: str, gain_id: int, pan_id: int, controller: 'SushiController', parent: QWidget) -> None:
+    def __init__(self, processor_id: int, name: str, gain: ParameterSnapshot, pan: ParameterSnapshot, controller: 'SushiController', parent: QWidget) -> None:
         super().__init__(parent)
         self._processor_id = processor_id
-        self.gain_id = gain_id
-        self.pan_id = pan_id
+        # Tracks without a gain or pan parameter get a disabled slider and None as id
+        self.gain_id = gain.info.id if gain is not None else None
+        self.pan_id = pan.info.id if pan is not None else None
         self._controller = controller
         self.setFixedWidth(SLIDER_MIN_WIDTH)
 
@@ -472,29 +610,40 @@ class PanGainWidget(QWidget):
         self._pan_label = QLabel('', self)
         self._layout.addWidget(self._pan_label, 0, Qt.AlignHCenter)
 
-        value = self._controller.parameters.get_parameter_value(self._processor_id, pan_id)
-        self.set_pan_slider(value)
-        txt_value = self._controller.parameters.get_parameter_value_as_string(self._processor_id, self.pan_id)
-        self.set_pan_label(txt_value)
-
-        value = self._controller.parameters.get_parameter_value(self._processor_id, gain_id)
-        self.set_gain_slider(value)
-        txt_value = self._controller.parameters.get_parameter_value_as_string(self._processor_id, self.gain_id)
-        self.set_gain_label(txt_value)
+        if pan is not None:
+            self.set_pan_slider(pan.value)
+            self.set_pan_label(pan.txt_value)
+        else:
+            self._pan_slider.setEnabled(False)
+        if gain is not None:
+            self.set_gain_slider(gain.value)
+            self.set_gain_label(gain.txt_value)
+        else:
+            self._gain_slider.setEnabled(False)
         
         self._connect_signals()
 
     def _connect_signals(self) -> None:
         self._pan_slider.valueChanged.connect(self.pan_changed)
+        self._pan_slider.sliderReleased.connect(self._controller.flush_writes)
         self._gain_slider.valueChanged.connect(self.gain_changed)
+        self._gain_slider.sliderReleased.connect(self._controller.flush_writes)
 
     def pan_changed(self) -> None:
         value = float(self._pan_slider.value()) / SLIDER_MAX_VALUE
-        self._controller.parameters.set_parameter_value(self._processor_id, self.pan_id, value)
+        self._controller.queue_parameter_value(self._processor_id, self.pan_id, value)
 
     def gain_changed(self) -> None:
         value = float(self._gain_slider.value()) / SLIDER_MAX_VALUE
-        self._controller.parameters.set_parameter_value(self._processor_id, self.gain_id, value)
+        self._controller.queue_parameter_value(self._processor_id, self.gain_id, value)
+
+    def handle_pan_notification(self, notif: sushi.ParameterInfo) -> None:
+        self.set_pan_slider(notif.normalized_value)
+        self.set_pan_label(notif.formatted_value)
+
+    def handle_gain_notification(self, notif: sushi.ParameterInfo) -> None:
+        self.set_gain_slider(notif.normalized_value)
+        self.set_gain_label(notif.formatted_value)
 
     def set_pan_slider(self, value: float) -> None:
         self._pan_slider.blockSignals(True)
@@ -0,0 +1,77 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Thread
+from typing import Callable, Hashable
+
+from .constants import COMMAND_DEADLINE
+
+
+# Sends writes to Sushi from a background thread, at most rate batches per second.
+# Writes are keyed by their target, and a new write replaces one that is still pending
+# for the same target, so a fast slider drag only sends the values Sushi can keep up with.
+# With more than one worker the writes of a batch are sent concurrently, but a batch is always
+# done before the next one starts, so writes to the same target are never reordered.
+class WriteQueue:
+    def __init__(self, rate: float, workers: int = 1) -> None:
+        self._condition = Condition()
+        self._pending = {}
+        self._flush = False
+        self._running = True
+        self.set_rate(rate)
+        self._executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def set_rate(self, rate: float) -> None:
+        self._period = 1.0 / rate
+
+    def put(self, key: Hashable, function: Callable, *args) -> None:
+        with self._condition:
+            # Re-insert so the target goes to the back of the queue, like a new write would
+            self._pending.pop(key, None)
+            self._pending[key] = (function, args)
+            self._condition.notify()
+
+    def flush(self) -> None:
+        # Send whatever is pending right away, i.e. the final value when a slider is released
+        with self._condition:
+            # With nothing pending there's nothing to hurry, the next write keeps to the rate
+            if self._pending:
+                self._flush = True
+                self._condition.notify()
+
+    def close(self) -> None:
+        # Writes still pending, like a slider's final value, are sent before the thread stops
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(COMMAND_DEADLINE)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _run(self) -> None:
+        next_send = time.monotonic()
+        while True:
+            with self._condition:
+                while self._running and not (self._pending and (self._flush or time.monotonic() >= next_send)):
+                    timeout = None if not self._pending else next_send - time.monotonic()
+                    self._condition.wait(timeout)
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+                self._flush = False
+
+            if self._executor is None:
+                for write in batch.values():
+                    self._send(write)
+            else:
+                list(self._executor.map(self._send, batch.values()))
+            next_send = time.monotonic() + self._period
+
+    @staticmethod
+    def _send(write: tuple) -> None:
+        function, args = write
+        try:
+            function(*args)
+        except Exception as e:
+            print(f'Error writing to Sushi: {e}')
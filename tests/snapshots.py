@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+from typing import List, Optional
+
+from elkpy import sushi_info_types as sushi
+
+from sushi_gui.graph_model import TrackSnapshot, ProcessorSnapshot, ParameterSnapshot, PropertySnapshot
+
+
+# Snapshots and notifications as the controller would build them from Sushi's replies. elkpy's info
+# types read their fields from gRPC messages, any object with the same attributes will do.
+
+def parameter(parameter_id: int, name: str, value: float = 0.5) -> ParameterSnapshot:
+    info = sushi.ParameterInfo(SimpleNamespace(id=parameter_id, name=name, label=name, unit='',
+                                               type=SimpleNamespace(type=1), automatable=True,
+                                               min_domain_value=0.0, max_domain_value=1.0))
+    return ParameterSnapshot(info, value, f'{value:.2f}')
+
+
+def prop(property_id: int, name: str, value: str = '') -> PropertySnapshot:
+    return PropertySnapshot(sushi.PropertyInfo(SimpleNamespace(id=property_id, name=name, label=name)), value)
+
+
+def processor(processor_id: int, name: str, parameters: Optional[List[ParameterSnapshot]] = None,
+              properties: Optional[List[PropertySnapshot]] = None, programs: int = 0) -> ProcessorSnapshot:
+    info = sushi.ProcessorInfo(SimpleNamespace(id=processor_id, name=name, label=name,
+                                               parameter_count=len(parameters or []), program_count=programs))
+    program_infos = [sushi.ProgramInfo(SimpleNamespace(id=SimpleNamespace(program=i), name=f'program {i}'))
+                     for i in range(programs)]
+    return ProcessorSnapshot(info, parameters, properties, program_infos, 0, False)
+
+
+def track(track_id: int, name: str, processors: List[ProcessorSnapshot],
+          parameters: Optional[List[ParameterSnapshot]] = None) -> TrackSnapshot:
+    info = sushi.TrackInfo(SimpleNamespace(id=track_id, name=name, label=name, channels=2, buses=1,
+                                           processors=[SimpleNamespace(id=p.info.id) for p in processors]))
+    if parameters is None:
+        parameters = [parameter(0, 'gain'), parameter(1, 'pan'), parameter(2, 'mute', 0.0)]
+    return TrackSnapshot(info, parameters, processors)
+
+
+def parameter_notification(processor_id: int, parameter_id: int, value: float) -> SimpleNamespace:
+    return SimpleNamespace(parameter=SimpleNamespace(processor_id=processor_id, parameter_id=parameter_id),
+                           normalized_value=value, formatted_value=f'{value:.2f}')
+
+
+def property_notification(processor_id: int, property_id: int, value: str) -> SimpleNamespace:
+    return SimpleNamespace(property=SimpleNamespace(processor_id=processor_id, property_id=property_id), value=value)
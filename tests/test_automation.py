@@ -0,0 +1,176 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Event, Lock
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from sushi_gui.automation import Automation, AutomationBuffer, BeatClock
+from sushi_gui.constants import AUTOMATION_INITIAL_EVENTS, MODE_PLAYING
+
+from .snapshots import parameter_notification
+
+
+class FakeController:
+    def __init__(self, tempo: float = 120.0, playing: bool = False) -> None:
+        self._lock = Lock()
+        self.values = {}
+        self.sent = 0
+        self.transport = SimpleNamespace(get_tempo=lambda: tempo,
+                                         get_playing_mode=lambda: MODE_PLAYING if playing else 1)
+
+    def run_command(self, target, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+    def set_parameter_values(self, processor_ids, parameter_ids, values):
+        with self._lock:
+            self.sent += len(values)
+            for key, value in zip(zip(processor_ids, parameter_ids), values):
+                self.values[key] = value
+
+
+class TransportUpdate:
+    def __init__(self, **fields) -> None:
+        self._fields = fields
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def HasField(self, name: str) -> bool:
+        return name in self._fields
+
+
+def playing_mode(playing: bool) -> TransportUpdate:
+    return TransportUpdate(playing_mode=SimpleNamespace(mode=MODE_PLAYING if playing else 1))
+
+
+def wait_until_played(automation: Automation, timeout: float = 3.0) -> None:
+    end = time.monotonic() + timeout
+    while automation.playing_back and time.monotonic() < end:
+        time.sleep(0.01)
+
+
+def test_buffer_grows_up_to_its_limit():
+    buffer = AutomationBuffer(max_events=AUTOMATION_INITIAL_EVENTS * 4 + 1)
+    for i in range(AUTOMATION_INITIAL_EVENTS * 5):
+        buffer.append(i * 0.001, i * 0.002, 1, i % 7, 0.5)
+    assert buffer.size == AUTOMATION_INITIAL_EVENTS * 4 + 1
+    assert buffer.dropped == AUTOMATION_INITIAL_EVENTS * 5 - buffer.size
+    assert len(buffer.values) == buffer.size
+    assert buffer.parameters[buffer.size - 1] == (buffer.size - 1) % 7
+    assert buffer.duration == pytest.approx((buffer.size - 1) * 0.001)
+
+    buffer.clear()
+    assert buffer.size == 0 and buffer.dropped == 0 and buffer.duration == 0.0
+
+
+def test_beat_clock_follows_tempo_changes():
+    clock = BeatClock(120.0)
+    clock.reset(10.0)
+    assert clock.beats(11.0) == pytest.approx(2.0)
+    clock.set_tempo(60.0, 11.0)
+    assert clock.beats(13.0) == pytest.approx(4.0)
+
+
+def test_recording_keeps_notifications_in_order():
+    automation = Automation(FakeController())
+    automation.record_parameter_notification(parameter_notification(1, 0, 0.1))
+    assert automation.buffer.size == 0
+
+    automation.start_recording().result()
+    for i in range(10):
+        automation.record_parameter_notification(parameter_notification(1, i, i / 10))
+    automation.stop_recording()
+    automation.record_parameter_notification(parameter_notification(1, 0, 0.1))
+
+    buffer = automation.buffer
+    assert buffer.size == 10
+    assert list(buffer.parameters[:10]) == list(range(10))
+    assert np.all(np.diff(buffer.seconds[:10]) >= 0)
+    # 120 bpm is two beats per second
+    assert buffer.beats[9] == pytest.approx(buffer.seconds[9] * 2, rel=1e-3)
+
+
+def recorded(controller: FakeController, values: int = 200, parameters: int = 4) -> Automation:
+    automation = Automation(controller)
+    automation.start_recording().result()
+    for i in range(values):
+        automation.record_parameter_notification(parameter_notification(1, i % parameters, i / values))
+        time.sleep(0.0005)
+    automation.stop_recording()
+    return automation
+
+
+def test_playback_sends_the_recorded_values():
+    controller = FakeController()
+    automation = recorded(controller)
+    automation.play()
+    wait_until_played(automation)
+
+    stats = automation.stats()
+    assert stats['played'] == 200
+    # Changes that were due together are sent once per parameter
+    assert controller.sent == stats['sent'] <= 200
+    assert controller.values == {(1, p): pytest.approx((196 + p) / 200) for p in range(4)}
+    assert 0.0 <= stats['jitter_p50'] <= stats['jitter_p99'] <= stats['jitter_max']
+
+
+def test_playback_can_be_stopped():
+    controller = FakeController()
+    automation = Automation(controller)
+    automation.start_recording().result()
+    automation.record_parameter_notification(parameter_notification(1, 0, 0.1))
+    automation.buffer.append(60.0, 120.0, 1, 0, 0.9)
+    automation.stop_recording()
+    automation.play()
+    time.sleep(0.1)
+    automation.stop_playback()
+    assert not automation.playing_back
+    assert controller.values == {(1, 0): pytest.approx(0.1)}
+
+
+class SlowController(FakeController):
+    # Commands run on a worker, and sending blocks until released, like a Sushi that stopped answering
+    def __init__(self) -> None:
+        super().__init__()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.sending = Event()
+        self.release = Event()
+
+    def run_command(self, target, function, *args):
+        return self._executor.submit(function, *args)
+
+    def set_parameter_values(self, processor_ids, parameter_ids, values):
+        self.sending.set()
+        self.release.wait()
+        super().set_parameter_values(processor_ids, parameter_ids, values)
+
+
+def test_stopping_doesnt_wait_for_a_slow_send():
+    controller = SlowController()
+    automation = recorded(controller, values=20)
+    automation.play().result()
+    assert controller.sending.wait(1.0)
+
+    start = time.monotonic()
+    stopped = automation.stop_playback()
+    assert time.monotonic() - start < 0.1 and not stopped.done()
+    controller.release.set()
+    stopped.result(timeout=1.0)
+    assert not automation.playing_back
+    assert automation.stats()['batches'] == 1
+
+
+def test_playback_following_the_transport_waits_for_sushi_to_play():
+    controller = FakeController(playing=False)
+    automation = recorded(controller, values=20)
+    automation.play(follow_transport=True)
+    time.sleep(0.2)
+    assert automation.stats()['played'] == 0
+
+    automation.transport_notification(playing_mode(True))
+    wait_until_played(automation)
+    assert automation.stats()['played'] == 20
+    assert not automation.playing_back
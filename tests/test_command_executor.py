@@ -0,0 +1,100 @@
+import time
+from threading import Event, Lock
+
+import pytest
+
+from sushi_gui.command_executor import CommandExecutor, DeadlineStub, current_deadline
+
+
+def test_commands_with_the_same_target_run_in_order():
+    executor = CommandExecutor(4, 1.0)
+    lock = Lock()
+    order = []
+
+    def command(i):
+        # Later commands finish sooner, they'd overtake earlier ones if they ran concurrently
+        time.sleep(0.01 * (5 - i))
+        with lock:
+            order.append(i)
+
+    futures = [executor.submit('track', command, i) for i in range(5)]
+    for f in futures:
+        f.result(timeout=2)
+    assert order == [0, 1, 2, 3, 4]
+    executor.shutdown()
+
+
+def test_commands_with_different_targets_run_concurrently():
+    executor = CommandExecutor(2, 1.0)
+    started = Event()
+    release = Event()
+
+    def blocking():
+        started.set()
+        release.wait(2)
+
+    blocked = executor.submit('a', blocking)
+    assert started.wait(1)
+    # Runs while the first target is still busy
+    assert executor.submit('b', lambda: 'done').result(timeout=1) == 'done'
+    assert not blocked.done()
+    release.set()
+    blocked.result(timeout=1)
+    executor.shutdown()
+
+
+def test_errors_are_set_on_the_future_and_reported():
+    errors = []
+    executor = CommandExecutor(1, 1.0, lambda description, e: errors.append((description, str(e))))
+
+    def fail():
+        raise RuntimeError('no such processor')
+
+    future = executor.submit('a', fail, description='delete processor')
+    with pytest.raises(RuntimeError):
+        future.result(timeout=1)
+    # A failed command doesn't hold up the ones behind it
+    assert executor.submit('a', lambda: 1).result(timeout=1) == 1
+    assert errors == [('delete processor', 'no such processor')]
+    executor.shutdown()
+
+
+def test_commands_run_with_their_deadline():
+    executor = CommandExecutor(1, 5.0)
+    assert executor.submit('a', current_deadline).result(timeout=1) == 5.0
+    assert executor.submit('a', current_deadline, deadline=60.0).result(timeout=1) == 60.0
+    assert current_deadline() is None
+    executor.shutdown()
+
+
+def test_commands_fail_after_shutdown():
+    executor = CommandExecutor(1, 1.0)
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit('a', lambda: 1).result(timeout=1)
+
+
+class Stub:
+    def __init__(self) -> None:
+        self.timeouts = []
+
+    def GetTempo(self, request, timeout=None):
+        self.timeouts.append(timeout)
+        return request
+
+
+def test_stub_calls_outside_of_commands_get_the_default_deadline():
+    stub = Stub()
+    wrapped = DeadlineStub(stub, 'transport', default_deadline=5.0)
+    wrapped.GetTempo('request')
+    wrapped.GetTempo('request', timeout=1.0)
+    assert stub.timeouts == [5.0, 1.0]
+
+
+def test_stub_calls_in_commands_get_the_command_deadline():
+    stub = Stub()
+    wrapped = DeadlineStub(stub, 'transport', default_deadline=5.0)
+    executor = CommandExecutor(1, 5.0)
+    executor.submit('session', wrapped.GetTempo, 'request', deadline=60.0).result(timeout=1)
+    assert stub.timeouts == [60.0]
+    executor.shutdown()
@@ -0,0 +1,73 @@
+from sushi_gui.graph_model import AudioGraphModel
+
+from .snapshots import track, processor, parameter, prop, parameter_notification, property_notification
+
+
+def graph_with_one_track() -> AudioGraphModel:
+    graph = AudioGraphModel()
+    graph.add_track(track(1, 'main', [processor(10, 'eq', [parameter(0, 'frequency', 0.25)],
+                                                [prop(0, 'file', 'a.wav')])]))
+    return graph
+
+
+def test_parameter_notification_updates_value_and_text():
+    graph = graph_with_one_track()
+    graph.apply_parameter_notification(parameter_notification(10, 0, 0.75))
+    assert graph.parameter(10, 0).value == 0.75
+    assert graph.parameter(10, 0).txt_value == '0.75'
+    # The track's own parameters are indexed under the track id
+    graph.apply_parameter_notification(parameter_notification(1, 1, 0.1))
+    assert graph.tracks[1].parameter('pan').value == 0.1
+
+
+def test_notifications_for_unknown_parameters_are_ignored():
+    graph = graph_with_one_track()
+    graph.apply_parameter_notification(parameter_notification(10, 5, 0.75))
+    graph.apply_parameter_notification(parameter_notification(99, 0, 0.75))
+    assert graph.parameter(10, 0).value == 0.25
+
+
+def test_property_notification_updates_value():
+    graph = graph_with_one_track()
+    graph.apply_property_notification(property_notification(10, 0, 'b.wav'))
+    assert graph.property(10, 0).value == 'b.wav'
+
+
+def test_collapsed_processor_is_indexed_once_its_parameters_are_set():
+    graph = AudioGraphModel()
+    graph.add_track(track(1, 'main', [processor(10, 'synth')]))
+    graph.apply_parameter_notification(parameter_notification(10, 0, 0.9))
+    assert graph.parameter(10, 0) is None
+
+    assert graph.set_processor_parameters(10, [parameter(0, 'cutoff', 0.2)], [])
+    graph.apply_parameter_notification(parameter_notification(10, 0, 0.9))
+    assert graph.parameter(10, 0).value == 0.9
+
+
+def test_removed_processor_stops_receiving_notifications():
+    graph = graph_with_one_track()
+    removed = graph.parameter(10, 0)
+    graph.remove_processor(1, 10)
+    graph.apply_parameter_notification(parameter_notification(10, 0, 0.9))
+    assert removed.value == 0.25
+    assert graph.parameter(10, 0) is None
+    assert graph.tracks[1].info.processors == []
+
+
+def test_deleted_ids_are_not_added_back_by_late_snapshots():
+    graph = graph_with_one_track()
+    graph.remove_track(1)
+    assert not graph.add_track(track(1, 'main', []))
+    graph.forget_deleted()
+    assert graph.add_track(track(1, 'main', []))
+
+
+def test_processors_keep_track_order():
+    graph = AudioGraphModel()
+    graph.add_track(track(1, 'main', [processor(10, 'a'), processor(11, 'b')]))
+    graph.add_processor(1, processor(12, 'c'), 1)
+    assert graph.track_processors(1) == [10, 12, 11]
+    graph.move_processor(1, 10, 2)
+    assert graph.track_processors(1) == [12, 11, 10]
+    assert graph.tracks[1].info.processors == [12, 11, 10]
+    assert graph.processor_track(12) == 1
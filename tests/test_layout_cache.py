@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from sushi_gui import layout_cache
+
+from .snapshots import track, processor, parameter, prop
+
+
+def example_tracks():
+    return [track(1, 'main', [processor(10, 'eq', [parameter(0, 'frequency', 0.25)], [prop(0, 'file', 'a.wav')],
+                                        programs=2),
+                              processor(11, 'synth')])]
+
+
+def test_tracks_round_trip(tmp_path):
+    path = str(tmp_path / 'layout.json.gz')
+    layout_cache.write_tracks(path, 'localhost:51051', example_tracks())
+    tracks = layout_cache.read_tracks(path, 'localhost:51051')
+
+    assert len(tracks) == 1
+    eq, synth = tracks[0].processors
+    assert tracks[0].info.name == 'main' and tracks[0].info.processors == [10, 11]
+    assert tracks[0].parameter('gain').value == 0.5
+    assert eq.parameters[0].info.name == 'frequency' and eq.parameters[0].value == 0.25
+    assert eq.properties[0].value == 'a.wav'
+    assert [p.name for p in eq.programs] == ['program 0', 'program 1']
+    # Processors that were never expanded stay collapsed
+    assert synth.parameters is None and synth.properties is None
+
+
+def test_layouts_of_other_addresses_are_ignored(tmp_path):
+    path = str(tmp_path / 'layout.json.gz')
+    layout_cache.write_tracks(path, 'localhost:51051', example_tracks())
+    assert layout_cache.read_tracks(path, 'elk-pi:51051') is None
+    assert layout_cache.read_tracks(path) is not None
+
+
+def test_values_dont_change_the_layout():
+    a, b = example_tracks()[0], example_tracks()[0]
+    b.processors[0].parameters[0].value = 0.9
+    assert layout_cache.same_layout(a, b)
+    b.processors[0].bypassed = True
+    assert not layout_cache.same_layout(a, b)
+
+
+def test_structure_ignores_ids_but_not_names():
+    a = example_tracks()
+    b = [track(5, 'main', [processor(20, 'eq', [parameter(3, 'frequency', 0.9)], [prop(4, 'file')], programs=2),
+                           processor(21, 'synth')])]
+    assert layout_cache.same_structure(a, b)
+    b[0].processors[0].parameters[0] = parameter(3, 'gain')
+    assert not layout_cache.same_structure(a, b)
+
+
+def session(uid: str = 'sushi.testing.equalizer', output_channel: int = 0) -> SimpleNamespace:
+    # The parts of a SessionState that are compared
+    plugin = SimpleNamespace(uid=uid, path='', type=1)
+    connection = SimpleNamespace(track='main', track_channel=0, engine_channel=output_channel)
+    return SimpleNamespace(tracks=[SimpleNamespace(type=0, buses=1, processors=[plugin])],
+                           engine_state=SimpleNamespace(input_connections=[], output_connections=[connection]),
+                           midi_state=SimpleNamespace(inputs=1, outputs=1))
+
+
+def test_structure_compares_plugins_and_connections():
+    a, b = example_tracks(), example_tracks()
+    assert layout_cache.same_structure(a, b, session(), session())
+    assert not layout_cache.same_structure(a, b, session(), session(uid='sushi.testing.compressor'))
+    assert not layout_cache.same_structure(a, b, session(), session(output_channel=2))
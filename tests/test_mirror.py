@@ -0,0 +1,101 @@
+import time
+from threading import Lock
+from types import SimpleNamespace
+
+from sushi_gui.mirror import Follower
+
+
+class FakeMirror:
+    # Primary processor ids are 1.., parameter ids 0.., named after them
+    def parameter_name(self, processor_id, parameter_id):
+        return False, f'processor_{processor_id}', f'parameter_{parameter_id}'
+
+    def processor_name(self, processor_id):
+        return False, f'processor_{processor_id}'
+
+
+class FakeFollowerController:
+    # The follower's ids are offset from the primary's, and fail_every makes the first attempt of every nth
+    # write fail, like a write to an id that went stale when the follower's graph was rebuilt
+    def __init__(self, fail_every: int = 0) -> None:
+        self._lock = Lock()
+        self._attempted = set()
+        self._fail_every = fail_every
+        self.lookups = 0
+        self.values = {}
+        self.audio_graph = SimpleNamespace(get_processor_id=self._get_processor_id)
+        self.parameters = SimpleNamespace(get_parameter_id=self._get_parameter_id,
+                                          set_parameter_value=self._set_parameter_value)
+
+    def _get_processor_id(self, name):
+        with self._lock:
+            self.lookups += 1
+        return 100 + int(name.split('_')[1])
+
+    def _get_parameter_id(self, processor_id, name):
+        with self._lock:
+            self.lookups += 1
+        return 50 + int(name.split('_')[1])
+
+    def _set_parameter_value(self, processor_id, parameter_id, value):
+        with self._lock:
+            write = (processor_id, parameter_id, value)
+            if self._fail_every and write not in self._attempted:
+                self._attempted.add(write)
+                if len(self._attempted) % self._fail_every == 0:
+                    raise RuntimeError('stale id')
+            self.values[(processor_id, parameter_id)] = value
+
+    def close(self):
+        pass
+
+
+def write(follower, processor_id, parameter_id, value):
+    follower.put(('parameter', processor_id, parameter_id), value, follower.set_parameter, processor_id,
+                 parameter_id, value)
+
+
+def wait_for_writes(follower, timeout: float = 5.0) -> dict:
+    end = time.monotonic() + timeout
+    while follower.stats()['pending'] and time.monotonic() < end:
+        time.sleep(0.01)
+    return follower.stats()
+
+
+def test_parameters_are_written_to_the_followers_ids():
+    controller = FakeFollowerController()
+    follower = Follower('follower:51051', FakeMirror(), controller)
+    write(follower, 1, 2, 0.5)
+    write(follower, 1, 3, 0.25)
+    stats = wait_for_writes(follower)
+    follower.close()
+    assert controller.values == {(101, 52): 0.5, (101, 53): 0.25}
+    assert stats['writes'] == 2 and stats['errors'] == 0
+    # The processor was looked up once, each parameter once
+    assert controller.lookups == 3
+
+
+def test_values_the_follower_already_has_are_not_sent_again():
+    controller = FakeFollowerController()
+    follower = Follower('follower:51051', FakeMirror(), controller)
+    write(follower, 1, 2, 0.5)
+    wait_for_writes(follower)
+    write(follower, 1, 2, 0.5)
+    stats = wait_for_writes(follower)
+    follower.close()
+    assert stats['writes'] == 1
+
+
+def test_stale_ids_are_looked_up_again_by_concurrent_writers():
+    controller = FakeFollowerController(fail_every=7)
+    follower = Follower('follower:51051', FakeMirror(), controller)
+    for value in range(20):
+        for processor_id in range(1, 5):
+            for parameter_id in range(10):
+                write(follower, processor_id, parameter_id, value / 20)
+        time.sleep(0.005)
+    stats = wait_for_writes(follower)
+    follower.close()
+    # Every failed write is retried with fresh ids, and clearing them never breaks another writer
+    assert stats['errors'] == 0
+    assert all(value == 19 / 20 for value in controller.values.values()) and len(controller.values) == 40
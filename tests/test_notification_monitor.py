@@ -0,0 +1,43 @@
+import time
+
+from sushi_gui.notification_monitor import NotificationMonitor
+
+
+def test_delivered_notifications_are_matched_in_order():
+    monitor = NotificationMonitor()
+    monitor.queued('track')
+    time.sleep(0.05)
+    monitor.queued('track')
+    assert monitor.depth() == 2
+
+    monitor.delivered('track')
+    monitor.delivered('track')
+    stats = monitor.stats()['track']
+    assert monitor.depth() == 0 and stats['max_depth'] == 2
+    # The first one waited the longest
+    assert stats['p99'] >= 0.05
+
+
+def test_kinds_are_counted_separately():
+    monitor = NotificationMonitor()
+    monitor.queued('track')
+    monitor.queued('timing')
+    monitor.delivered('timing')
+    assert monitor.stats()['track']['depth'] == 1
+    assert monitor.stats()['timing']['depth'] == 0
+
+
+def test_deliveries_without_a_queued_notification_are_ignored():
+    monitor = NotificationMonitor()
+    monitor.delivered('transport')
+    monitor.queued('transport')
+    assert monitor.depth() == 1
+
+
+def test_coalesced_notifications_report_their_arrival_lag():
+    monitor = NotificationMonitor()
+    arrived = time.perf_counter() - 0.1
+    monitor.coalesced('parameter', [arrived, arrived], 2)
+    stats = monitor.stats()['parameter']
+    assert stats['p50'] >= 0.1 and stats['depth'] == 2
+    assert monitor.lag_percentiles()['p99'] >= 0.1
@@ -0,0 +1,191 @@
+import time
+from concurrent.futures import Future
+from threading import Lock
+
+import numpy as np
+import pytest
+
+from sushi_gui.constants import PARAMETER_TABLE_GROWTH, MORPH_RESOLUTION
+from sushi_gui.parameter_snapshots import ParameterTable, SnapshotStore
+
+from .snapshots import parameter, parameter_notification
+
+
+class FakeController:
+    # Two processors with four parameters each, commands run right away
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.values = {(processor_id, parameter_id): 0.0 for processor_id in (1, 2) for parameter_id in range(4)}
+        self.sent = []
+        # Set to make sending fail, like a Sushi that went away
+        self.fail = False
+
+    def run_command(self, target, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+    def get_parameter_values(self, processor_ids=None):
+        processor_ids = processor_ids or [1, 2]
+        return {processor_id: [parameter(parameter_id, f'parameter_{parameter_id}', value)
+                               for (p, parameter_id), value in self.values.items() if p == processor_id]
+                for processor_id in processor_ids}
+
+    def set_parameter_values(self, processor_ids, parameter_ids, values):
+        if self.fail:
+            raise RuntimeError('Sushi is gone')
+        with self._lock:
+            self.sent.append(list(zip(processor_ids, parameter_ids, values)))
+            for processor_id, parameter_id, value in self.sent[-1]:
+                self.values[(processor_id, parameter_id)] = value
+
+    def set_all(self, value: float) -> None:
+        for key in self.values:
+            self.values[key] = value
+
+
+def test_table_rows_are_stable_and_grow():
+    table = ParameterTable()
+    keys = [(1, i) for i in range(PARAMETER_TABLE_GROWTH + 10)]
+    with table.lock:
+        rows = table.rows(keys)
+        assert list(rows) == list(range(len(keys)))
+        # Known keys keep their rows, duplicates share one
+        assert list(table.rows([(1, 5), (2, 0), (2, 0)])) == [5, len(keys), len(keys)]
+    assert table.size == len(keys) + 1
+    assert table.processors[len(keys)] == 2 and table.parameters[5] == 5
+
+
+def test_table_ignores_values_of_unknown_parameters():
+    table = ParameterTable()
+    with table.lock:
+        table.rows([(1, 0)])
+    table.set(1, 0, 0.5)
+    table.set(1, 1, 0.5)
+    assert table.size == 1 and table.values[0] == np.float32(0.5)
+
+
+def test_recall_only_sends_what_differs():
+    controller = FakeController()
+    store = SnapshotStore(controller)
+    store.capture('A', 'Whole graph').result()
+    controller.set_all(1.0)
+    store.capture('B', 'Whole graph').result()
+
+    assert store.recall('A').result() == 8
+    assert all(value == 0.0 for value in controller.values.values())
+    # Nothing changed since the last recall
+    assert store.recall('A').result() == 0
+
+    controller.values[(2, 3)] = 0.5
+    store.apply_parameter_notification(parameter_notification(2, 3, 0.5))
+    assert store.recall('A').result() == 1
+    assert controller.sent[-1] == [(2, 3, 0.0)]
+
+
+def test_failed_recalls_are_sent_again():
+    controller = FakeController()
+    store = SnapshotStore(controller)
+    store.capture('A', 'Whole graph').result()
+    controller.set_all(1.0)
+    store.capture('B', 'Whole graph').result()
+
+    controller.fail = True
+    with pytest.raises(RuntimeError):
+        store.recall('A').result()
+    controller.fail = False
+    assert store.recall('A').result() == 8
+
+
+def test_snapshots_of_one_processor_only_recall_that_processor():
+    controller = FakeController()
+    store = SnapshotStore(controller)
+    store.capture('P', 'processor 1', [1]).result()
+    controller.set_all(1.0)
+    for (processor_id, parameter_id), value in controller.values.items():
+        store.apply_parameter_notification(parameter_notification(processor_id, parameter_id, value))
+
+    assert store.recall('P').result() == 4
+    assert {p for p, _, _ in controller.sent[-1]} == {1}
+
+
+def wait_for_morph(morph, timeout: float = 2.0) -> None:
+    end = time.monotonic() + timeout
+    last = -1
+    # Done once a couple of updates went by without sending anything
+    while time.monotonic() < end:
+        time.sleep(0.1)
+        if morph.values_sent == last and not morph.running_to:
+            return
+        last = morph.values_sent
+
+
+def morph_controller():
+    controller = FakeController()
+    store = SnapshotStore(controller)
+    store.capture('A', 'Whole graph').result()
+    controller.set_all(1.0)
+    store.capture('B', 'Whole graph').result()
+    return controller, store
+
+
+def test_morph_interpolates_every_parameter():
+    controller, store = morph_controller()
+    morph = store.start_morph('A', 'B')
+    morph.set_position(0.25)
+    wait_for_morph(morph)
+    store.stop_morph()
+    assert all(value == pytest.approx(0.25) for value in controller.values.values())
+
+
+def test_morph_only_sends_parameters_that_moved_a_step():
+    controller, store = morph_controller()
+    # One parameter is the same in both snapshots and already has that value
+    store.snapshots['B'].values[0] = 0.0
+    controller.values[(1, 0)] = 0.0
+    store.apply_parameter_notification(parameter_notification(1, 0, 0.0))
+    morph = store.start_morph('A', 'B')
+    morph.set_position(0.5)
+    wait_for_morph(morph)
+    sent = morph.values_sent
+    assert sent == 7
+    morph.set_position(0.5 + 0.4 / MORPH_RESOLUTION)
+    wait_for_morph(morph)
+    assert morph.values_sent == sent
+    store.stop_morph()
+
+
+def test_timed_morph_lands_exactly_on_the_snapshot():
+    controller, store = morph_controller()
+    morph = store.start_morph('A', 'B')
+    morph.run_to(1.0, 0.3)
+    assert morph.running_to
+    wait_for_morph(morph)
+    store.stop_morph()
+    assert morph.position == 1.0 and morph.updates > 1
+    assert all(value == 1.0 for value in controller.values.values())
+
+
+def test_morph_resends_values_that_failed():
+    controller, store = morph_controller()
+    store.recall('A').result()
+    morph = store.start_morph('A', 'B')
+    controller.fail = True
+    morph.set_position(1.0)
+    wait_for_morph(morph)
+    assert morph.values_sent == 0
+    controller.fail = False
+    morph.set_position(1.0)
+    wait_for_morph(morph)
+    store.stop_morph()
+    assert all(value == 1.0 for value in controller.values.values())
+
+
+def test_snapshots_without_common_parameters_cant_be_morphed():
+    controller = FakeController()
+    store = SnapshotStore(controller)
+    store.capture('P1', 'processor 1', [1]).result()
+    store.capture('P2', 'processor 2', [2]).result()
+    with pytest.raises(ValueError):
+        store.start_morph('P1', 'P2')
+    assert store.morph is None
@@ -0,0 +1,39 @@
+import sys
+
+import pytest
+
+from sushi_gui import proto_cache
+
+PROTO = '''syntax = "proto3";
+package cache_test.{package};
+message Value {{ {field} value = 1; }}
+service Values {{ rpc Get (Value) returns (Value) {{}} }}
+'''
+
+
+def write_proto(directory, package: str = 'one', field: str = 'float'):
+    directory.mkdir(exist_ok=True)
+    path = directory / 'cache_test.proto'
+    path.write_text(PROTO.format(package=package, field=field))
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(proto_cache, 'PROTO_CACHE_DIR', str(tmp_path / 'cache'))
+
+
+def test_the_same_proto_is_compiled_and_imported_once(tmp_path):
+    proto_module, grpc_module = proto_cache.modules_from_proto(write_proto(tmp_path / 'a'))
+    assert proto_cache.modules_from_proto(write_proto(tmp_path / 'b')) == (proto_module, grpc_module)
+    assert proto_module.Value(value=0.5).value == 0.5
+    assert grpc_module.cache__test__pb2 is proto_module
+    # Imported under hash qualified names only
+    assert proto_module.__name__.startswith('cache_test_pb2_') and 'cache_test_pb2' not in sys.modules
+
+
+def test_a_different_proto_with_the_same_name_isnt_mistaken_for_the_first(tmp_path):
+    proto_module, _ = proto_cache.modules_from_proto(write_proto(tmp_path / 'a'))
+    with pytest.raises(RuntimeError):
+        proto_cache.modules_from_proto(write_proto(tmp_path / 'b', 'two', 'string'))
+    assert proto_module.Value.DESCRIPTOR.full_name == 'cache_test.one.Value'
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from sushi_gui import session_store
+
+SESSION = os.urandom(1 << 16) + b'\0' * (3 << 20)
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_sessions_round_trip_with_their_checksum(tmp_path, compress):
+    filename = str(tmp_path / 'session.sushi')
+    progress = []
+    assert session_store.write_session(filename, SESSION, compress, progress.append)
+    assert os.path.exists(filename + '.sha256')
+    assert progress[-1] == 1.0 and progress == sorted(progress)
+    assert session_store.read_session(filename) == SESSION
+    assert (os.path.getsize(filename) < len(SESSION)) == compress
+
+
+def test_unchanged_sessions_are_not_written_again(tmp_path):
+    filename = str(tmp_path / 'session.sushi')
+    assert session_store.write_session(filename, SESSION)
+    assert not session_store.write_session(filename, SESSION)
+    # Compressing it is a change
+    assert session_store.write_session(filename, SESSION, compress=True)
+    assert session_store.write_session(filename, SESSION[:-1])
+
+
+def test_damaged_sessions_are_detected(tmp_path):
+    filename = str(tmp_path / 'session.sushi')
+    session_store.write_session(filename, SESSION)
+    with open(filename, 'r+b') as f:
+        f.seek(100)
+        f.write(b'x')
+    with pytest.raises(ValueError):
+        session_store.read_session(filename)
+
+
+def test_interrupted_saves_dont_reject_the_new_session(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'session.sushi')
+    session_store.write_session(filename, SESSION)
+
+    def fail(filename, digest):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(session_store, '_write_checksum', fail)
+    with pytest.raises(OSError):
+        session_store.write_session(filename, SESSION[:-1])
+    assert session_store.read_session(filename) == SESSION[:-1]
+
+
+def test_sessions_without_a_checksum_can_be_read(tmp_path):
+    filename = str(tmp_path / 'session.sushi')
+    with open(filename, 'wb') as f:
+        f.write(SESSION)
+    assert session_store.read_session(filename) == SESSION
+
+
+def test_autosaves_are_stored_once_and_old_ones_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_store, 'SESSION_STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(session_store, 'SESSION_AUTOSAVE_KEEP', 2)
+
+    digest, written = session_store.store_session('localhost:51051', b'first')
+    assert written
+    assert session_store.store_session('localhost:51051', b'first') == (digest, False)
+    # Another device with the same session shares the stored file
+    assert session_store.store_session('elk-pi:51051', b'first') == (digest, False)
+    assert session_store.read_session(session_store.latest_session('localhost:51051')) == b'first'
+
+    session_store.store_session('localhost:51051', b'second')
+    session_store.store_session('localhost:51051', b'third')
+    assert session_store.read_session(session_store.latest_session('localhost:51051')) == b'third'
+    # Still used by the other device
+    assert session_store.read_session(session_store.latest_session('elk-pi:51051')) == b'first'
+
+    session_store.store_session('elk-pi:51051', b'third')
+    session_store.store_session('elk-pi:51051', b'fourth')
+    stored = [name for name in os.listdir(tmp_path) if name.endswith('.sushi.gz')]
+    assert len(stored) == 3
+
+
+def test_no_autosave_for_unknown_addresses(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_store, 'SESSION_STORE_DIR', str(tmp_path))
+    assert session_store.latest_session('localhost:51051') is None
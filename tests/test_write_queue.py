@@ -0,0 +1,116 @@
+import time
+from threading import Event, Lock
+
+from sushi_gui.write_queue import WriteQueue
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.writes = []
+
+    def write(self, key, value) -> None:
+        with self._lock:
+            self.writes.append((key, value, time.monotonic()))
+
+    def values(self) -> list:
+        return [(key, value) for key, value, _ in self.writes]
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_pending_writes_to_a_target_are_replaced_by_newer_ones():
+    recorder = Recorder()
+    queue = WriteQueue(10)
+    blocked = Event()
+    # Hold the thread in the first batch so the following writes pile up
+    queue.put('block', blocked.wait)
+    time.sleep(0.05)
+    for value in range(5):
+        queue.put('a', recorder.write, 'a', value)
+    queue.put('b', recorder.write, 'b', 0)
+    blocked.set()
+    assert wait_for(lambda: len(recorder.writes) == 2)
+    time.sleep(0.2)
+    assert recorder.values() == [('a', 4), ('b', 0)]
+    queue.close()
+
+
+def test_batches_keep_to_the_rate():
+    recorder = Recorder()
+    queue = WriteQueue(10)
+    queue.put('a', recorder.write, 'a', 0)
+    assert wait_for(lambda: len(recorder.writes) == 1)
+    queue.put('a', recorder.write, 'a', 1)
+    assert wait_for(lambda: len(recorder.writes) == 2)
+    assert recorder.writes[1][2] - recorder.writes[0][2] >= 0.09
+    queue.close()
+
+
+def test_flush_sends_pending_writes_right_away():
+    recorder = Recorder()
+    queue = WriteQueue(1)
+    queue.put('a', recorder.write, 'a', 0)
+    assert wait_for(lambda: len(recorder.writes) == 1)
+    queue.put('a', recorder.write, 'a', 1)
+    queue.flush()
+    assert wait_for(lambda: len(recorder.writes) == 2, timeout=0.5)
+    queue.close()
+
+
+def test_flush_with_nothing_pending_doesnt_skip_the_rate():
+    recorder = Recorder()
+    queue = WriteQueue(2)
+    queue.put('a', recorder.write, 'a', 0)
+    assert wait_for(lambda: len(recorder.writes) == 1)
+    queue.flush()
+    queue.put('a', recorder.write, 'a', 1)
+    time.sleep(0.2)
+    assert len(recorder.writes) == 1
+    assert wait_for(lambda: len(recorder.writes) == 2)
+    queue.close()
+
+
+def test_close_sends_pending_writes():
+    recorder = Recorder()
+    queue = WriteQueue(1)
+    queue.put('a', recorder.write, 'a', 0)
+    assert wait_for(lambda: len(recorder.writes) == 1)
+    queue.put('a', recorder.write, 'a', 1)
+    queue.close()
+    assert recorder.values() == [('a', 0), ('a', 1)]
+
+
+def test_batches_with_workers_are_done_before_the_next():
+    recorder = Recorder()
+    queue = WriteQueue(100, workers=4)
+    for batch in range(5):
+        for key in range(8):
+            queue.put(key, recorder.write, key, batch)
+        time.sleep(0.03)
+    queue.close()
+    # Writes to a target are never reordered, even though each batch is sent concurrently
+    for key in range(8):
+        values = [value for k, value in recorder.values() if k == key]
+        assert values == sorted(values) and values[-1] == 4
+
+
+def test_errors_dont_stop_the_queue(capsys):
+    recorder = Recorder()
+    queue = WriteQueue(100)
+
+    def fail():
+        raise RuntimeError('unreachable')
+
+    queue.put('a', fail)
+    queue.put('b', recorder.write, 'b', 0)
+    assert wait_for(lambda: len(recorder.writes) == 1)
+    queue.close()
+    assert 'unreachable' in capsys.readouterr().out